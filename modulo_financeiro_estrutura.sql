@@ -168,33 +168,59 @@ CREATE INDEX IF NOT EXISTS idx_nfe_unidade ON notas_fiscais(unidade_id);
 -- =================================================
 
 -- View para Dashboard Financeiro
+-- Cada tabela é agregada por unidade antes do JOIN: juntar as linhas brutas
+-- das quatro tabelas multiplicaria as somas (produto cartesiano por unidade)
 CREATE OR REPLACE VIEW vw_dashboard_financeiro AS
+WITH receber AS (
+    SELECT unidade_id,
+        SUM(valor_liquido) FILTER (WHERE status = 'Recebido') as receita_confirmada,
+        SUM(valor_bruto) FILTER (WHERE status = 'Pendente') as receita_pendente,
+        SUM(valor_glosa) as total_glosas
+    FROM contas_receber
+    WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)
+    GROUP BY unidade_id
+),
+pagar AS (
+    SELECT unidade_id,
+        SUM(valor) FILTER (WHERE status = 'Pago') as despesas_pagas,
+        SUM(valor) FILTER (WHERE status = 'Pendente') as despesas_pendentes
+    FROM contas_pagar
+    WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)
+    GROUP BY unidade_id
+),
+clt AS (
+    SELECT unidade_id, SUM(custo_total) as folha_clt
+    FROM folha_clt
+    WHERE mes_referencia = DATE_TRUNC('month', CURRENT_DATE)
+    GROUP BY unidade_id
+),
+pj AS (
+    SELECT unidade_id, SUM(valor_repasse) as folha_pj
+    FROM folha_pj
+    WHERE mes_referencia = DATE_TRUNC('month', CURRENT_DATE)
+    GROUP BY unidade_id
+)
 SELECT 
     u.nome as unidade_nome,
     
     -- Receitas
-    COALESCE(SUM(CASE WHEN cr.status = 'Recebido' THEN cr.valor_liquido ELSE 0 END), 0) as receita_confirmada,
-    COALESCE(SUM(CASE WHEN cr.status = 'Pendente' THEN cr.valor_bruto ELSE 0 END), 0) as receita_pendente,
-    COALESCE(SUM(cr.valor_glosa), 0) as total_glosas,
+    COALESCE(r.receita_confirmada, 0) as receita_confirmada,
+    COALESCE(r.receita_pendente, 0) as receita_pendente,
+    COALESCE(r.total_glosas, 0) as total_glosas,
     
     -- Despesas
-    COALESCE(SUM(CASE WHEN cp.status = 'Pago' THEN cp.valor ELSE 0 END), 0) as despesas_pagas,
-    COALESCE(SUM(CASE WHEN cp.status = 'Pendente' THEN cp.valor ELSE 0 END), 0) as despesas_pendentes,
+    COALESCE(p.despesas_pagas, 0) as despesas_pagas,
+    COALESCE(p.despesas_pendentes, 0) as despesas_pendentes,
     
     -- Folhas
-    COALESCE(SUM(fclt.custo_total), 0) as folha_clt,
-    COALESCE(SUM(fpj.valor_repasse), 0) as folha_pj
+    COALESCE(c.folha_clt, 0) as folha_clt,
+    COALESCE(j.folha_pj, 0) as folha_pj
     
 FROM unidades u
-LEFT JOIN contas_receber cr ON cr.unidade_id = u.id 
-    AND cr.created_at >= DATE_TRUNC('month', CURRENT_DATE)
-LEFT JOIN contas_pagar cp ON cp.unidade_id = u.id 
-    AND cp.created_at >= DATE_TRUNC('month', CURRENT_DATE)
-LEFT JOIN folha_clt fclt ON fclt.unidade_id = u.id 
-    AND fclt.mes_referencia = DATE_TRUNC('month', CURRENT_DATE)
-LEFT JOIN folha_pj fpj ON fpj.unidade_id = u.id 
-    AND fpj.mes_referencia = DATE_TRUNC('month', CURRENT_DATE)
-GROUP BY u.id, u.nome;
+LEFT JOIN receber r ON r.unidade_id = u.id
+LEFT JOIN pagar p ON p.unidade_id = u.id
+LEFT JOIN clt c ON c.unidade_id = u.id
+LEFT JOIN pj j ON j.unidade_id = u.id;
 
 -- View para Análise de Glosas
 CREATE OR REPLACE VIEW vw_analise_glosas AS
@@ -0,0 +1,137 @@
+-- Rollup Mensal de Contas a Receber - Módulo Financeiro
+-- Agregados por (mês, unidade, origem, convênio) mantidos por scripts/rollup_receber.py.
+-- Meses fechados não mudam: cada atualização recalcula apenas os meses
+-- tocados desde a anterior (updated_at + pendências registradas pelos triggers
+-- de exclusão/alteração), então a leitura não depende do tamanho do histórico.
+--
+-- O mês é DATE_TRUNC('month', created_at) no fuso da sessão que atualiza o
+-- rollup; mantenha o mesmo timezone do banco nas leituras.
+
+-- =================================================
+-- TABELAS
+-- =================================================
+
+CREATE TABLE IF NOT EXISTS rollup_receber_mensal (
+    mes TIMESTAMP WITH TIME ZONE NOT NULL,
+    unidade_id UUID,
+    origem VARCHAR(50) NOT NULL,
+    convenio_id UUID,
+    quantidade_guias BIGINT NOT NULL,
+    guias_com_glosa BIGINT NOT NULL,          -- valor_glosa > 0
+    guias_status_glosa BIGINT NOT NULL,       -- status Glosa_Total / Glosa_Parcial
+    recebidos BIGINT NOT NULL,
+    pendentes BIGINT NOT NULL,
+    valor_bruto_total DECIMAL(16,2) NOT NULL,
+    valor_liquido_total DECIMAL(16,2),
+    valor_glosa_total DECIMAL(16,2),
+    valor_liquido_recebido DECIMAL(16,2),
+    soma_percentual_glosa DECIMAL(18,2),
+    qtd_percentual_glosa BIGINT NOT NULL,
+    menor_glosa DECIMAL(5,2),
+    maior_glosa DECIMAL(5,2),
+    distribuicao_glosa JSONB,                 -- percentual_glosa -> quantidade (mediana exata ao somar grupos)
+    atualizado_em TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Meses que precisam ser recalculados por exclusão ou alteração de linhas
+CREATE TABLE IF NOT EXISTS rollup_receber_pendencias (
+    mes TIMESTAMP WITH TIME ZONE PRIMARY KEY,
+    registrado_em TIMESTAMP WITH TIME ZONE DEFAULT clock_timestamp()
+);
+
+-- Marca d'água da última atualização (linha única)
+CREATE TABLE IF NOT EXISTS rollup_receber_controle (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    marca_dagua TIMESTAMP WITH TIME ZONE,
+    ultima_atualizacao TIMESTAMP WITH TIME ZONE
+);
+
+-- Instalações anteriores guardavam só a mediana de cada grupo, que não se
+-- soma entre grupos: troca pela distribuição e força a recarga completa
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'rollup_receber_mensal'
+                     AND column_name = 'distribuicao_glosa') THEN
+        ALTER TABLE rollup_receber_mensal ADD COLUMN distribuicao_glosa JSONB;
+        ALTER TABLE rollup_receber_mensal DROP COLUMN IF EXISTS mediana_glosa;
+        DELETE FROM rollup_receber_controle;
+    END IF;
+END $$;
+
+-- =================================================
+-- ÍNDICES
+-- =================================================
+
+CREATE INDEX IF NOT EXISTS idx_rollup_receber_mensal_mes ON rollup_receber_mensal(mes);
+CREATE INDEX IF NOT EXISTS idx_contas_receber_updated_at ON contas_receber(updated_at);
+CREATE INDEX IF NOT EXISTS idx_contas_receber_created_at ON contas_receber(created_at);
+
+-- =================================================
+-- TRIGGERS
+-- =================================================
+
+-- Registra o mês original das linhas excluídas ou alteradas; o mês novo de
+-- uma linha alterada é detectado pelo updated_at.
+CREATE OR REPLACE FUNCTION registrar_pendencia_rollup_receber()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO rollup_receber_pendencias (mes)
+    SELECT DISTINCT DATE_TRUNC('month', created_at) FROM linhas_antigas
+    ON CONFLICT (mes) DO UPDATE SET registrado_em = clock_timestamp();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_receber_exclusoes ON contas_receber;
+CREATE TRIGGER rollup_receber_exclusoes AFTER DELETE ON contas_receber
+    REFERENCING OLD TABLE AS linhas_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_pendencia_rollup_receber();
+
+DROP TRIGGER IF EXISTS rollup_receber_alteracoes ON contas_receber;
+CREATE TRIGGER rollup_receber_alteracoes AFTER UPDATE ON contas_receber
+    REFERENCING OLD TABLE AS linhas_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION registrar_pendencia_rollup_receber();
+
+-- =================================================
+-- VIEWS SOBRE O ROLLUP
+-- =================================================
+
+-- Mesmas colunas de vw_analise_glosas, considerando meses completos
+CREATE OR REPLACE VIEW vw_analise_glosas_rollup AS
+SELECT
+    r.mes as mes_referencia,
+    u.nome as unidade_nome,
+    c.nome as convenio_nome,
+    r.origem,
+    SUM(r.quantidade_guias) as total_guias,
+    SUM(r.valor_bruto_total) as valor_provisionado,
+    SUM(r.valor_liquido_total) as valor_recebido,
+    SUM(r.valor_glosa_total) as valor_glosa,
+    ROUND(SUM(r.soma_percentual_glosa) / NULLIF(SUM(r.qtd_percentual_glosa), 0), 2) as percentual_glosa_medio,
+    SUM(r.guias_status_glosa) as guias_com_glosa
+FROM rollup_receber_mensal r
+JOIN unidades u ON u.id = r.unidade_id
+LEFT JOIN convenios c ON c.id = r.convenio_id
+WHERE r.mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')
+GROUP BY r.mes, u.id, u.nome, c.id, c.nome, r.origem
+ORDER BY mes_referencia DESC, valor_glosa DESC;
+
+-- Mesmas colunas de vw_receitas_origem, considerando meses completos
+CREATE OR REPLACE VIEW vw_receitas_origem_rollup AS
+SELECT
+    r.mes as mes_referencia,
+    u.nome as unidade_nome,
+    r.origem,
+    SUM(r.quantidade_guias) as quantidade,
+    SUM(r.valor_bruto_total) as valor_bruto_total,
+    SUM(r.valor_liquido_total) as valor_liquido_total,
+    SUM(r.valor_glosa_total) as valor_glosa_total,
+    ROUND(SUM(r.valor_bruto_total) / SUM(r.quantidade_guias), 2) as ticket_medio,
+    SUM(r.recebidos) as recebidos,
+    SUM(r.pendentes) as pendentes
+FROM rollup_receber_mensal r
+JOIN unidades u ON u.id = r.unidade_id
+WHERE r.mes >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '12 months')
+GROUP BY r.mes, u.id, u.nome, r.origem
+ORDER BY mes_referencia DESC, valor_liquido_total DESC;
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Agregação Incremental - Módulo Financeiro
+FoncareSystem
+
+Combina agregações parciais calculadas bloco a bloco (ex.: blocos vindos de
+AnaliseFinanceira.executar_query_em_blocos) sem manter as linhas em memória.
+Apenas o estado agregado por chave fica residente.
+"""
+
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+
+class AgregadorIncremental:
+    """Acumula sum/count/min/max/mean por chave a partir de DataFrames parciais"""
+
+    SUPORTADAS = ('sum', 'count', 'min', 'max', 'mean')
+
+    # Como cada estatística parcial é combinada com o acumulado
+    _COMBINACAO = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+    def __init__(self, chaves: List[str], agregacoes: Dict[str, List[str]]):
+        """
+        Args:
+            chaves: colunas de agrupamento
+            agregacoes: coluna -> lista de estatísticas (sum, count, min, max, mean)
+        """
+        for coluna, funcoes in agregacoes.items():
+            invalidas = set(funcoes) - set(self.SUPORTADAS)
+            if invalidas:
+                raise ValueError(f"Agregações não suportadas para {coluna}: {sorted(invalidas)}")
+
+        self.chaves = list(chaves)
+        self.agregacoes = agregacoes
+        self.linhas_processadas = 0
+        self.blocos_processados = 0
+        self._parcial = None
+
+        # mean é mantida como sum + count e só dividida no resultado
+        self._internas = {}
+        for coluna, funcoes in agregacoes.items():
+            internas = set()
+            for funcao in funcoes:
+                internas.update(('sum', 'count') if funcao == 'mean' else (funcao,))
+            self._internas[coluna] = sorted(internas)
+
+    def adicionar(self, bloco: pd.DataFrame):
+        """Agrega um bloco e combina com o estado acumulado"""
+        if bloco.empty:
+            return
+
+        parcial = bloco.groupby(self.chaves, dropna=False).agg(
+            **{f"{coluna}__{funcao}": (coluna, funcao)
+               for coluna, funcoes in self._internas.items() for funcao in funcoes}
+        )
+
+        if self._parcial is None:
+            self._parcial = parcial
+        else:
+            combinado = pd.concat([self._parcial, parcial])
+            regras = {nome: self._COMBINACAO[nome.rsplit('__', 1)[1]] for nome in combinado.columns}
+            self._parcial = combinado.groupby(level=list(range(len(self.chaves))), dropna=False).agg(regras)
+
+        self.linhas_processadas += len(bloco)
+        self.blocos_processados += 1
+
+    def consumir(self, blocos: Iterable[pd.DataFrame]) -> 'AgregadorIncremental':
+        """Agrega todos os blocos de um iterador"""
+        for bloco in blocos:
+            self.adicionar(bloco)
+        return self
+
+    def resultado(self) -> pd.DataFrame:
+        """DataFrame final com uma coluna `<coluna>_<funcao>` por estatística pedida"""
+        if self._parcial is None:
+            return pd.DataFrame(columns=self.chaves)
+
+        saida = pd.DataFrame(index=self._parcial.index)
+        for coluna, funcoes in self.agregacoes.items():
+            for funcao in funcoes:
+                if funcao == 'mean':
+                    contagem = self._parcial[f"{coluna}__count"]
+                    saida[f"{coluna}_mean"] = self._parcial[f"{coluna}__sum"] / contagem.where(contagem > 0)
+                else:
+                    saida[f"{coluna}_{funcao}"] = self._parcial[f"{coluna}__{funcao}"]
+        return saida.reset_index()
@@ -8,178 +8,484 @@ análise de glosas e projeções financeiras.
 """
 
 import os
+import time
+import argparse
 import psycopg2
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime
 import numpy as np
-from typing import Dict, List, Tuple
-import json
+from typing import Dict, Iterator, List, Tuple
+import uuid
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from pool_conexoes import configuracao_banco, obter_pool, fechar_pools
+from espelho_local import EspelhoLocal
+from backend_financeiro import BackendPostgres, BackendLocal, InstantaneoSQLite, abrir_instantaneo
+from rollup_receber import RollupReceberMensal
+from previsao_series import PrevisorSeries
+from agregacao_incremental import AgregadorIncremental
+from graficos_financeiro import exportar_graficos
+from exportacao_excel import exportar_excel
+from serializacao_relatorio import EscritorNDJSON, COMPRESSOES, gravar_json
+from tipos_financeiros import tipar, reais, em_reais
+from cache_consultas import CacheConsultas
+from filtros_financeiros import FiltroFinanceiro, argumentos_filtro, filtro_dos_argumentos
+from metricas_execucao import MetricasExecucao, instrumentar_config, medir_etapa, perfil_cprofile
 
 class AnaliseFinanceira:
     def __init__(self):
         """Inicializa a conexão com o banco de dados Supabase"""
         # Configurações do banco (usar variáveis de ambiente em produção)
-        self.db_config = {
-            'host': os.getenv('SUPABASE_DB_HOST', 'localhost'),
-            'database': os.getenv('SUPABASE_DB_NAME', 'postgres'),
-            'user': os.getenv('SUPABASE_DB_USER', 'postgres'),
-            'password': os.getenv('SUPABASE_DB_PASSWORD', ''),
-            'port': os.getenv('SUPABASE_DB_PORT', '5432')
-        }
+        self.db_config = configuracao_banco()
+        # Tempo de banco e linhas lidas por etapa (seção metricas_execucao)
+        instrumentar_config(self.db_config)
+        self.metricas = MetricasExecucao()
+        
+        # Leitura em blocos (cursor no servidor) para resultados grandes
+        self.tamanho_bloco = int(os.getenv('FINANCEIRO_TAMANHO_BLOCO', '50000'))
+        limite_memoria = os.getenv('FINANCEIRO_LIMITE_MEMORIA_MB')
+        self.limite_memoria_mb = float(limite_memoria) if limite_memoria else None
+        
+        # Onde as análises executam: SQL no banco ou pandas sobre um instantâneo local
+        # (espelho Parquet ou SQLite); ver backend_financeiro
+        self.backend = BackendPostgres(self.executar_query, self.executar_query_em_blocos)
         
-        # Configurar estilo dos gráficos
-        plt.style.use('seaborn-v0_8')
-        sns.set_palette("husl")
+        # Espelho Parquet local (opcional) usado no lugar das queries analíticas
+        self.espelho = None
+        self.sincronizacao_espelho = None
+        self.rollup = None
+        self.atualizacao_rollup = None
+        
+        # Cache persistente de resultados (opcional), sob executar_query
+        self.cache = None
+        
+        # Extração dos fatos em partições paralelas (opcional)
+        self.particionamento = None
+        self.execucao_particionada = None
+        
+        # Escopo das análises: janela em meses, período, unidades e convênios
+        self.meses_analise = 12
+        self.filtro = FiltroFinanceiro()
         
     def conectar_bd(self):
-        """Estabelece conexão com o banco de dados"""
+        """Obtém uma conexão do pool compartilhado"""
         try:
-            conn = psycopg2.connect(**self.db_config)
-            return conn
+            return obter_pool(self.db_config).obter()
         except Exception as e:
             print(f"Erro ao conectar ao banco: {e}")
             return None
     
+    def liberar_conexao(self, conn):
+        """Devolve a conexão ao pool para reutilização"""
+        obter_pool(self.db_config).devolver(conn, descartar=bool(conn.closed))
+    
+    def estatisticas_conexoes(self) -> Dict:
+        """Quantidade de conexões abertas e reutilizadas nesta execução"""
+        try:
+            return obter_pool(self.db_config).resumo()
+        except Exception as e:
+            return {"erro": str(e)}
+    
     def executar_query(self, query: str, params: tuple = None) -> pd.DataFrame:
         """Executa query e retorna DataFrame"""
-        conn = self.conectar_bd()
-        if not conn:
-            return pd.DataFrame()
-        
         try:
-            df = pd.read_sql_query(query, conn, params=params)
-            return df
+            return self._ler_query(query, params)
         except Exception as e:
             print(f"Erro ao executar query: {e}")
             return pd.DataFrame()
+    
+    def _ler_query(self, query: str, params: tuple = None) -> pd.DataFrame:
+        """Como executar_query, mas propaga as falhas em vez de devolver um DataFrame vazio"""
+        with self.metricas.consulta(query) as medicao:
+            conn = self.conectar_bd()
+            medicao.conectada()
+            if not conn:
+                raise psycopg2.OperationalError("Sem conexão com o banco")
+            
+            try:
+                ler = partial(medicao.ler, lambda: pd.read_sql_query(query, conn, params=params))
+                if self.cache is not None:
+                    return medicao.resultado(self.cache.consultar(conn, query, params, ler))
+                return medicao.resultado(ler())
+            finally:
+                self.liberar_conexao(conn)
+    
+    # OIDs do PostgreSQL usados para tipar os blocos lidos do cursor
+    _TIPOS_NUMERICOS = {20, 21, 23, 700, 701, 1700}
+    _TIPOS_DATA = {1082, 1114, 1184}
+    
+    def _tipar_bloco(self, linhas: List[tuple], descricao) -> pd.DataFrame:
+        """Monta o DataFrame de um bloco convertendo NUMERIC/datas para dtypes nativos"""
+        df = pd.DataFrame.from_records(linhas, columns=[coluna.name for coluna in descricao])
+        for coluna in descricao:
+            if coluna.type_code in self._TIPOS_NUMERICOS:
+                df[coluna.name] = pd.to_numeric(df[coluna.name].astype(float) if coluna.type_code == 1700
+                                                else df[coluna.name])
+            elif coluna.type_code in self._TIPOS_DATA:
+                df[coluna.name] = pd.to_datetime(df[coluna.name], utc=coluna.type_code == 1184)
+        return df
+    
+    def executar_query_em_blocos(self, query: str, params: tuple = None, tamanho_bloco: int = None,
+                                 limite_memoria_mb: float = None) -> Iterator[pd.DataFrame]:
+        """Executa a query em um cursor nomeado (no servidor) e produz DataFrames tipados por bloco
+        
+        Somente um bloco fica em memória por vez. Com `limite_memoria_mb`, o
+        tamanho do bloco é reduzido conforme o consumo medido por linha. Erros de
+        conexão ou de leitura são propagados ao consumidor.
+        """
+        tamanho = tamanho_bloco or self.tamanho_bloco
+        limite_mb = limite_memoria_mb if limite_memoria_mb is not None else self.limite_memoria_mb
+        
+        conn = self.conectar_bd()
+        if not conn:
+            raise psycopg2.OperationalError("Sem conexão com o banco")
+        
+        # Falhas no meio da leitura chegam ao consumidor: um resultado truncado não pode
+        # passar por completo (detalhe do Excel, totais de agregar_em_blocos)
+        try:
+            with conn.cursor(name=f"blocos_{uuid.uuid4().hex[:12]}") as cursor:
+                cursor.itersize = tamanho
+                cursor.execute(query, params)
+                
+                # Com limite de memória, o primeiro bloco é pequeno e serve para calibrar
+                proximo = min(tamanho, 1000) if limite_mb else tamanho
+                
+                while True:
+                    linhas = cursor.fetchmany(proximo)
+                    if not linhas:
+                        break
+                    
+                    bloco = self._tipar_bloco(linhas, cursor.description)
+                    del linhas
+                    
+                    if limite_mb:
+                        bytes_por_linha = max(bloco.memory_usage(deep=True).sum() / len(bloco), 1)
+                        tamanho = max(1000, min(tamanho, int(limite_mb * 1024 * 1024 / bytes_por_linha)))
+                    proximo = tamanho
+                    
+                    yield bloco
         finally:
-            conn.close()
+            try:
+                conn.rollback()
+            except Exception:
+                # Conexão quebrada: fecha em vez de devolvê-la ao pool
+                obter_pool(self.db_config).devolver(conn, descartar=True)
+            else:
+                self.liberar_conexao(conn)
     
-    def gerar_relatorio_receitas_origem(self, meses: int = 12) -> Dict:
-        """Gera relatório detalhado das origens de receita"""
+    def agregar_em_blocos(self, query: str, chaves: List[str], agregacoes: Dict[str, List[str]],
+                          params: tuple = None, tamanho_bloco: int = None,
+                          limite_memoria_mb: float = None) -> pd.DataFrame:
+        """Agrega o resultado de uma query linha a linha sem materializá-lo inteiro"""
+        agregador = AgregadorIncremental(chaves, agregacoes)
+        agregador.consumir(self.executar_query_em_blocos(query, params, tamanho_bloco, limite_memoria_mb))
+        return agregador.resultado()
+    
+    @medir_etapa()
+    def usar_espelho(self, diretorio: str = None, forcar_reconciliacao: bool = False) -> Dict:
+        """Sincroniza o espelho local incremental e passa a analisar a partir dele
+        
+        Uma falha de consulta interrompe a sincronização sem alterar o espelho.
+        """
+        espelho = EspelhoLocal(self._ler_query, diretorio)
+        self.sincronizacao_espelho = espelho.sincronizar(forcar_reconciliacao)
+        self.espelho = espelho
+        # O espelho não guarda a folha: o dashboard continua no banco
+        self.backend = BackendLocal(espelho, banco=BackendPostgres(self.executar_query, self.executar_query_em_blocos))
+        return self.sincronizacao_espelho
+    
+    def usar_instantaneo(self, caminho: str) -> Dict:
+        """Passa a analisar em processo a partir de um instantâneo, sem acessar o banco
+        
+        Args:
+            caminho: arquivo SQLite (--gerar-instantaneo) ou diretório de um espelho já sincronizado
+        """
+        self.backend = BackendLocal(abrir_instantaneo(caminho))
+        return self.backend.descricao()
+    
+    def gerar_instantaneo(self, caminho: str) -> Dict:
+        """Grava um instantâneo SQLite das tabelas usadas pelas análises"""
+        return InstantaneoSQLite.criar(caminho, self._ler_query)
+    
+    @medir_etapa()
+    def usar_rollup(self, atualizar: bool = True) -> Dict:
+        """Passa a ler contas_receber do rollup mensal, atualizando os meses pendentes antes"""
+        rollup = RollupReceberMensal(self._ler_query, self.db_config)
+        self.atualizacao_rollup = rollup.atualizar() if atualizar else rollup.estado()
+        if atualizar and self.cache is not None:
+            # Os contadores de pg_stat_user_tables podem levar alguns segundos para refletir a escrita;
+            # a marca d'água muda a cada atualização, os agregados só quando há meses recalculados
+            recalculou = bool(self.atualizacao_rollup.get('meses_recalculados'))
+            self.cache.invalidar(RollupReceberMensal.TABELAS if recalculou else ('rollup_receber_controle',))
+        self.rollup = rollup
+        return self.atualizacao_rollup
+    
+    def usar_cache(self, diretorio: str = None, ttl_segundos: float = None, limite_mb: float = None) -> Dict:
+        """Passa a reaproveitar resultados de consultas enquanto as tabelas lidas não mudarem"""
+        self.cache = CacheConsultas(diretorio, ttl_segundos, limite_mb, identificacao_banco=
+                                    f"{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}")
+        return self.cache.resumo()
+    
+    # Colunas dos fatos agregados de contas a receber: valores (centavos) e percentuais de glosa
+    COLUNAS_MONETARIAS_FATOS = ('valor_bruto_total', 'valor_liquido_total', 'valor_glosa_total')
+    COLUNAS_GLOSA_FATOS = ('menor_glosa', 'maior_glosa', 'media_glosa', 'mediana_glosa')
+    COLUNAS_MONETARIAS_GLOSAS = ('valor_provisionado', 'valor_recebido', 'valor_glosa')
+    
+    def usar_filtros(self, filtro: FiltroFinanceiro = None, meses: int = None):
+        """Restringe as análises a um período, unidades e convênios, aplicados no WHERE das consultas
         
-        query = """
-        SELECT 
-            DATE_TRUNC('month', cr.created_at) as mes,
-            u.nome as unidade,
-            cr.origem,
-            c.nome as convenio,
-            COUNT(*) as quantidade_guias,
-            SUM(cr.valor_bruto) as valor_bruto_total,
-            SUM(cr.valor_liquido) as valor_liquido_total,
-            SUM(cr.valor_glosa) as valor_glosa_total,
-            ROUND(AVG(cr.valor_bruto), 2) as ticket_medio,
-            ROUND((SUM(cr.valor_glosa) / NULLIF(SUM(cr.valor_bruto), 0)) * 100, 2) as percentual_glosa
-        FROM contas_receber cr
-        JOIN unidades u ON cr.unidade_id = u.id
-        LEFT JOIN convenios c ON cr.convenio_id = c.id
-        WHERE cr.created_at >= CURRENT_DATE - INTERVAL '%s months'
-        GROUP BY DATE_TRUNC('month', cr.created_at), u.nome, cr.origem, c.nome
-        ORDER BY mes DESC, valor_liquido_total DESC
+        Args:
+            filtro: escopo (ver filtros_financeiros); sem `de`, vale a janela de `meses` meses
+            meses: janela das análises de receitas e glosas (padrão 12)
         """
+        if filtro is not None:
+            self.filtro = filtro
+        if meses is not None:
+            self.meses_analise = meses
+        return self.filtro.resumo()
+    
+    CHAVES_FATOS = ['mes', 'unidade', 'origem', 'convenio']
+    
+    def _tipar_fatos(self, fatos: pd.DataFrame) -> pd.DataFrame:
+        return tipar(fatos, self.COLUNAS_MONETARIAS_FATOS, self.COLUNAS_GLOSA_FATOS)
+    
+    MODOS_PARTICAO = ('mes', 'unidade')
+    
+    def usar_particionamento(self, modo: str = 'mes', max_conexoes: int = 4):
+        """Passa a extrair os fatos de contas a receber em partições consultadas em paralelo
         
-        df = self.executar_query(query, (meses,))
+        Args:
+            modo: 'mes' (um intervalo de created_at por mês) ou 'unidade' (grupos de unidades)
+            max_conexoes: partições consultadas ao mesmo tempo, cada uma em sua conexão do pool
+        """
+        if modo not in self.MODOS_PARTICAO:
+            raise ValueError(f"Modo de particionamento desconhecido: {modo}")
+        self.particionamento = {'modo': modo, 'max_conexoes': max(1, max_conexoes)}
+    
+    def _particoes_fatos(self, meses: int, modo: str, quantidade: int) -> List[Tuple[str, str, tuple]]:
+        """(rótulo, filtro, parâmetros) de cada partição do escopo dos fatos
+        
+        As partições seguem as chaves do agrupamento: por mês, os limites são
+        os inícios de mês calculados no servidor (mesmo fuso do DATE_TRUNC);
+        por unidade, todos os ids de um mesmo nome ficam na mesma partição.
+        Assim cada grupo é calculado inteiro em uma só partição. Cada partição
+        mantém também as condições do filtro de escopo.
+        """
+        condicoes, parametros = self.filtro.condicoes('cr', meses)
+        base = " AND ".join(condicoes)
+        
+        if modo == 'mes':
+            inicio, params_inicio = self.filtro.inicio_periodo(meses)
+            fim, params_fim = self.filtro.fim_periodo()
+            # Último mês: o do fim do período ou, sem fim, o corrente
+            ultimo = f"({fim} - 1)" if fim else "GREATEST(now(), i.inicio)"
+            limites = self._ler_query(f"""
+                SELECT m.mes AS de,
+                       CASE WHEN m.mes < j.ultimo THEN m.mes + INTERVAL '1 month' END AS ate,
+                       TO_CHAR(m.mes, 'YYYY-MM') AS rotulo
+                FROM (SELECT i.inicio, DATE_TRUNC('month', {ultimo}::timestamptz) AS ultimo
+                      FROM (SELECT {inicio}::timestamptz AS inicio) i) j,
+                     generate_series(DATE_TRUNC('month', j.inicio), j.ultimo, INTERVAL '1 month') AS m(mes)
+                ORDER BY m.mes
+            """, tuple(params_fim + params_inicio))
+            particoes = []
+            for linha in limites.itertuples(index=False):
+                if pd.isna(linha.ate):
+                    # Último mês sem limite superior: inclui lançamentos com data futura
+                    particoes.append((linha.rotulo, f"{base} AND cr.created_at >= %s",
+                                      (*parametros, linha.de.to_pydatetime())))
+                else:
+                    particoes.append((linha.rotulo, f"{base} AND cr.created_at >= %s AND cr.created_at < %s",
+                                      (*parametros, linha.de.to_pydatetime(), linha.ate.to_pydatetime())))
+            return particoes
+        
+        if self.filtro.unidades:
+            unidades = self._ler_query("SELECT id::text AS id, nome FROM unidades "
+                                       "WHERE nome = ANY(%s) OR id::text = ANY(%s)",
+                                       (list(self.filtro.unidades), list(self.filtro.unidades)))
+        else:
+            unidades = self._ler_query("SELECT id::text AS id, nome FROM unidades")
+        grupos = [[] for _ in range(max(1, min(quantidade, unidades['nome'].nunique())))]
+        for posicao, (_, ids) in enumerate(unidades.groupby('nome')['id']):
+            grupos[posicao % len(grupos)].extend(ids)
+        filtro = f"{base} AND cr.unidade_id = ANY(%s::uuid[])"
+        return [(f"unidades_{posicao + 1}", filtro, (*parametros, ids)) for posicao, ids in enumerate(grupos) if ids]
+    
+    def _extrair_fatos_particionado(self, meses: int) -> pd.DataFrame:
+        """Executa as partições em conexões paralelas e une os agregados parciais
+        
+        Como nenhum grupo (mês, unidade, origem, convênio) atravessa partições,
+        somas, contagens, mínimo, máximo, média e mediana de cada grupo já vêm
+        completos e a união reproduz exatamente a consulta única.
+        """
+        modo = self.particionamento['modo']
+        max_conexoes = self.particionamento['max_conexoes']
+        inicio = time.perf_counter()
+        particoes = self._particoes_fatos(meses, modo, max_conexoes)
+        
+        obter_pool(self.db_config).ampliar(max_conexoes)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_conexoes, len(particoes))),
+                                thread_name_prefix="particao") as executor:
+            parciais = list(executor.map(
+                lambda particao: self._ler_query(BackendPostgres.SQL_FATOS_RECEBER.format(filtro=particao[1]), particao[2]),
+                particoes))
+        
+        preenchidas = [parcial for parcial in parciais if not parcial.empty]
+        # Sem linhas em nenhuma partição, a primeira ainda traz as colunas
+        fatos = pd.concat(preenchidas, ignore_index=True) if preenchidas else \
+            parciais[0] if parciais else pd.DataFrame()
+        if not fatos.empty and fatos.duplicated(subset=self.CHAVES_FATOS).any():
+            raise ValueError("Partições com grupos em comum: a união não reproduziria a consulta única")
+        
+        self.execucao_particionada = {
+            'modo': modo,
+            'particoes': len(particoes),
+            'conexoes': max(1, min(max_conexoes, len(particoes))),
+            'linhas_por_particao': {rotulo: len(parcial) for (rotulo, _, _), parcial in zip(particoes, parciais)},
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        return fatos
+    
+    @medir_etapa()
+    def extrair_fatos_receber(self, meses: int = 12) -> pd.DataFrame:
+        """Extrai em uma única varredura os fatos agregados por mês, unidade, origem e convênio
+        
+        O resultado alimenta tanto a análise de receitas quanto a de glosas,
+        evitando que contas_receber seja lida e ordenada duas vezes. Os valores
+        vêm em centavos (int64) e as chaves como category (ver tipos_financeiros).
+        """
+        # O backend local aplica os filtros; o rollup cobre só o escopo completo
+        fatos = None
+        if self.backend.local:
+            fatos = self.backend.fatos_receber(meses, self.filtro)
+        elif self.rollup is not None and self.filtro.vazio:
+            fatos = self.rollup.fatos_receber(meses)
+        elif self.particionamento is not None:
+            try:
+                fatos = self._extrair_fatos_particionado(meses)
+            except Exception as e:
+                print(f"⚠️ Extração particionada falhou, usando consulta única: {e}")
+                self.execucao_particionada = {'erro': str(e)}
+        if fatos is None:
+            fatos = self.backend.fatos_receber(meses, self.filtro)
+        
+        fatos = self._tipar_fatos(fatos)
+        # Ordem estável pelas chaves: o resultado não depende do plano nem das partições
+        if not fatos.empty:
+            fatos = fatos.sort_values(self.CHAVES_FATOS, na_position='last', ignore_index=True)
+        return fatos
+    
+    def _frame_receitas(self, fatos: pd.DataFrame) -> pd.DataFrame:
+        """Deriva dos fatos o quadro usado pela análise de receitas por origem"""
+        df = fatos.assign(
+            ticket_medio=(fatos['valor_bruto_total'] / fatos['quantidade_guias'] / 100).round(2),
+            percentual_glosa=(fatos['valor_glosa_total'] / fatos['valor_bruto_total'].where(fatos['valor_bruto_total'] != 0) * 100).round(2)
+        )
+        return df.sort_values(['mes', 'valor_liquido_total'], ascending=False).reset_index(drop=True)
+    
+    def _frame_glosas(self, fatos: pd.DataFrame) -> pd.DataFrame:
+        """Deriva dos fatos o quadro usado pela análise de glosas"""
+        df = fatos[fatos['valor_bruto_total'] > 0].rename(columns={
+            'quantidade_guias': 'total_guias',
+            'valor_bruto_total': 'valor_provisionado',
+            'valor_liquido_total': 'valor_recebido',
+            'valor_glosa_total': 'valor_glosa'
+        })
+        return df.sort_values(['mes', 'valor_glosa'], ascending=False).reset_index(drop=True)
+    
+    @medir_etapa()
+    def gerar_relatorio_receitas_origem(self, meses: int = 12, fatos: pd.DataFrame = None) -> Dict:
+        """Gera relatório detalhado das origens de receita"""
+        
+        if fatos is None:
+            fatos = self.extrair_fatos_receber(meses)
+        
+        df = self._frame_receitas(fatos) if not fatos.empty else fatos
         
         if df.empty:
             return {"erro": "Nenhum dado encontrado"}
         
+        # Somas em centavos, convertidas para reais na saída
+        monetarias = self.COLUNAS_MONETARIAS_FATOS
+        
         # Análises estatísticas
         analise = {
-            "periodo_analise": f"Últimos {meses} meses",
-            "total_receita_bruta": float(df['valor_bruto_total'].sum()),
-            "total_receita_liquida": float(df['valor_liquido_total'].sum()),
-            "total_glosas": float(df['valor_glosa_total'].sum()),
+            "periodo_analise": self.filtro.descricao_periodo(meses),
+            "total_receita_bruta": reais(df['valor_bruto_total'].sum()),
+            "total_receita_liquida": reais(df['valor_liquido_total'].sum()),
+            "total_glosas": reais(df['valor_glosa_total'].sum()),
             "percentual_glosa_geral": round((df['valor_glosa_total'].sum() / df['valor_bruto_total'].sum()) * 100, 2),
             
             # Por origem
-            "receitas_por_origem": df.groupby('origem').agg({
+            "receitas_por_origem": em_reais(df.groupby('origem', observed=True).agg({
                 'valor_liquido_total': 'sum',
                 'quantidade_guias': 'sum',
                 'ticket_medio': 'mean'
-            }).round(2).to_dict(),
+            }), monetarias).round(2).to_dict(),
             
             # Por convênio
-            "receitas_por_convenio": df.groupby('convenio').agg({
+            "receitas_por_convenio": em_reais(df.groupby('convenio', observed=True).agg({
                 'valor_liquido_total': 'sum',
                 'percentual_glosa': 'mean'
-            }).round(2).to_dict(),
+            }), monetarias).round(2).to_dict(),
             
             # Tendências mensais
-            "tendencia_mensal": df.groupby('mes').agg({
+            "tendencia_mensal": em_reais(df.groupby('mes').agg({
                 'valor_liquido_total': 'sum',
                 'valor_glosa_total': 'sum'
-            }).round(2).to_dict(),
+            }), monetarias).round(2).to_dict(),
             
             # Top performing
-            "top_origens": df.groupby('origem')['valor_liquido_total'].sum().sort_values(ascending=False).head(5).to_dict(),
-            "top_convenios": df.groupby('convenio')['valor_liquido_total'].sum().sort_values(ascending=False).head(5).to_dict()
+            "top_origens": reais(df.groupby('origem', observed=True)['valor_liquido_total'].sum().sort_values(ascending=False).head(5)).to_dict(),
+            "top_convenios": reais(df.groupby('convenio', observed=True)['valor_liquido_total'].sum().sort_values(ascending=False).head(5)).to_dict()
         }
         
         return analise
     
-    def analise_glosas_detalhada(self) -> Dict:
+    @medir_etapa()
+    def analise_glosas_detalhada(self, fatos: pd.DataFrame = None) -> Dict:
         """Análise detalhada de glosas e sua evolução"""
         
-        query = """
-        SELECT 
-            DATE_TRUNC('month', cr.created_at) as mes,
-            u.nome as unidade,
-            c.nome as convenio,
-            cr.origem,
-            COUNT(*) as total_guias,
-            COUNT(CASE WHEN cr.valor_glosa > 0 THEN 1 END) as guias_com_glosa,
-            SUM(cr.valor_bruto) as valor_provisionado,
-            SUM(cr.valor_liquido) as valor_recebido,
-            SUM(cr.valor_glosa) as valor_glosa,
-            MIN(cr.percentual_glosa) as menor_glosa,
-            MAX(cr.percentual_glosa) as maior_glosa,
-            AVG(cr.percentual_glosa) as media_glosa,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY cr.percentual_glosa) as mediana_glosa
-        FROM contas_receber cr
-        JOIN unidades u ON cr.unidade_id = u.id
-        LEFT JOIN convenios c ON cr.convenio_id = c.id
-        WHERE cr.created_at >= CURRENT_DATE - INTERVAL '12 months'
-        GROUP BY DATE_TRUNC('month', cr.created_at), u.nome, c.nome, cr.origem
-        HAVING SUM(cr.valor_bruto) > 0
-        ORDER BY mes DESC, valor_glosa DESC
-        """
+        if fatos is None:
+            fatos = self.extrair_fatos_receber(12)
         
-        df = self.executar_query(query)
+        df = self._frame_glosas(fatos) if not fatos.empty else fatos
         
         if df.empty:
             return {"erro": "Nenhum dado de glosas encontrado"}
         
+        monetarias = self.COLUNAS_MONETARIAS_GLOSAS
+        
         analise_glosas = {
             "resumo_geral": {
-                "total_provisionado": float(df['valor_provisionado'].sum()),
-                "total_recebido": float(df['valor_recebido'].sum()),
-                "total_glosado": float(df['valor_glosa'].sum()),
+                "total_provisionado": reais(df['valor_provisionado'].sum()),
+                "total_recebido": reais(df['valor_recebido'].sum()),
+                "total_glosado": reais(df['valor_glosa'].sum()),
                 "percentual_glosa_geral": round((df['valor_glosa'].sum() / df['valor_provisionado'].sum()) * 100, 2),
                 "taxa_glosa_media": round(df['media_glosa'].mean(), 2),
                 "guias_afetadas_por_glosa": int(df['guias_com_glosa'].sum()),
                 "total_guias": int(df['total_guias'].sum())
             },
             
-            "glosas_por_convenio": df.groupby('convenio').agg({
+            "glosas_por_convenio": em_reais(df.groupby('convenio', observed=True).agg({
                 'valor_glosa': 'sum',
                 'valor_provisionado': 'sum',
                 'media_glosa': 'mean'
             }).assign(
                 percentual_glosa=lambda x: round((x['valor_glosa'] / x['valor_provisionado']) * 100, 2)
-            ).round(2).to_dict(),
+            ), monetarias).round(2).to_dict(),
             
-            "evolucao_mensal": df.groupby('mes').agg({
+            "evolucao_mensal": em_reais(df.groupby('mes').agg({
                 'valor_provisionado': 'sum',
                 'valor_recebido': 'sum',
                 'valor_glosa': 'sum',
                 'media_glosa': 'mean'
-            }).round(2).to_dict(),
+            }), monetarias).round(2).to_dict(),
             
             "pior_performance": {
                 "convenio_maior_glosa": df.loc[df['valor_glosa'].idxmax(), 'convenio'],
-                "valor_maior_glosa": float(df['valor_glosa'].max()),
+                "valor_maior_glosa": reais(df['valor_glosa'].max()),
                 "origem_maior_glosa": df.loc[df['media_glosa'].idxmax(), 'origem'],
                 "percentual_maior_glosa": float(df['media_glosa'].max())
             }
@@ -187,70 +493,137 @@ class AnaliseFinanceira:
         
         return analise_glosas
     
-    def projecao_fluxo_caixa(self, meses_projecao: int = 6) -> Dict:
+    # Meses completos de histórico usados na projeção (dois ciclos anuais)
+    MESES_HISTORICO_PROJECAO = 24
+    
+    @medir_etapa()
+    def projecao_fluxo_caixa(self, meses_projecao: int = 6, meses_historico: int = None) -> Dict:
         """Projeta fluxo de caixa baseado em dados históricos"""
+        meses_historico = meses_historico or self.MESES_HISTORICO_PROJECAO
+        # Um mês a mais cobre o mês parcial do início da janela
+        df_receitas = self._carregar_historico_receitas(meses_historico + 1)
+        df_despesas = self._carregar_historico_despesas(meses_historico + 1)
+        return self._calcular_projecao(df_receitas, df_despesas, meses_projecao, meses_historico)
+    
+    @medir_etapa()
+    def _carregar_historico_receitas(self, meses: int = 12) -> pd.DataFrame:
+        """Receitas recebidas por mês e unidade"""
+        # A projeção sempre usa os últimos meses completos; o filtro restringe unidades e convênios
+        if not self.backend.local and self.rollup is not None and not self.filtro.unidades \
+                and not self.filtro.convenios:
+            return tipar(self.rollup.historico_receitas(meses), ('receita_total',))
+        return tipar(self.backend.historico_receitas(meses, self.filtro), ('receita_total',))
+    
+    @medir_etapa()
+    def _carregar_historico_despesas(self, meses: int = 12) -> pd.DataFrame:
+        """Despesas pagas por mês, unidade e categoria"""
+        # contas_pagar não tem convênio: só o filtro de unidades se aplica
+        return tipar(self.backend.historico_despesas(meses, self.filtro), ('despesa_total',))
+    
+    @medir_etapa()
+    def _calcular_projecao(self, df_receitas: pd.DataFrame, df_despesas: pd.DataFrame,
+                           meses_projecao: int = 6, meses_historico: int = None) -> Dict:
+        """Calcula a projeção a partir dos históricos já carregados
         
-        # Receitas históricas
-        query_receitas = """
-        SELECT 
-            DATE_TRUNC('month', created_at) as mes,
-            SUM(valor_liquido) as receita_total
-        FROM contas_receber 
-        WHERE created_at >= CURRENT_DATE - INTERVAL '12 months'
-        AND status = 'Recebido'
-        GROUP BY DATE_TRUNC('month', created_at)
-        ORDER BY mes
+        Todas as séries (receita por unidade, despesa por unidade × categoria e
+        os totais da empresa) são ajustadas juntas por PrevisorSeries sobre os
+        últimos `meses_historico` meses completos do calendário. O mês
+        corrente, ainda incompleto, fica fora do ajuste e é o primeiro projetado.
         """
+        meses_historico = meses_historico or self.MESES_HISTORICO_PROJECAO
+        if df_receitas.empty or df_despesas.empty:
+            return {"erro": "Dados insuficientes para projeção"}
         
-        # Despesas históricas
-        query_despesas = """
-        SELECT 
-            DATE_TRUNC('month', created_at) as mes,
-            categoria,
-            SUM(valor) as despesa_total
-        FROM contas_pagar 
-        WHERE created_at >= CURRENT_DATE - INTERVAL '12 months'
-        AND status = 'Pago'
-        GROUP BY DATE_TRUNC('month', created_at), categoria
-        ORDER BY mes
-        """
+        # Históricos tipados: valores em centavos e chaves como category
+        mes_corrente = pd.Timestamp.now().to_period('M')
+        series = pd.concat([
+            pd.DataFrame({'tipo': 'receita', 'unidade': df_receitas['unidade'].astype(object), 'categoria': 'Receita',
+                          'mes': df_receitas['mes'], 'valor': reais(df_receitas['receita_total'])}),
+            pd.DataFrame({'tipo': 'despesa', 'unidade': df_despesas['unidade'].astype(object),
+                          'categoria': df_despesas['categoria'].astype(object).fillna('Sem categoria'),
+                          'mes': df_despesas['mes'], 'valor': reais(df_despesas['despesa_total'])}),
+        ], ignore_index=True)
+        series['valor'] = series['valor'].astype(float)
+        periodos = PrevisorSeries.periodos_mensais(series['mes'])
+        series = series[(periodos >= mes_corrente - meses_historico) & (periodos < mes_corrente)]
+        if series.empty:
+            return {"erro": "Dados insuficientes para projeção"}
         
-        df_receitas = self.executar_query(query_receitas)
-        df_despesas = self.executar_query(query_despesas)
+        # Totais da empresa entram como séries próprias para terem suas bandas
+        totais = series.groupby(['tipo', 'mes'], as_index=False)['valor'].sum()
+        series = pd.concat([series, totais.assign(unidade='Total', categoria='Total')], ignore_index=True)
         
-        if df_receitas.empty or df_despesas.empty:
+        previsor = PrevisorSeries()
+        inicio = time.perf_counter()
+        try:
+            previsoes, estatisticas = previsor.prever(series, ['tipo', 'unidade', 'categoria'], 'mes', 'valor',
+                                                      meses_projecao, ultimo_mes=mes_corrente - 1)
+        except ValueError:
+            # Poucos meses completos para o modelo (ex.: instalação recente)
             return {"erro": "Dados insuficientes para projeção"}
+        tempo_ajuste = time.perf_counter() - inicio
         
-        # Calcular médias e tendências
-        media_receita = df_receitas['receita_total'].mean()
-        crescimento_receita = np.polyfit(range(len(df_receitas)), df_receitas['receita_total'], 1)[0]
-        
-        media_despesas = df_despesas.groupby('mes')['despesa_total'].sum().mean()
-        crescimento_despesas = np.polyfit(range(len(df_despesas.groupby('mes')['despesa_total'].sum())), 
-                                        df_despesas.groupby('mes')['despesa_total'].sum(), 1)[0]
+        total = previsoes[previsoes['unidade'] == 'Total'].set_index(['tipo', 'mes'])
+        estatisticas_total = estatisticas[estatisticas['unidade'] == 'Total'].set_index('tipo')
         
-        # Projetar próximos meses
         projecoes = []
-        for i in range(1, meses_projecao + 1):
-            mes_futuro = datetime.now() + timedelta(days=30 * i)
-            receita_projetada = media_receita + (crescimento_receita * i)
-            despesa_projetada = media_despesas + (crescimento_despesas * i)
+        for mes in sorted(previsoes['mes'].unique()):
+            receita = total.loc[('receita', mes)] if ('receita', mes) in total.index else None
+            despesa = total.loc[('despesa', mes)] if ('despesa', mes) in total.index else None
+            receita_projetada = float(receita['projetado']) if receita is not None else 0.0
+            despesa_projetada = float(despesa['projetado']) if despesa is not None else 0.0
             
             projecoes.append({
-                "mes": mes_futuro.strftime("%Y-%m"),
+                "mes": mes,
                 "receita_projetada": round(receita_projetada, 2),
                 "despesa_projetada": round(despesa_projetada, 2),
-                "resultado_projetado": round(receita_projetada - despesa_projetada, 2)
+                "resultado_projetado": round(receita_projetada - despesa_projetada, 2),
+                "receita_intervalo": [round(float(receita['limite_inferior']), 2),
+                                      round(float(receita['limite_superior']), 2)] if receita is not None else None,
+                "despesa_intervalo": [round(float(despesa['limite_inferior']), 2),
+                                      round(float(despesa['limite_superior']), 2)] if despesa is not None else None
             })
         
+        def _por_serie(tipo: str, chaves: List[str]) -> List[Dict]:
+            detalhe = previsoes[(previsoes['tipo'] == tipo) & (previsoes['unidade'] != 'Total')]
+            resumo = estatisticas[(estatisticas['tipo'] == tipo) & (estatisticas['unidade'] != 'Total')]
+            resultado = []
+            for _, linha in resumo.iterrows():
+                filtro = np.logical_and.reduce([detalhe[chave] == linha[chave] for chave in chaves])
+                resultado.append({
+                    **{chave: linha[chave] for chave in chaves},
+                    "media_mensal": round(float(linha['media_mensal']), 2),
+                    "tendencia_mensal": round(float(linha['tendencia_mensal']), 2),
+                    "projecoes": [
+                        {"mes": p['mes'], "projetado": round(p['projetado'], 2),
+                         "intervalo": [round(p['limite_inferior'], 2), round(p['limite_superior'], 2)]}
+                        for p in detalhe[filtro].to_dict('records')
+                    ]
+                })
+            return resultado
+        
+        def _estatistica(tipo: str, coluna: str) -> float:
+            if tipo not in estatisticas_total.index:
+                return 0.0
+            return round(float(estatisticas_total.loc[tipo, coluna]), 2)
+        
         projecao = {
             "historico": {
-                "media_receita_mensal": round(media_receita, 2),
-                "media_despesa_mensal": round(media_despesas, 2),
-                "crescimento_receita_mensal": round(crescimento_receita, 2),
-                "crescimento_despesa_mensal": round(crescimento_despesas, 2)
+                "media_receita_mensal": _estatistica('receita', 'media_mensal'),
+                "media_despesa_mensal": _estatistica('despesa', 'media_mensal'),
+                "crescimento_receita_mensal": _estatistica('receita', 'tendencia_mensal'),
+                "crescimento_despesa_mensal": _estatistica('despesa', 'tendencia_mensal')
             },
             "projecoes": projecoes,
+            "receitas_por_unidade": _por_serie('receita', ['unidade']),
+            "despesas_por_unidade_categoria": _por_serie('despesa', ['unidade', 'categoria']),
+            "modelo": {
+                "meses_historico": previsor.meses_historico,
+                "harmonicos_sazonais": previsor.harmonicos_usados,
+                "nivel_confianca": previsor.nivel_confianca,
+                "series_ajustadas": len(estatisticas),
+                "tempo_ajuste_ms": round(tempo_ajuste * 1000, 2)
+            },
             "alerta": self._gerar_alertas_projecao(projecoes)
         }
         
@@ -264,40 +637,227 @@ class AnaliseFinanceira:
             if proj["resultado_projetado"] < 0:
                 alertas.append(f"⚠️ Resultado negativo projetado para {proj['mes']}: R$ {proj['resultado_projetado']}")
             
-            if proj["despesa_projetada"] > proj["receita_projetada"] * 0.9:
+            if proj["receita_projetada"] > 0 and proj["despesa_projetada"] > proj["receita_projetada"] * 0.9:
                 alertas.append(f"⚠️ Despesas muito altas em {proj['mes']}: {round((proj['despesa_projetada']/proj['receita_projetada'])*100, 1)}% da receita")
         
         return alertas
     
-    def gerar_relatorio_completo(self, salvar_arquivo: bool = True) -> Dict:
-        """Gera relatório financeiro completo"""
+    def _executar_secao(self, nome: str, funcao, *args) -> Dict:
+        """Executa uma seção do relatório isolando falhas das demais"""
+        try:
+            return funcao(*args)
+        except Exception as e:
+            print(f"❌ Falha na seção {nome}: {e}")
+            return {"erro": f"Falha ao gerar {nome}: {e}"}
+    
+    @medir_etapa()
+    def dashboard_unidades(self) -> Dict:
+        """Indicadores do mês corrente por unidade (sem o fan-out de vw_dashboard_financeiro)"""
+        return self.backend.dashboard_unidades(self.filtro.unidades)
+    
+    def detalhe_contas_receber(self, tamanho_bloco: int = None) -> Iterator[pd.DataFrame]:
+        """Contas a receber do escopo da análise, linha a linha, em blocos (cursor no servidor ou instantâneo)"""
+        return self.backend.detalhe_contas_receber(self.meses_analise, self.filtro, tamanho_bloco)
+    
+    @medir_etapa("excel")
+    def _exportar_excel(self, relatorio: Dict, caminho: str, detalhe: bool) -> Dict:
+        detalhes = {"Contas a receber": self.detalhe_contas_receber()} if detalhe else None
+        return exportar_excel(relatorio, caminho, detalhes)
+    
+    def _coletar_secoes_paralelo(self, max_workers: int, secoes: Tuple[str, ...]) -> Dict[str, Dict]:
+        """Executa as seções escolhidas e suas queries ao mesmo tempo"""
+        if self.backend.usa_banco:
+            # Cada worker usa sua própria conexão do pool (mais as das partições dos fatos)
+            particoes = self.particionamento['max_conexoes'] - 1 if self.particionamento else 0
+            obter_pool(self.db_config).ampliar(max_workers + particoes)
         
-        print("🔄 Gerando análise de receitas por origem...")
-        receitas = self.gerar_relatorio_receitas_origem()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="relatorio") as executor:
+            futuros = {}
+            if "receitas_por_origem" in secoes or "analise_glosas" in secoes:
+                futuro_fatos = executor.submit(self.extrair_fatos_receber, self.meses_analise)
+                
+                def _receitas():
+                    return self.gerar_relatorio_receitas_origem(self.meses_analise, futuro_fatos.result())
+                
+                def _glosas():
+                    return self.analise_glosas_detalhada(futuro_fatos.result())
+                
+                if "receitas_por_origem" in secoes:
+                    futuros["receitas_por_origem"] = executor.submit(self._executar_secao, "receitas por origem",
+                                                                     _receitas)
+                if "analise_glosas" in secoes:
+                    futuros["analise_glosas"] = executor.submit(self._executar_secao, "análise de glosas", _glosas)
+            
+            if "projecao_fluxo_caixa" in secoes:
+                futuro_hist_receitas = executor.submit(self._carregar_historico_receitas,
+                                                       self.MESES_HISTORICO_PROJECAO + 1)
+                futuro_hist_despesas = executor.submit(self._carregar_historico_despesas,
+                                                       self.MESES_HISTORICO_PROJECAO + 1)
+                
+                def _projecao():
+                    return self._calcular_projecao(futuro_hist_receitas.result(),
+                                                   futuro_hist_despesas.result())
+                
+                futuros["projecao_fluxo_caixa"] = executor.submit(self._executar_secao,
+                                                                  "projeção de fluxo de caixa", _projecao)
+            
+            if "dashboard_unidades" in secoes:
+                futuros["dashboard_unidades"] = executor.submit(self._executar_secao, "dashboard por unidade",
+                                                                self.dashboard_unidades)
+            return {secao: futuros[secao].result() for secao in secoes}
+    
+    FORMATOS_RELATORIO = ('json', 'ndjson')
+    SECOES_RELATORIO = ('receitas_por_origem', 'analise_glosas', 'projecao_fluxo_caixa', 'dashboard_unidades')
+    
+    def gerar_relatorio_completo(self, salvar_arquivo: bool = True, paralelo: bool = False,
+                                 max_workers: int = 4, diretorio_graficos: str = None,
+                                 formato: str = 'json', compacto: bool = False,
+                                 compressao: str = None, secoes: List[str] = None,
+                                 arquivo_excel: str = None, detalhe_excel: bool = False) -> Dict:
+        """Gera relatório financeiro completo
         
-        print("🔄 Analisando glosas detalhadamente...")
-        glosas = self.analise_glosas_detalhada()
+        `secoes` restringe o relatório a parte de SECOES_RELATORIO; o resumo
+        executivo só é montado com receitas, glosas e projeção presentes.
         
-        print("🔄 Projetando fluxo de caixa...")
-        projecao = self.projecao_fluxo_caixa()
+        Com `diretorio_graficos`, também exporta os gráficos das seções
+        (matplotlib só é carregado nesse caso, nos processos de renderização).
         
-        relatorio_completo = {
-            "data_geracao": datetime.now().isoformat(),
-            "versao": "1.0",
-            "receitas_por_origem": receitas,
-            "analise_glosas": glosas,
-            "projecao_fluxo_caixa": projecao,
-            "resumo_executivo": self._gerar_resumo_executivo(receitas, glosas, projecao)
-        }
+        Com `arquivo_excel` ('' para o nome padrão), exporta receitas, glosas e
+        projeção para .xlsx; `detalhe_excel` acrescenta as contas a receber do
+        escopo, linha a linha, lidas em blocos e gravadas em memória constante.
+        
+        O arquivo é gravado com tipos preservados (datas ISO, Decimal exato,
+        NaN como null). Em `formato='ndjson'` cada seção vira uma linha gravada
+        assim que fica pronta; `compacto` dispensa a indentação e `compressao`
+        ('gzip' ou 'zstd') comprime a saída.
+        """
+        if formato not in self.FORMATOS_RELATORIO:
+            raise ValueError(f"Formato desconhecido: {formato}")
+        if paralelo and max_workers < 1:
+            raise ValueError(f"max_workers deve ser pelo menos 1: {max_workers}")
+        desconhecidas = set(secoes or ()) - set(self.SECOES_RELATORIO)
+        if desconhecidas:
+            raise ValueError(f"Seções desconhecidas: {', '.join(sorted(desconhecidas))}")
+        # Na ordem do relatório, qualquer que seja a ordem pedida
+        secoes = tuple(secao for secao in self.SECOES_RELATORIO if not secoes or secao in secoes)
+        # Métricas novas a cada execução (serviço residente): a duração não inclui o intervalo entre elas
+        metricas = self.metricas = MetricasExecucao()
+        
+        nome_arquivo = f"relatorio_financeiro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+        escritor = EscritorNDJSON(nome_arquivo, compressao) if salvar_arquivo and formato == 'ndjson' else None
+        relatorio_completo = {}
         
-        if salvar_arquivo:
-            nome_arquivo = f"relatorio_financeiro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(nome_arquivo, 'w', encoding='utf-8') as f:
-                json.dump(relatorio_completo, f, indent=2, ensure_ascii=False, default=str)
-            print(f"✅ Relatório salvo em: {nome_arquivo}")
+        def _registrar(secao: str, dados):
+            relatorio_completo[secao] = dados
+            if escritor is not None:
+                with metricas.etapa("serializacao"):
+                    escritor.escrever(secao, dados)
+            return dados
+        
+        try:
+            _registrar("data_geracao", datetime.now().isoformat())
+            _registrar("versao", "1.0")
+            if not self.filtro.vazio or self.meses_analise != 12:
+                _registrar("filtros", {**self.filtro.resumo(), "meses": self.meses_analise})
+            
+            resultados = {}
+            if paralelo:
+                print(f"🔄 Gerando seções em paralelo ({max_workers} workers)...")
+                for secao, dados in self._coletar_secoes_paralelo(max_workers, secoes).items():
+                    resultados[secao] = _registrar(secao, dados)
+            else:
+                if "receitas_por_origem" in secoes or "analise_glosas" in secoes:
+                    print("🔄 Extraindo fatos de contas a receber...")
+                    try:
+                        fatos = self.extrair_fatos_receber(self.meses_analise)
+                    except Exception as e:
+                        # Como no modo paralelo, a falha vira o erro de cada seção que usa os fatos
+                        fatos = e
+                    
+                    def _com_fatos(funcao, *args):
+                        if isinstance(fatos, Exception):
+                            raise fatos
+                        return funcao(*args, fatos)
+                    
+                    if "receitas_por_origem" in secoes:
+                        print("🔄 Gerando análise de receitas por origem...")
+                        resultados["receitas_por_origem"] = _registrar("receitas_por_origem", self._executar_secao(
+                            "receitas por origem", _com_fatos, self.gerar_relatorio_receitas_origem,
+                            self.meses_analise))
+                    
+                    if "analise_glosas" in secoes:
+                        print("🔄 Analisando glosas detalhadamente...")
+                        resultados["analise_glosas"] = _registrar("analise_glosas", self._executar_secao(
+                            "análise de glosas", _com_fatos, self.analise_glosas_detalhada))
+                    del fatos
+                
+                if "projecao_fluxo_caixa" in secoes:
+                    print("🔄 Projetando fluxo de caixa...")
+                    resultados["projecao_fluxo_caixa"] = _registrar("projecao_fluxo_caixa", self._executar_secao(
+                        "projeção de fluxo de caixa", self.projecao_fluxo_caixa))
+                
+                if "dashboard_unidades" in secoes:
+                    print("🔄 Consolidando dashboard por unidade...")
+                    resultados["dashboard_unidades"] = _registrar("dashboard_unidades", self._executar_secao(
+                        "dashboard por unidade", self.dashboard_unidades))
+            
+            if all(secao in resultados for secao in ("receitas_por_origem", "analise_glosas", "projecao_fluxo_caixa")):
+                _registrar("resumo_executivo", self._gerar_resumo_executivo(
+                    resultados["receitas_por_origem"], resultados["analise_glosas"], resultados["projecao_fluxo_caixa"]))
+            modo_execucao = {"paralelo": paralelo, "max_workers": max_workers if paralelo else 1,
+                             "secoes": list(secoes)}
+            if self.particionamento is not None:
+                modo_execucao["particionamento_fatos"] = self.execucao_particionada
+            _registrar("modo_execucao", modo_execucao)
+            if self.backend.usa_banco:
+                _registrar("estatisticas_conexoes", self.estatisticas_conexoes())
+            if self.cache is not None:
+                _registrar("cache_consultas", self.cache.resumo())
+            
+            if self.backend.local:
+                _registrar("backend", self.backend.descricao())
+            if self.espelho is not None:
+                _registrar("espelho_local", {
+                    "diretorio": self.espelho.diretorio,
+                    "sincronizacao": self.sincronizacao_espelho
+                })
+            elif self.rollup is not None:
+                _registrar("rollup_mensal", self.atualizacao_rollup)
+            
+            if diretorio_graficos is not None:
+                print("🔄 Renderizando gráficos...")
+                with self.metricas.etapa("graficos"):
+                    graficos = exportar_graficos(relatorio_completo, diretorio_graficos or "graficos", max_workers)
+                _registrar("graficos", graficos)
+            
+            if arquivo_excel is not None:
+                print("🔄 Exportando planilhas Excel...")
+                _registrar("excel", self._executar_secao(
+                    "exportação Excel", self._exportar_excel, relatorio_completo,
+                    arquivo_excel or nome_arquivo.rsplit('.', 1)[0] + '.xlsx', detalhe_excel))
+            
+            if escritor is not None or not salvar_arquivo:
+                _registrar("metricas_execucao", metricas.resumo())
+        finally:
+            if escritor is not None:
+                escritor.fechar()
+        
+        if escritor is not None:
+            print(f"✅ Relatório salvo em: {escritor.caminho}")
+        elif salvar_arquivo:
+            marca = metricas.iniciar_etapa("serializacao")
+            
+            def _metricas():
+                # Chamado depois da codificação do documento, que assim entra na medição
+                metricas.encerrar_etapa(marca)
+                return {"metricas_execucao": _registrar("metricas_execucao", metricas.resumo())}
+            
+            caminho = gravar_json(relatorio_completo, nome_arquivo, compacto, compressao, secoes_finais=_metricas)
+            print(f"✅ Relatório salvo em: {caminho}")
         
         return relatorio_completo
     
+    @medir_etapa()
     def _gerar_resumo_executivo(self, receitas: Dict, glosas: Dict, projecao: Dict) -> Dict:
         """Gera resumo executivo dos principais indicadores"""
         
@@ -334,18 +894,108 @@ class AnaliseFinanceira:
 
 def main():
     """Função principal - executa análise completa"""
+    parser = argparse.ArgumentParser(description="Análise financeira automática do FoncareSystem")
+    parser.add_argument("--paralelo", action="store_true",
+                        help="executa as seções independentes do relatório em paralelo")
+    parser.add_argument("--max-workers", type=int, default=4,
+                        help="número de workers (e conexões) no modo paralelo")
+    parser.add_argument("--particionar", choices=AnaliseFinanceira.MODOS_PARTICAO, default=None,
+                        help="extrai os fatos de contas a receber em partições (por mês ou unidade) em paralelo")
+    parser.add_argument("--conexoes-particao", type=int, default=4,
+                        help="partições consultadas ao mesmo tempo com --particionar (padrão 4)")
+    parser.add_argument("--espelho", nargs="?", const="", default=None, metavar="DIR",
+                        help="sincroniza o espelho Parquet local e analisa a partir dele")
+    parser.add_argument("--reconciliar", action="store_true",
+                        help="força a verificação de exclusões no espelho local")
+    parser.add_argument("--rollup", action="store_true",
+                        help="lê contas a receber do rollup mensal (atualiza os meses pendentes antes)")
+    parser.add_argument("--instantaneo", default=None, metavar="CAMINHO",
+                        help="analisa em processo, sem banco, a partir de um instantâneo SQLite "
+                        "ou do diretório de um espelho já sincronizado")
+    parser.add_argument("--gerar-instantaneo", default=None, metavar="ARQUIVO",
+                        help="grava um instantâneo SQLite das tabelas das análises e encerra")
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="reaproveita resultados de consultas cujas tabelas não mudaram (padrão: ./.cache_financeiro)")
+    parser.add_argument("--cache-ttl", type=float, default=None,
+                        help="validade máxima das entradas do cache em segundos")
+    parser.add_argument("--graficos", nargs="?", const="", default=None, metavar="DIR",
+                        help="exporta os gráficos de receitas, glosas e projeção (padrão: ./graficos)")
+    parser.add_argument("--excel", nargs="?", const="", default=None, metavar="ARQUIVO",
+                        help="exporta receitas, glosas e projeção para .xlsx (padrão: nome do relatório)")
+    parser.add_argument("--excel-detalhe", action="store_true",
+                        help="inclui no Excel as contas a receber do escopo, linha a linha")
+    parser.add_argument("--formato", choices=AnaliseFinanceira.FORMATOS_RELATORIO, default="json",
+                        help="json (documento único) ou ndjson (uma seção por linha, gravada ao concluir)")
+    parser.add_argument("--compacto", action="store_true", help="grava o JSON sem indentação")
+    parser.add_argument("--compressao", choices=sorted(COMPRESSOES), default=None,
+                        help="comprime o relatório (zstd requer o pacote zstandard)")
+    parser.add_argument("--secoes", nargs="+", choices=AnaliseFinanceira.SECOES_RELATORIO, default=None,
+                        metavar="SECAO", help="seções a gerar (padrão: todas): "
+                        + ", ".join(AnaliseFinanceira.SECOES_RELATORIO))
+    parser.add_argument("--meses", type=int, default=12,
+                        help="janela de receitas e glosas em meses quando --de não é informado (padrão 12)")
+    argumentos_filtro(parser)
+    parser.add_argument("--cprofile", default=None, metavar="ARQUIVO",
+                        help="grava um perfil cProfile da execução (thread principal) em ARQUIVO, formato pstats")
+    args = parser.parse_args()
+    if args.max_workers < 1:
+        parser.error("--max-workers deve ser pelo menos 1")
+    try:
+        filtro = filtro_dos_argumentos(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
     print("🏥 FoncareSystem - Análise Financeira Automática")
     print("=" * 50)
     
     analise = AnaliseFinanceira()
     
+    if args.gerar_instantaneo:
+        try:
+            print("🔄 Gerando instantâneo SQLite...")
+            instantaneo = analise.gerar_instantaneo(args.gerar_instantaneo)
+            for tabela, linhas in instantaneo["linhas"].items():
+                print(f"   {tabela}: {linhas} linhas")
+            print(f"✅ Instantâneo salvo em: {instantaneo['arquivo']} ({instantaneo['segundos']}s)")
+            return 0
+        except Exception as e:
+            print(f"❌ Erro ao gerar instantâneo: {e}")
+            return 1
+        finally:
+            fechar_pools()
+    
     try:
-        relatorio = analise.gerar_relatorio_completo()
-        
-        print("\n📊 RESUMO EXECUTIVO")
-        print("-" * 30)
+        with perfil_cprofile(args.cprofile):
+            if args.cache is not None:
+                analise.usar_cache(args.cache or None, args.cache_ttl)
+            if args.particionar:
+                analise.usar_particionamento(args.particionar, args.conexoes_particao)
+            analise.usar_filtros(filtro, args.meses)
+            
+            if args.instantaneo:
+                descricao = analise.usar_instantaneo(args.instantaneo)
+                print(f"💾 Analisando em processo a partir de {descricao['caminho']} ({descricao['instantaneo']})")
+            elif args.espelho is not None:
+                print("🔄 Sincronizando espelho local...")
+                sincronizacao = analise.usar_espelho(args.espelho or None, args.reconciliar)
+                for tabela, info in sincronizacao.items():
+                    print(f"   {tabela}: {info['linhas_recebidas']} linhas novas/alteradas "
+                          f"em {info['tempo_segundos']}s")
+            elif args.rollup:
+                print("🔄 Atualizando rollup mensal...")
+                atualizacao = analise.usar_rollup()
+                print(f"   {atualizacao['modo']}: {atualizacao['linhas_gravadas']} linhas "
+                      f"em {atualizacao['segundos']}s")
+            
+            relatorio = analise.gerar_relatorio_completo(paralelo=args.paralelo, max_workers=args.max_workers,
+                                                         diretorio_graficos=args.graficos, formato=args.formato,
+                                                         compacto=args.compacto, compressao=args.compressao,
+                                                         secoes=args.secoes, arquivo_excel=args.excel,
+                                                         detalhe_excel=args.excel_detalhe)
         
         if "resumo_executivo" in relatorio and "erro" not in relatorio["resumo_executivo"]:
+            print("\n📊 RESUMO EXECUTIVO")
+            print("-" * 30)
             resumo = relatorio["resumo_executivo"]["indicadores_principais"]
             print(f"💰 Receita Líquida Total: R$ {resumo['receita_liquida_total']:,.2f}")
             print(f"📉 Taxa de Glosa: {resumo['percentual_glosa_geral']:.1f}%")
@@ -362,11 +1012,42 @@ def main():
                 for rec in relatorio["resumo_executivo"]["recomendacoes"]:
                     print(f"  • {rec}")
         
+        conexoes = relatorio.get("estatisticas_conexoes")
+        if conexoes and "erro" not in conexoes:
+            print(f"\n🔌 Conexões: {conexoes.get('conexoes_abertas', 0)} abertas, "
+                  f"{conexoes.get('conexoes_reutilizadas', 0)} reutilizadas")
+        
+        cache = relatorio.get("cache_consultas")
+        if cache:
+            print(f"🗃️ Cache: {cache['acertos']} acertos, {cache['faltas']} faltas "
+                  f"({cache['segundos_economizados']}s economizados)")
+        
+        metricas = relatorio.get("metricas_execucao")
+        if metricas:
+            consultas = metricas["consultas"]
+            print(f"⏱️ {metricas['duracao_s']}s no total; consultas: {consultas['chamadas']} "
+                  f"(banco {consultas['banco_s']}s, conversão {consultas['conversao_s']}s, "
+                  f"pandas {consultas['pandas_s']}s); pico de RSS {metricas['pico_rss_mb']} MB")
+        
+        graficos = relatorio.get("graficos")
+        if graficos and "erro" not in graficos:
+            print(f"\n🖼️ Gráficos ({graficos['segundos']}s):")
+            for nome, caminho in graficos["arquivos"].items():
+                print(f"  {nome}: {caminho}")
+        
+        excel = relatorio.get("excel")
+        if excel and "erro" not in excel:
+            print(f"\n📗 Excel ({excel['segundos']}s): {excel['arquivo']}")
+            for nome, linhas in excel["planilhas"].items():
+                print(f"  {nome}: {linhas} linhas")
+        
         print(f"\n✅ Análise concluída em {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
         
     except Exception as e:
         print(f"❌ Erro durante análise: {e}")
         return 1
+    finally:
+        fechar_pools()
     
     return 0
 
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Backends de Execução - Módulo Financeiro
+FoncareSystem
+
+As análises e a verificação de integridade pedem ao backend as mesmas
+operações: fatos de contas a receber, históricos da projeção, dashboard por
+unidade, detalhe linha a linha e (no verificador) a varredura das regras.
+
+    BackendPostgres - SQL no PostgreSQL via executar_query (padrão)
+    BackendLocal    - pandas em processo sobre um instantâneo: o espelho
+                      Parquet (EspelhoLocal) ou um arquivo SQLite
+                      (InstantaneoSQLite), sem ida ao banco
+
+BackendLocal reproduz a semântica das consultas: DATE_TRUNC('month') e
+CURRENT_DATE em UTC, janelas de N meses, PERCENTILE_CONT(0.5) como mediana
+interpolada, somas exatas em centavos e os filtros de FiltroFinanceiro
+(unidades e convênios por nome ou id). Serve para execuções offline, lotes
+de cenários e testes rápidos; o resultado é o mesmo das consultas sobre os
+mesmos dados (só as amostras de IDs da varredura podem vir em outra ordem).
+
+O instantâneo SQLite é gerado a partir do banco por InstantaneoSQLite.criar
+(`analise_financeira.py --gerar-instantaneo ARQUIVO`).
+"""
+
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from dashboard_financeiro import DashboardFinanceiro
+from espelho_local import EspelhoLocal, normalizar_colunas
+from filtros_financeiros import FiltroFinanceiro
+from tipos_financeiros import para_centavos
+
+
+class BackendPostgres:
+    """Operações analíticas em SQL no PostgreSQL"""
+
+    nome = 'postgres'
+    local = False
+    usa_banco = True
+
+    SQL_FATOS_RECEBER = """
+        SELECT
+            DATE_TRUNC('month', cr.created_at) as mes,
+            u.nome as unidade,
+            cr.origem,
+            c.nome as convenio,
+            COUNT(*) as quantidade_guias,
+            COUNT(CASE WHEN cr.valor_glosa > 0 THEN 1 END) as guias_com_glosa,
+            (SUM(cr.valor_bruto) * 100)::bigint as valor_bruto_total_centavos,
+            (SUM(cr.valor_liquido) * 100)::bigint as valor_liquido_total_centavos,
+            (SUM(cr.valor_glosa) * 100)::bigint as valor_glosa_total_centavos,
+            MIN(cr.percentual_glosa) as menor_glosa,
+            MAX(cr.percentual_glosa) as maior_glosa,
+            AVG(cr.percentual_glosa) as media_glosa,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY cr.percentual_glosa) as mediana_glosa
+        FROM contas_receber cr
+        JOIN unidades u ON cr.unidade_id = u.id
+        LEFT JOIN convenios c ON cr.convenio_id = c.id
+        WHERE {filtro}
+        GROUP BY DATE_TRUNC('month', cr.created_at), u.nome, cr.origem, c.nome
+        """
+
+    SQL_HISTORICO_RECEITAS = """
+        SELECT
+            DATE_TRUNC('month', cr.created_at) as mes,
+            COALESCE(u.nome, 'Sem unidade') as unidade,
+            (SUM(cr.valor_liquido) * 100)::bigint as receita_total_centavos
+        FROM contas_receber cr
+        LEFT JOIN unidades u ON u.id = cr.unidade_id
+        WHERE cr.created_at >= CURRENT_DATE - make_interval(months => %s)
+        AND cr.status = 'Recebido'{filtro}
+        GROUP BY DATE_TRUNC('month', cr.created_at), COALESCE(u.nome, 'Sem unidade')
+        ORDER BY mes
+        """
+
+    SQL_HISTORICO_DESPESAS = """
+        SELECT
+            DATE_TRUNC('month', cp.created_at) as mes,
+            COALESCE(u.nome, 'Sem unidade') as unidade,
+            cp.categoria,
+            (SUM(cp.valor) * 100)::bigint as despesa_total_centavos
+        FROM contas_pagar cp
+        LEFT JOIN unidades u ON u.id = cp.unidade_id
+        WHERE cp.created_at >= CURRENT_DATE - make_interval(months => %s)
+        AND cp.status = 'Pago'{filtro}
+        GROUP BY DATE_TRUNC('month', cp.created_at), COALESCE(u.nome, 'Sem unidade'), cp.categoria
+        ORDER BY mes
+        """
+
+    COLUNAS_DETALHE = ['lancado_em', 'numero_guia', 'descricao', 'unidade', 'origem', 'convenio', 'status',
+                       'data_vencimento', 'data_recebimento', 'valor_bruto', 'valor_liquido', 'valor_glosa',
+                       'percentual_glosa', 'metodo_recebimento']
+
+    SQL_DETALHE_RECEBER = """
+        SELECT
+            cr.created_at as lancado_em,
+            cr.numero_guia,
+            cr.descricao,
+            u.nome as unidade,
+            cr.origem,
+            c.nome as convenio,
+            cr.status,
+            cr.data_vencimento,
+            cr.data_recebimento,
+            cr.valor_bruto,
+            cr.valor_liquido,
+            cr.valor_glosa,
+            cr.percentual_glosa,
+            cr.metodo_recebimento
+        FROM contas_receber cr
+        LEFT JOIN unidades u ON cr.unidade_id = u.id
+        LEFT JOIN convenios c ON cr.convenio_id = c.id
+        {filtro}
+        ORDER BY cr.created_at, cr.id
+        """
+
+    def __init__(self, executar_query: Callable[..., pd.DataFrame],
+                 executar_query_em_blocos: Callable[..., Iterator[pd.DataFrame]] = None):
+        """
+        Args:
+            executar_query: função que executa SQL e devolve DataFrame (ex.: AnaliseFinanceira.executar_query)
+            executar_query_em_blocos: leitura em blocos por cursor no servidor (detalhe linha a linha)
+        """
+        self.executar_query = executar_query
+        self.executar_query_em_blocos = executar_query_em_blocos
+
+    def descricao(self) -> Dict:
+        return {'backend': self.nome}
+
+    def fatos_receber(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Fatos por mês, unidade, origem e convênio (valores em centavos)"""
+        condicoes, parametros = filtro.condicoes('cr', meses)
+        return self.executar_query(self.SQL_FATOS_RECEBER.format(filtro=" AND ".join(condicoes)),
+                                   tuple(parametros))
+
+    def historico_receitas(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Receitas recebidas por mês e unidade nos últimos `meses` meses (só unidades e convênios do filtro)"""
+        condicoes, parametros = filtro.condicoes('cr', periodo=False)
+        query = self.SQL_HISTORICO_RECEITAS.format(filtro=''.join(' AND ' + condicao for condicao in condicoes))
+        return self.executar_query(query, (meses, *parametros))
+
+    def historico_despesas(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Despesas pagas por mês, unidade e categoria (contas_pagar não tem convênio)"""
+        condicoes, parametros = filtro.condicoes('cp', periodo=False, convenio=False)
+        query = self.SQL_HISTORICO_DESPESAS.format(filtro=''.join(' AND ' + condicao for condicao in condicoes))
+        return self.executar_query(query, (meses, *parametros))
+
+    def dashboard_unidades(self, unidades: Sequence[str] = ()) -> Dict:
+        return DashboardFinanceiro(self.executar_query, unidades).resumo()
+
+    def detalhe_contas_receber(self, meses: int, filtro: FiltroFinanceiro,
+                               tamanho_bloco: int = None) -> Iterator[pd.DataFrame]:
+        """Linhas de contas a receber do escopo, em blocos lidos do cursor no servidor"""
+        where, params = filtro.where('cr', meses)
+        return self.executar_query_em_blocos(self.SQL_DETALHE_RECEBER.format(filtro=where), params, tamanho_bloco)
+
+
+class InstantaneoSQLite:
+    """Instantâneo das tabelas das análises em um arquivo SQLite, lido como o EspelhoLocal
+
+    Datas e horários ficam em texto de formato fixo (UTC, ordenável), valores
+    em REAL e ids em TEXT; a leitura devolve os mesmos tipos do espelho.
+    """
+
+    TABELAS = {
+        'contas_receber': EspelhoLocal.TABELAS['contas_receber'] + ['numero_guia', 'descricao', 'metodo_recebimento'],
+        'contas_pagar': EspelhoLocal.TABELAS['contas_pagar'],
+        'folha_clt': ['id', 'unidade_id', 'mes_referencia', 'custo_total', 'status'],
+        'folha_pj': ['id', 'unidade_id', 'mes_referencia', 'valor_repasse', 'status'],
+    }
+    COLUNAS_VALOR = {**EspelhoLocal.COLUNAS_VALOR, 'folha_clt': ['custo_total'], 'folha_pj': ['valor_repasse']}
+    DATAS = ['mes_referencia']
+    DIMENSOES = EspelhoLocal.DIMENSOES
+    FORMATO_HORARIO = '%Y-%m-%d %H:%M:%S.%f'
+
+    def __init__(self, caminho: str):
+        if not os.path.isfile(caminho):
+            raise FileNotFoundError(f"Instantâneo SQLite não encontrado: {caminho}")
+        self.caminho = caminho
+
+    @classmethod
+    def _para_texto(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Horários em UTC e datas como texto de formato fixo"""
+        for coluna in df.columns:
+            if isinstance(df[coluna].dtype, pd.DatetimeTZDtype):
+                df[coluna] = df[coluna].dt.tz_convert('UTC').dt.strftime(cls.FORMATO_HORARIO)
+            elif pd.api.types.is_datetime64_any_dtype(df[coluna]):
+                df[coluna] = df[coluna].dt.strftime('%Y-%m-%d')
+        return df
+
+    @classmethod
+    def criar(cls, caminho: str, executar_query: Callable[..., pd.DataFrame]) -> Dict:
+        """Grava em `caminho` um instantâneo das tabelas lidas por `executar_query` (substitui o arquivo)"""
+        inicio = time.perf_counter()
+        temporario = caminho + '.tmp'
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        linhas = {}
+        with sqlite3.connect(temporario) as conn:
+            for tabela, colunas in cls.TABELAS.items():
+                df = executar_query(f"SELECT {', '.join(colunas)} FROM {tabela}")
+                df = cls._para_texto(normalizar_colunas(df, cls.COLUNAS_VALOR[tabela], cls.DATAS))
+                df.to_sql(tabela, conn, index=False)
+                if 'created_at' in colunas:
+                    conn.execute(f"CREATE INDEX idx_{tabela}_created_at ON {tabela} (created_at)")
+                linhas[tabela] = len(df)
+            for dimensao, query in cls.DIMENSOES.items():
+                df = executar_query(query)
+                df['id'] = df['id'].astype('string')
+                df.to_sql(dimensao, conn, index=False)
+                linhas[dimensao] = len(df)
+        os.replace(temporario, caminho)
+        return {'arquivo': caminho, 'linhas': linhas, 'segundos': round(time.perf_counter() - inicio, 3)}
+
+    def _ler(self, query: str, params: tuple = ()) -> pd.DataFrame:
+        with sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True) as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def carregar(self, tabela: str, desde: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Linhas da tabela com created_at a partir de `desde` (filtro no SQLite, pelo índice)"""
+        if desde is None:
+            df = self._ler(f"SELECT * FROM {tabela}")
+        else:
+            df = self._ler(f"SELECT * FROM {tabela} WHERE created_at >= ?",
+                           (pd.Timestamp(desde).strftime(self.FORMATO_HORARIO),))
+        return normalizar_colunas(df, self.COLUNAS_VALOR[tabela], self.DATAS)
+
+    def carregar_dimensao(self, dimensao: str) -> pd.DataFrame:
+        df = self._ler(f"SELECT * FROM {dimensao}")
+        df['id'] = df['id'].astype('string')
+        return df
+
+
+def abrir_instantaneo(caminho: str):
+    """Instantâneo em `caminho`: arquivo SQLite ou diretório de um espelho Parquet já sincronizado"""
+    if os.path.isdir(caminho):
+        return EspelhoLocal(None, caminho)
+    return InstantaneoSQLite(caminho)
+
+
+class BackendLocal:
+    """Mesmas operações do BackendPostgres, em memória (pandas), sobre um instantâneo"""
+
+    nome = 'local'
+    local = True
+
+    # Regras de FinanceiroIntegrityChecker.REGRAS_POR_TABELA: (tabela, regra) -> máscara das linhas
+    REGRAS = {
+        ('contas_pagar', 'orfaos'): lambda t, c: t['unidade_id'].notna() & ~t['unidade_id'].isin(c['unidades']),
+        ('contas_pagar', 'valores_negativos'): lambda t, c: t['valor'] < 0,
+        ('contas_pagar', 'datas_futuras'): lambda t, c: t['data_vencimento'] > c['hoje'] + pd.DateOffset(years=2),
+        ('contas_pagar', 'em_atraso'): lambda t, c: (t['status'] == 'Pendente') & (t['data_vencimento'] < c['hoje']),
+        ('contas_pagar', 'vencimento_30d'):
+            lambda t, c: t['data_vencimento'].between(c['hoje'], c['hoje'] + pd.Timedelta(days=30)),
+        ('contas_receber', 'orfaos'): lambda t, c: t['unidade_id'].notna() & ~t['unidade_id'].isin(c['unidades']),
+        ('contas_receber', 'valores_negativos'): lambda t, c: (t['valor_bruto'] < 0) | (t['valor_liquido'] < 0),
+        ('contas_receber', 'liquido_maior_bruto'): lambda t, c: t['valor_liquido'] > t['valor_bruto'],
+        ('contas_receber', 'datas_futuras'): lambda t, c: t['data_vencimento'] > c['hoje'] + pd.DateOffset(years=2),
+        ('contas_receber', 'em_atraso'): lambda t, c: (t['status'] == 'Pendente') & (t['data_vencimento'] < c['hoje']),
+        ('contas_receber', 'glosa_alta'):
+            lambda t, c: (t['valor_bruto'] > 0) & (t['valor_glosa'] / t['valor_bruto'] * 100 > 30),
+        ('contas_receber', 'vencimento_30d'):
+            lambda t, c: t['data_vencimento'].between(c['hoje'], c['hoje'] + pd.Timedelta(days=30)),
+    }
+    # (tabela, medida) -> expressão agregada pela função da regra (SUM/AVG)
+    MEDIDAS = {
+        ('contas_pagar', 'valor_total'): lambda t: t['valor'],
+        ('contas_receber', 'valor_total'): lambda t: t['valor_liquido'],
+        ('contas_receber', 'percentual_medio'):
+            lambda t: t['valor_glosa'] / t['valor_bruto'].where(t['valor_bruto'] != 0) * 100,
+    }
+
+    def __init__(self, fonte, banco: BackendPostgres = None):
+        """
+        Args:
+            fonte: instantâneo com carregar(tabela, desde) e carregar_dimensao(nome)
+                (EspelhoLocal ou InstantaneoSQLite)
+            banco: backend usado no que o instantâneo não tem (o espelho não guarda a folha,
+                usada pelo dashboard); sem ele, a execução não acessa o banco
+        """
+        self.fonte = fonte
+        self.banco = banco
+
+    @property
+    def usa_banco(self) -> bool:
+        return self.banco is not None
+
+    def descricao(self) -> Dict:
+        return {
+            'backend': self.nome,
+            'instantaneo': type(self.fonte).__name__,
+            'caminho': getattr(self.fonte, 'caminho', None) or getattr(self.fonte, 'diretorio', None)
+        }
+
+    # ------------------------------------------------------------------
+    # Equivalentes das expressões SQL
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _hoje() -> pd.Timestamp:
+        """CURRENT_DATE da sessão em UTC (como os meses), qualquer que seja o fuso da máquina"""
+        return pd.Timestamp.now(tz='UTC').normalize().tz_localize(None)
+
+    @classmethod
+    def _inicio_janela(cls, meses: int) -> pd.Timestamp:
+        """CURRENT_DATE - make_interval(months => meses)"""
+        return cls._hoje() - pd.DateOffset(months=meses)
+
+    @staticmethod
+    def _mes(serie: pd.Series) -> pd.Series:
+        """DATE_TRUNC('month', created_at) em UTC"""
+        return serie.dt.tz_convert('UTC').dt.tz_localize(None).dt.to_period('M').dt.to_timestamp().dt.tz_localize('UTC')
+
+    @classmethod
+    def _periodo(cls, filtro: FiltroFinanceiro, meses: Optional[int]) -> Tuple[Optional[pd.Timestamp],
+                                                                                Optional[pd.Timestamp]]:
+        """Início e fim exclusivo de FiltroFinanceiro.inicio_periodo/fim_periodo (UTC, sem fuso)"""
+        inicio = fim = None
+        if filtro.de is not None:
+            inicio = pd.Timestamp(filtro.de)
+        elif meses is not None:
+            base = pd.Timestamp(filtro.ate) + pd.Timedelta(days=1) if filtro.ate is not None else cls._hoje()
+            inicio = base - pd.DateOffset(months=meses)
+        if filtro.ate is not None:
+            fim = pd.Timestamp(filtro.ate) + pd.Timedelta(days=1)
+        return inicio, fim
+
+    def _ids(self, dimensao: str, valores: Sequence[str]) -> List[str]:
+        """ids da dimensão por nome ou id (o `ANY(ARRAY(SELECT id ...))` dos filtros)"""
+        df = self.fonte.carregar_dimensao(dimensao)
+        return df.loc[df['nome'].isin(valores) | df['id'].astype(str).isin(valores), 'id'].tolist()
+
+    def _carregar(self, tabela: str, filtro: FiltroFinanceiro, desde: pd.Timestamp = None,
+                  ate: pd.Timestamp = None, convenio: bool = True) -> pd.DataFrame:
+        """Linhas de `tabela` com created_at em [desde, ate) e nas unidades/convênios do filtro"""
+        df = self.fonte.carregar(tabela, desde)
+        if ate is not None:
+            df = df[df['created_at'] < ate.tz_localize('UTC')]
+        if filtro.unidades:
+            df = df[df['unidade_id'].isin(self._ids('unidades', filtro.unidades))]
+        if convenio and filtro.convenios:
+            df = df[df['convenio_id'].isin(self._ids('convenios', filtro.convenios))]
+        return df
+
+    def _dimensao(self, dimensao: str, coluna: str) -> pd.DataFrame:
+        return self.fonte.carregar_dimensao(dimensao).rename(columns={'id': f"{coluna}_id", 'nome': coluna})
+
+    # ------------------------------------------------------------------
+    # Operações
+    # ------------------------------------------------------------------
+
+    def fatos_receber(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Fatos por mês, unidade, origem e convênio (valores em centavos)"""
+        df = self._carregar('contas_receber', filtro, *self._periodo(filtro, meses))
+        df = df.merge(self._dimensao('unidades', 'unidade'), on='unidade_id', how='inner') \
+               .merge(self._dimensao('convenios', 'convenio'), on='convenio_id', how='left')
+        if df.empty:
+            return pd.DataFrame(columns=['mes', 'unidade', 'origem', 'convenio', 'quantidade_guias', 'guias_com_glosa',
+                                         'valor_bruto_total_centavos', 'valor_liquido_total_centavos',
+                                         'valor_glosa_total_centavos', 'menor_glosa', 'maior_glosa',
+                                         'media_glosa', 'mediana_glosa'])
+
+        df = df.assign(
+            mes=self._mes(df['created_at']),
+            com_glosa=(df['valor_glosa'] > 0).astype(int),
+            **{f"{coluna}_centavos": para_centavos(df[coluna]) for coluna in ('valor_bruto', 'valor_liquido', 'valor_glosa')}
+        )
+        return df.groupby(['mes', 'unidade', 'origem', 'convenio'], dropna=False).agg(
+            quantidade_guias=('id', 'size'),
+            guias_com_glosa=('com_glosa', 'sum'),
+            valor_bruto_total_centavos=('valor_bruto_centavos', 'sum'),
+            valor_liquido_total_centavos=('valor_liquido_centavos', 'sum'),
+            valor_glosa_total_centavos=('valor_glosa_centavos', 'sum'),
+            menor_glosa=('percentual_glosa', 'min'),
+            maior_glosa=('percentual_glosa', 'max'),
+            media_glosa=('percentual_glosa', 'mean'),
+            mediana_glosa=('percentual_glosa', 'median')
+        ).reset_index()
+
+    def _historico(self, tabela: str, status: str, chaves: List[str], coluna: str, nome: str,
+                   meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        df = self._carregar(tabela, filtro, self._inicio_janela(meses), convenio=tabela == 'contas_receber')
+        df = df[df['status'] == status]
+        if df.empty:
+            return pd.DataFrame(columns=['mes', 'unidade'] + chaves + [nome])
+        df = df.merge(self._dimensao('unidades', 'unidade'), on='unidade_id', how='left')
+        df = df.assign(mes=self._mes(df['created_at']), unidade=df['unidade'].fillna('Sem unidade'),
+                       **{nome: para_centavos(df[coluna])})
+        return (df.groupby(['mes', 'unidade'] + chaves, dropna=False)[nome].sum()
+                .reset_index().sort_values('mes', kind='stable').reset_index(drop=True))
+
+    def historico_receitas(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Receitas recebidas por mês e unidade nos últimos `meses` meses (só unidades e convênios do filtro)"""
+        return self._historico('contas_receber', 'Recebido', [], 'valor_liquido', 'receita_total_centavos',
+                               meses, filtro)
+
+    def historico_despesas(self, meses: int, filtro: FiltroFinanceiro) -> pd.DataFrame:
+        """Despesas pagas por mês, unidade e categoria (contas_pagar não tem convênio)"""
+        return self._historico('contas_pagar', 'Pago', ['categoria'], 'valor', 'despesa_total_centavos',
+                               meses, filtro)
+
+    def _agregados_unidade(self, unidades: Sequence[str]) -> pd.DataFrame:
+        """Mesmas colunas de DashboardFinanceiro.QUERY_ESCOPO: uma linha por unidade, mês corrente"""
+        mes = self._hoje().replace(day=1)
+        ids = self._ids('unidades', unidades) if unidades else None
+
+        def _agregar(df: pd.DataFrame, contagem: str, somas: Dict[str, Tuple[str, Optional[str]]]) -> pd.DataFrame:
+            """COUNT(*) e SUM(coluna) FILTER (WHERE status = ...) por unidade_id"""
+            if ids is not None:
+                df = df[df['unidade_id'].isin(ids)]
+            agregado = {contagem: df.groupby('unidade_id').size()}
+            for nome, (coluna, status) in somas.items():
+                centavos = para_centavos(df[coluna])
+                if status is not None:
+                    centavos = centavos.where(df['status'] == status, 0)
+                agregado[nome] = centavos.groupby(df['unidade_id']).sum() / 100
+            return pd.DataFrame(agregado)
+
+        receber = self.fonte.carregar('contas_receber', mes)
+        pagar = self.fonte.carregar('contas_pagar', mes)
+        clt = self.fonte.carregar('folha_clt')
+        pj = self.fonte.carregar('folha_pj')
+        partes = [
+            _agregar(receber, 'linhas_receber', {'receita_confirmada': ('valor_liquido', 'Recebido'),
+                                                 'receita_pendente': ('valor_bruto', 'Pendente'),
+                                                 'total_glosas': ('valor_glosa', None)}),
+            _agregar(pagar, 'linhas_pagar', {'despesas_pagas': ('valor', 'Pago'),
+                                             'despesas_pendentes': ('valor', 'Pendente')}),
+            _agregar(clt[clt['mes_referencia'] == mes], 'linhas_clt', {'folha_clt': ('custo_total', None)}),
+            _agregar(pj[pj['mes_referencia'] == mes], 'linhas_pj', {'folha_pj': ('valor_repasse', None)}),
+        ]
+
+        df = self._dimensao('unidades', 'unidade_nome').rename(columns={'unidade_nome_id': 'unidade_id'})
+        if ids is not None:
+            df = df[df['unidade_id'].isin(ids)]
+        df = df.join(pd.concat(partes, axis=1), on='unidade_id')
+        metricas, contagens = DashboardFinanceiro.COLUNAS_METRICAS, DashboardFinanceiro.COLUNAS_CONTAGEM
+        df[metricas] = df[metricas].fillna(0.0)
+        df[contagens] = df[contagens].fillna(0).astype(int)
+        return df.sort_values('unidade_nome', kind='stable').reset_index(drop=True)
+
+    def dashboard_unidades(self, unidades: Sequence[str] = ()) -> Dict:
+        """Indicadores do mês corrente por unidade (o banco atende quando o instantâneo não tem a folha)"""
+        if not all(tabela in self.fonte.TABELAS for tabela in ('folha_clt', 'folha_pj')):
+            if self.banco is not None:
+                return self.banco.dashboard_unidades(unidades)
+            return {"erro": "Instantâneo sem folha_clt/folha_pj: dashboard indisponível"}
+        return DashboardFinanceiro(None, unidades, agregados=lambda: self._agregados_unidade(unidades)).resumo()
+
+    def detalhe_contas_receber(self, meses: int, filtro: FiltroFinanceiro,
+                               tamanho_bloco: int = None) -> Iterator[pd.DataFrame]:
+        """Linhas de contas a receber do escopo, em blocos (colunas que o instantâneo tiver)"""
+        df = self._carregar('contas_receber', filtro, *self._periodo(filtro, meses))
+        df = df.merge(self._dimensao('unidades', 'unidade'), on='unidade_id', how='left') \
+               .merge(self._dimensao('convenios', 'convenio'), on='convenio_id', how='left')
+        df = df.sort_values(['created_at', 'id'], kind='stable').rename(columns={'created_at': 'lancado_em'})
+        df = df[[coluna for coluna in BackendPostgres.COLUNAS_DETALHE if coluna in df]]
+        tamanho = tamanho_bloco or 50000
+        for inicio in range(0, len(df), tamanho):
+            yield df.iloc[inicio:inicio + tamanho].reset_index(drop=True)
+
+    def varredura(self, regras_por_tabela: Dict[str, List[Dict]], filtro: FiltroFinanceiro,
+                  tamanho_amostra: int = 5) -> Dict:
+        """Avalia as regras de linha do verificador; mesmo formato de FinanceiroIntegrityChecker._executar_varredura"""
+        contexto = {'hoje': self._hoje(), 'unidades': self.fonte.carregar_dimensao('unidades')['id'].tolist()}
+        resultado = {}
+        for tabela, regras in regras_por_tabela.items():
+            # contas_pagar não tem convênio: lá só período e unidades se aplicam
+            t = self._carregar(tabela, filtro, *self._periodo(filtro, None), convenio=tabela == 'contas_receber')
+            avaliadas = {}
+            for regra in regras:
+                chave = (tabela, regra['nome'])
+                if chave not in self.REGRAS:
+                    raise ValueError(f"Regra sem equivalente no backend local: {tabela}.{regra['nome']}")
+                linhas = t[self.REGRAS[chave](t, contexto).fillna(False).astype(bool)]
+                avaliada = {'quantidade': len(linhas)}
+                if regra.get('amostra'):
+                    avaliada['amostra_ids'] = linhas['id'].astype(str).head(tamanho_amostra).tolist()
+                for medida, (funcao, _) in regra.get('medidas', {}).items():
+                    valores = self.MEDIDAS[(tabela, medida)](linhas).dropna()
+                    if valores.empty:
+                        avaliada[medida] = None
+                    else:
+                        avaliada[medida] = float(valores.sum() if funcao == 'SUM' else valores.mean())
+                avaliadas[regra['nome']] = avaliada
+            resultado[tabela] = {'total_registros': len(t), 'regras': avaliadas}
+        return resultado
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark das Análises Financeiras
+FoncareSystem
+
+Mede cada método público de AnaliseFinanceira e FinanceiroIntegrityChecker
+contra um PostgreSQL local populado pelo gerador sintético em várias
+escalas. Para cada método registra tempo de parede, tempo no banco,
+linhas transferidas e pico de memória (RSS), gravando um JSON comparável.
+
+Uso:
+    python scripts/benchmark_financeiro.py executar --escalas 1 100 1000 --carregar
+    python scripts/benchmark_financeiro.py comparar baseline.json benchmark_atual.json
+    python scripts/benchmark_financeiro.py tipagem --meses 12
+
+Cada medição roda em um processo novo para que o pico de RSS seja do
+método medido, e não do processo inteiro. --carregar TRUNCA as tabelas
+financeiras; por segurança só é aceito com banco local.
+"""
+
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict
+
+from metricas_execucao import MetricasExecucao, pico_rss_mb
+from pool_conexoes import configuracao_banco, obter_pool, fechar_pools
+
+
+METODOS = {
+    'AnaliseFinanceira': [
+        'gerar_relatorio_receitas_origem',
+        'analise_glosas_detalhada',
+        'projecao_fluxo_caixa',
+    ],
+    'FinanceiroIntegrityChecker': [
+        'verificar_estrutura_tabelas',
+        'verificar_integridade_dados',
+        'verificar_performance_queries',
+        'verificar_alertas_financeiros',
+        'verificar_indices',
+        'verificar_dashboard',
+    ],
+}
+
+
+def _medir_metodo(classe: str, metodo: str, repeticoes: int) -> Dict:
+    """Executado em processo novo: instancia a classe e mede o método"""
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    if classe == 'AnaliseFinanceira':
+        from analise_financeira import AnaliseFinanceira as Classe
+    else:
+        from verificar_integridade_financeiro import FinanceiroIntegrityChecker as Classe
+
+    # A classe já instala CursorInstrumentado no db_config; os contadores vêm das métricas da execução
+    instancia = Classe()
+    # Abre a conexão antes de medir: o handshake não faz parte do método
+    obter_pool(instancia.db_config)
+    rss_inicial = pico_rss_mb()
+
+    medicoes = []
+    erro = None
+    for _ in range(repeticoes):
+        instancia.metricas = MetricasExecucao()
+        inicio = time.perf_counter()
+        try:
+            with instancia.metricas.etapa('benchmark'):
+                resultado = getattr(instancia, metodo)()
+            if isinstance(resultado, dict) and 'erro' in resultado:
+                erro = resultado['erro']
+        except Exception as e:
+            erro = str(e)
+        etapa = instancia.metricas.etapas['benchmark']
+        medicoes.append({
+            'tempo_parede': time.perf_counter() - inicio,
+            'tempo_db': etapa['banco_s'] + etapa['conversao_s'],
+            'linhas': etapa['linhas'],
+            'queries': etapa['consultas']
+        })
+
+    fechar_pools()
+    paredes = [m['tempo_parede'] for m in medicoes]
+    return {
+        'classe': classe,
+        'metodo': metodo,
+        'repeticoes': repeticoes,
+        'tempo_parede_s': {'min': round(min(paredes), 4), 'mediana': round(statistics.median(paredes), 4)},
+        'tempo_db_s': round(statistics.median(m['tempo_db'] for m in medicoes), 4),
+        'linhas_transferidas': medicoes[-1]['linhas'],
+        'queries': medicoes[-1]['queries'],
+        'pico_rss_mb': pico_rss_mb(),
+        'rss_antes_mb': rss_inicial,
+        'erro': erro
+    }
+
+
+def _banco_local(db_config: Dict) -> bool:
+    host = str(db_config.get('host', ''))
+    return host in ('localhost', '127.0.0.1', '::1') or host.startswith('/')
+
+
+def _preparar_escala(fator: float, semente: int) -> Dict:
+    """Popula o banco local na escala pedida e atualiza estatísticas do planejador"""
+    from gerador_dados_sinteticos import GeradorDadosSinteticos
+
+    gerador = GeradorDadosSinteticos(fator_escala=fator, semente=semente)
+    pool = obter_pool()
+    with pool.conexao() as conn:
+        carga = gerador.carregar(conn, limpar_fatos=True)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"ANALYZE {', '.join(['unidades', 'convenios'] + gerador.TABELAS_FATOS)}")
+        finally:
+            conn.autocommit = False
+    return {'parametros': gerador.resumo(), 'carga': carga}
+
+
+def _contar_linhas() -> Dict:
+    with obter_pool().conexao() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT (SELECT COUNT(*) FROM contas_receber), (SELECT COUNT(*) FROM contas_pagar)")
+        receber, pagar = cursor.fetchone()
+        cursor.execute("SHOW server_version")
+        versao = cursor.fetchone()[0]
+    return {'contas_receber': receber, 'contas_pagar': pagar, 'server_version': versao}
+
+
+def executar(args) -> int:
+    """Roda o benchmark em todas as escalas e grava o arquivo de resultados"""
+    db_config = configuracao_banco()
+    if args.carregar and not _banco_local(db_config) and not args.permitir_remoto:
+        print("❌ --carregar trunca as tabelas financeiras; use um PostgreSQL local "
+              "(ou --permitir-remoto se tiver certeza).")
+        return 2
+
+    contexto = multiprocessing.get_context('spawn')
+    resultado = {
+        'gerado_em': datetime.now().isoformat(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'banco': db_config['host'],
+        },
+        'escalas': []
+    }
+
+    escalas = args.escalas if args.carregar else [None]
+    for fator in escalas:
+        secao = {'fator_escala': fator, 'metodos': []}
+
+        if fator is not None:
+            print(f"\n🔄 Populando banco na escala {fator}...")
+            secao['preparacao'] = _preparar_escala(fator, args.semente)
+
+        secao['volume'] = _contar_linhas()
+        fechar_pools()
+        print(f"📦 contas_receber: {secao['volume']['contas_receber']:,} linhas")
+
+        for classe, metodos in METODOS.items():
+            for metodo in metodos:
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                    medicao = executor.submit(_medir_metodo, classe, metodo, args.repeticoes).result()
+                secao['metodos'].append(medicao)
+                status = f" ⚠️ {medicao['erro']}" if medicao['erro'] else ""
+                print(f"   {classe}.{metodo}: {medicao['tempo_parede_s']['mediana']:.3f}s "
+                      f"(db {medicao['tempo_db_s']:.3f}s, {medicao['linhas_transferidas']:,} linhas, "
+                      f"RSS {medicao['pico_rss_mb']} MB){status}")
+
+        resultado['escalas'].append(secao)
+
+    arquivo = args.saida or f"benchmark_financeiro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+    print(f"\n✅ Resultados salvos em: {arquivo}")
+    return 0
+
+
+def _indexar(resultado: Dict) -> Dict:
+    """(escala, classe.metodo) -> medição"""
+    indice = {}
+    for secao in resultado.get('escalas', []):
+        escala = secao.get('fator_escala') or secao.get('volume', {}).get('contas_receber')
+        for medicao in secao['metodos']:
+            indice[(str(escala), f"{medicao['classe']}.{medicao['metodo']}")] = medicao
+    return indice
+
+
+def comparar(args) -> int:
+    """Compara um resultado com a baseline e aponta regressões"""
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        base = _indexar(json.load(f))
+    with open(args.atual, 'r', encoding='utf-8') as f:
+        atual = _indexar(json.load(f))
+
+    regressoes = []
+    print(f"{'escala':>8}  {'método':<58} {'base':>9} {'atual':>9} {'var.':>8}")
+    for chave in sorted(set(base) & set(atual)):
+        b, a = base[chave], atual[chave]
+        tempo_b = b['tempo_parede_s']['mediana']
+        tempo_a = a['tempo_parede_s']['mediana']
+        variacao = (tempo_a - tempo_b) / tempo_b if tempo_b else 0.0
+        marcador = ""
+
+        if variacao > args.tolerancia and tempo_a - tempo_b > args.minimo_segundos:
+            regressoes.append(f"{chave[1]} (escala {chave[0]}): tempo {tempo_b:.3f}s → {tempo_a:.3f}s")
+            marcador = " 🔴"
+        if b.get('pico_rss_mb') and a.get('pico_rss_mb') and \
+                a['pico_rss_mb'] > b['pico_rss_mb'] * (1 + args.tolerancia):
+            regressoes.append(f"{chave[1]} (escala {chave[0]}): RSS {b['pico_rss_mb']} → {a['pico_rss_mb']} MB")
+            marcador = " 🔴"
+        if not b.get('erro') and a.get('erro'):
+            regressoes.append(f"{chave[1]} (escala {chave[0]}): passou a falhar - {a['erro']}")
+            marcador = " 🔴"
+
+        print(f"{chave[0]:>8}  {chave[1]:<58} {tempo_b:>8.3f}s {tempo_a:>8.3f}s {variacao:>+7.1%}{marcador}")
+
+    for chave in sorted(set(base) - set(atual)):
+        print(f"⚠️ Sem medição atual para {chave[1]} (escala {chave[0]})")
+
+    if regressoes:
+        print("\n🔴 REGRESSÕES:")
+        for item in regressoes:
+            print(f"  • {item}")
+        return 1
+
+    print("\n✅ Nenhuma regressão acima da tolerância")
+    return 0
+
+
+QUERY_DETALHE_RECEBER = """
+SELECT
+    DATE_TRUNC('month', cr.created_at) as mes,
+    u.nome as unidade,
+    cr.origem,
+    c.nome as convenio,
+    cr.status,
+    cr.valor_bruto,
+    cr.valor_liquido,
+    cr.valor_glosa
+FROM contas_receber cr
+JOIN unidades u ON cr.unidade_id = u.id
+LEFT JOIN convenios c ON cr.convenio_id = c.id
+WHERE cr.created_at >= CURRENT_DATE - make_interval(months => %s)
+"""
+
+
+def tipagem(args) -> int:
+    """Mede memória e tempo de agregação de contas_receber antes e depois da tipagem"""
+    import warnings
+    import pandas as pd
+    from tipos_financeiros import comparar_tipagem
+
+    warnings.filterwarnings('ignore')
+    with obter_pool().conexao() as conn:
+        inicio = time.perf_counter()
+        bruto = pd.read_sql_query(QUERY_DETALHE_RECEBER, conn, params=(args.meses,))
+        tempo_leitura = time.perf_counter() - inicio
+    fechar_pools()
+
+    resultado = comparar_tipagem(bruto, ['mes', 'unidade', 'origem', 'convenio', 'status'],
+                                 ['valor_bruto', 'valor_liquido', 'valor_glosa'], args.repeticoes)
+    resultado['leitura_s'] = round(tempo_leitura, 4)
+
+    print(f"📦 {resultado['linhas']:,} linhas de contas_receber ({args.meses} meses)")
+    print(f"   memória:   {resultado['memoria_mb']['antes']:.2f} MB → {resultado['memoria_mb']['depois']:.2f} MB "
+          f"({resultado['reducao_memoria']}x menor)")
+    print(f"   agregação: {resultado['agregacao_s']['antes']:.4f}s → {resultado['agregacao_s']['depois']:.4f}s "
+          f"({resultado['aceleracao_agregacao']}x mais rápida; tipagem {resultado['tipagem_s']:.4f}s)")
+    print(f"   totais conferem: {'sim' if resultado['totais_conferem'] else 'NÃO'}")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+        print(f"\n✅ Resultados salvos em: {args.saida}")
+    return 0 if resultado['totais_conferem'] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das análises financeiras do FoncareSystem")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_exec = sub.add_parser('executar', help="mede os métodos e grava um arquivo de resultados")
+    p_exec.add_argument('--escalas', type=float, nargs='+', default=[1, 100, 1000],
+                        help="fatores de escala do gerador sintético (1 ≈ 10 mil, 1000 ≈ 10 milhões de linhas)")
+    p_exec.add_argument('--carregar', action='store_true',
+                        help="popula o banco em cada escala antes de medir (TRUNCA as tabelas financeiras)")
+    p_exec.add_argument('--permitir-remoto', action='store_true',
+                        help="permite --carregar em banco que não é local")
+    p_exec.add_argument('--semente', type=int, default=42)
+    p_exec.add_argument('--repeticoes', type=int, default=3)
+    p_exec.add_argument('--saida', help="arquivo JSON de resultados")
+    p_exec.set_defaults(funcao=executar)
+
+    p_comp = sub.add_parser('comparar', help="compara um resultado com a baseline")
+    p_comp.add_argument('baseline')
+    p_comp.add_argument('atual')
+    p_comp.add_argument('--tolerancia', type=float, default=0.2,
+                        help="aumento relativo aceito antes de acusar regressão (padrão 20%%)")
+    p_comp.add_argument('--minimo-segundos', type=float, default=0.05,
+                        help="diferença absoluta mínima de tempo para acusar regressão")
+    p_comp.set_defaults(funcao=comparar)
+
+    p_tip = sub.add_parser('tipagem', help="compara memória e agregação antes e depois da tipagem")
+    p_tip.add_argument('--meses', type=int, default=12)
+    p_tip.add_argument('--repeticoes', type=int, default=3)
+    p_tip.add_argument('--saida', help="arquivo JSON de resultados")
+    p_tip.set_defaults(funcao=tipagem)
+
+    args = parser.parse_args()
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Cache Persistente de Consultas - Módulo Financeiro
+FoncareSystem
+
+Guarda em disco (SQLite) o resultado das consultas analíticas e o reaproveita
+entre execuções enquanto as tabelas lidas não mudarem. A chave é o texto da
+consulta, os parâmetros e o banco; cada entrada guarda a impressão digital
+das tabelas de origem, tirada de pg_stat_user_tables (n_tup_ins/upd/del e
+n_live_tup) mais o filenode, que muda em TRUNCATE e VACUUM FULL. Views são
+expandidas para as tabelas de que dependem, e consultas com CURRENT_DATE ou
+now() levam também a data do servidor na chave.
+
+Só consultas de leitura (SELECT/WITH) sobre tabelas de usuário são
+guardadas; consultas a catálogos (pg_*, information_schema) e as que não
+leem tabela alguma passam direto para o banco.
+
+Os contadores de pg_stat_user_tables são publicados pelo processo que
+escreveu com até alguns segundos de atraso sob escrita contínua. Escritas
+feitas pelos próprios scripts chamam `invalidar`; para as demais, o TTL
+limita a defasagem.
+
+As entradas são desserializadas com pickle, então o cache só é aberto se o
+diretório e os arquivos pertencerem ao usuário atual e ninguém mais puder
+escrever neles; caso contrário, a abertura falha com PermissionError.
+
+Configuração por variáveis de ambiente:
+    FINANCEIRO_CACHE_DIR       - diretório do cache (padrão .cache_financeiro)
+    FINANCEIRO_CACHE_TTL       - validade máxima das entradas em segundos (padrão 86400)
+    FINANCEIRO_CACHE_LIMITE_MB - tamanho máximo antes de descartar as menos usadas (padrão 512)
+"""
+
+import os
+import re
+import stat
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Literais e comentários são removidos antes de procurar palavras-chave e tabelas
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_LEITURA = re.compile(r"^\s*\(?\s*(SELECT|WITH)\b", re.I)
+_NAO_CACHEAVEL = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|ALTER|DROP|COPY|CALL|LOCK)\b"
+    r"|\bFOR\s+(UPDATE|SHARE|NO\s+KEY|KEY)\b"
+    r"|\b(nextval|setval|random|pg_sleep|clock_timestamp|txid_current|pg_current_xact_id)\s*\(",
+    re.I)
+_DATA_ATUAL = re.compile(r"\b(CURRENT_DATE|CURRENT_TIMESTAMP|LOCALTIMESTAMP|LOCALTIME|now\s*\("
+                         r"|transaction_timestamp|statement_timestamp)", re.I)
+_RELACOES = re.compile(r'\b(?:FROM|JOIN)\s+((?:"[^"]+"|[A-Za-z_][\w$]*)(?:\s*\.\s*(?:"[^"]+"|[A-Za-z_][\w$]*))?)',
+                       re.I)
+
+# Nome citado na consulta -> tabelas (e partições) de que o resultado depende.
+# Views são seguidas até as tabelas; views materializadas valem como tabela.
+_QUERY_DEPENDENCIAS = """
+WITH RECURSIVE dep(nome, oid, relkind, esquema, relname) AS (
+    SELECT alvo.nome, c.oid, c.relkind, n.nspname, c.relname
+    FROM unnest(%s::text[]) AS alvo(nome)
+    JOIN pg_class c ON c.oid = to_regclass(alvo.nome)
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+  UNION
+    SELECT dep.nome, c.oid, c.relkind, n.nspname, c.relname
+    FROM dep
+    JOIN LATERAL (
+        SELECT d.refobjid AS oid
+        FROM pg_rewrite r
+        JOIN pg_depend d ON d.classid = 'pg_rewrite'::regclass AND d.objid = r.oid
+                        AND d.refclassid = 'pg_class'::regclass
+        WHERE r.ev_class = dep.oid AND dep.relkind = 'v'
+        UNION
+        SELECT i.inhrelid FROM pg_inherits i WHERE i.inhparent = dep.oid
+    ) filho ON filho.oid <> dep.oid
+    JOIN pg_class c ON c.oid = filho.oid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+)
+SELECT nome, oid, relkind, esquema, relname FROM dep
+"""
+
+_QUERY_IMPRESSAO = """
+SELECT pg_stat_clear_snapshot();
+SELECT CURRENT_DATE::text,
+       COALESCE(json_object_agg(relid::text, ARRAY[n_tup_ins, n_tup_upd, n_tup_del, n_live_tup,
+                                                  pg_relation_filenode(relid)::bigint] ORDER BY relid), '{}')::text
+FROM pg_stat_user_tables
+WHERE relid = ANY(%s::oid[])
+"""
+
+_ESQUEMAS_CATALOGO = ('pg_catalog', 'information_schema')
+_ARQUIVOS_SQLITE = ('', '-wal', '-shm', '-journal')
+
+
+def _verificar_dono(caminho: str):
+    """Recusa caminho de outro usuário, link simbólico ou com escrita para grupo/outros
+
+    Quem escreve no cache escolhe o que pickle.loads executa ao ler uma entrada.
+    """
+    info = os.lstat(caminho)
+    if stat.S_ISLNK(info.st_mode):
+        raise PermissionError(f"Cache recusado: {caminho} é um link simbólico")
+    if hasattr(os, 'geteuid') and info.st_uid != os.geteuid():
+        raise PermissionError(f"Cache recusado: {caminho} pertence a outro usuário (uid {info.st_uid})")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"Cache recusado: {caminho} tem escrita para grupo ou outros "
+                              f"({stat.filemode(info.st_mode)})")
+
+
+class CacheConsultas:
+    """Cache em disco de resultados de consultas, invalidado pela mudança das tabelas lidas"""
+
+    def __init__(self, diretorio: Optional[str] = None, ttl_segundos: Optional[float] = None,
+                 limite_mb: Optional[float] = None, identificacao_banco: str = ""):
+        """
+        Args:
+            diretorio: onde fica o arquivo do cache (padrão: FINANCEIRO_CACHE_DIR ou .cache_financeiro)
+            ttl_segundos: idade máxima de uma entrada, mesmo sem mudança detectada
+            limite_mb: tamanho total acima do qual as entradas menos usadas são descartadas
+            identificacao_banco: separa caches de bancos diferentes no mesmo arquivo
+        """
+        self.diretorio = diretorio or os.getenv('FINANCEIRO_CACHE_DIR', '.cache_financeiro')
+        self.ttl = float(ttl_segundos if ttl_segundos is not None
+                         else os.getenv('FINANCEIRO_CACHE_TTL', '86400'))
+        self.limite_bytes = int(float(limite_mb if limite_mb is not None
+                                      else os.getenv('FINANCEIRO_CACHE_LIMITE_MB', '512')) * 1024 * 1024)
+        self.identificacao_banco = identificacao_banco
+
+        os.makedirs(self.diretorio, mode=0o700, exist_ok=True)
+        self.arquivo = os.path.join(self.diretorio, 'consultas.sqlite')
+        _verificar_dono(self.diretorio)
+        try:
+            # Cria só para o dono; o SQLite dá as mesmas permissões ao -wal e ao -shm
+            os.close(os.open(self.arquivo, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        except FileExistsError:
+            pass
+        for sufixo in _ARQUIVOS_SQLITE:
+            if os.path.lexists(self.arquivo + sufixo):
+                _verificar_dono(self.arquivo + sufixo)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.arquivo, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                chave TEXT PRIMARY KEY,
+                tabelas TEXT NOT NULL,
+                impressao TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                custo_s REAL NOT NULL,
+                bytes INTEGER NOT NULL,
+                acertos INTEGER NOT NULL DEFAULT 0,
+                dados BLOB NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entradas_acesso ON entradas (acessado_em)")
+        self._db.execute("DELETE FROM entradas WHERE criado_em < ?", (time.time() - self.ttl,))
+
+        # Dependências já resolvidas nesta execução (nome citado -> tabelas ou motivo)
+        self._dependencias: Dict[str, Any] = {}
+        self.estatisticas = {
+            'acertos': 0,
+            'faltas': 0,
+            'invalidadas': 0,
+            'expiradas': 0,
+            'ignoradas': 0,
+            'descartadas_lru': 0,
+            'segundos_economizados': 0.0
+        }
+
+    # ------------------------------------------------------------------
+    # Dependências e impressão digital
+    # ------------------------------------------------------------------
+
+    def _resolver(self, conn, nomes: Iterable[str]):
+        pendentes = sorted(set(nomes) - set(self._dependencias))
+        if pendentes:
+            resolvidos = {nome: set() for nome in pendentes}
+            with conn.cursor() as cursor:
+                cursor.execute(_QUERY_DEPENDENCIAS, (pendentes,))
+                for nome, oid, relkind, esquema, relname in cursor.fetchall():
+                    resolvidos[nome].add((oid, relkind, esquema, relname))
+            for nome, relacoes in resolvidos.items():
+                if not relacoes:
+                    # CTE, alias de subconsulta ou função: não é relação
+                    self._dependencias[nome] = None
+                elif any(esquema in _ESQUEMAS_CATALOGO or esquema.startswith('pg_')
+                         for _, _, esquema, _ in relacoes):
+                    self._dependencias[nome] = 'catalogo'
+                else:
+                    self._dependencias[nome] = {(oid, relname) for oid, relkind, _, relname in relacoes
+                                                if relkind in ('r', 'm', 'p')}
+
+    def tabelas_da_consulta(self, conn, query: str) -> Optional[Dict[int, str]]:
+        """Tabelas (oid -> nome) lidas pela consulta; None quando ela não pode ir para o cache"""
+        texto = _LITERAIS.sub(" ", query)
+        if not _LEITURA.match(texto) or _NAO_CACHEAVEL.search(texto):
+            return None
+
+        nomes = [re.sub(r'\s+', '', nome) for nome in _RELACOES.findall(texto)]
+        self._resolver(conn, nomes)
+        tabelas = {}
+        for nome in nomes:
+            dependencia = self._dependencias.get(nome)
+            if dependencia == 'catalogo':
+                return None
+            for oid, relname in dependencia or ():
+                tabelas[oid] = relname
+        return tabelas or None
+
+    @staticmethod
+    def impressao_digital(conn, oids: Iterable[int]) -> Tuple[str, str]:
+        """Data do servidor e contadores de alteração das tabelas (uma ida ao banco)"""
+        with conn.cursor() as cursor:
+            cursor.execute(_QUERY_IMPRESSAO, (sorted(oids),))
+            data_servidor, contadores = cursor.fetchone()
+        return data_servidor, contadores
+
+    def _chave(self, query: str, params, data_servidor: Optional[str]) -> str:
+        partes = [self.identificacao_banco, " ".join(query.split()), repr(params), data_servidor or ""]
+        return hashlib.sha256("\x00".join(partes).encode('utf-8')).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def consultar(self, conn, query: str, params, executar: Callable[[], Any]) -> Any:
+        """Devolve o resultado guardado de `query` ou executa e guarda
+
+        Args:
+            conn: conexão do chamador, usada para a impressão digital das tabelas
+            executar: função sem argumentos que executa a consulta (o resultado
+                precisa ser serializável com pickle; exceções não são guardadas)
+        """
+        try:
+            tabelas = self.tabelas_da_consulta(conn, query)
+        except Exception:
+            conn.rollback()
+            tabelas = None
+        if tabelas is None:
+            with self._lock:
+                self.estatisticas['ignoradas'] += 1
+            return executar()
+
+        data_servidor, impressao = self.impressao_digital(conn, tabelas)
+        chave = self._chave(query, params, data_servidor if _DATA_ATUAL.search(_LITERAIS.sub(" ", query)) else None)
+        agora = time.time()
+
+        with self._lock:
+            linha = self._db.execute(
+                "SELECT impressao, criado_em, custo_s, dados FROM entradas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is not None:
+                impressao_salva, criado_em, custo_s, dados = linha
+                if impressao_salva == impressao and agora - criado_em < self.ttl:
+                    self._db.execute("UPDATE entradas SET acessado_em = ?, acertos = acertos + 1 WHERE chave = ?",
+                                     (agora, chave))
+                    self.estatisticas['acertos'] += 1
+                    self.estatisticas['segundos_economizados'] += custo_s
+                    return pickle.loads(dados)
+                self.estatisticas['invalidadas' if impressao_salva != impressao else 'expiradas'] += 1
+            self.estatisticas['faltas'] += 1
+
+        inicio = time.perf_counter()
+        resultado = executar()
+        custo = time.perf_counter() - inicio
+
+        dados = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(dados) <= self.limite_bytes:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entradas (chave, tabelas, impressao, criado_em, acessado_em, custo_s, "
+                    "bytes, dados) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (chave, f"|{'|'.join(sorted(set(tabelas.values())))}|", impressao, agora, agora, custo,
+                     len(dados), dados))
+                self._descartar_excedente()
+        return resultado
+
+    def _descartar_excedente(self):
+        """Remove as entradas menos usadas recentemente até caber no limite (chamado com o lock)"""
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM entradas").fetchone()[0]
+        if total <= self.limite_bytes:
+            return
+        descartar = []
+        for chave, tamanho in self._db.execute("SELECT chave, bytes FROM entradas ORDER BY acessado_em"):
+            if total <= self.limite_bytes:
+                break
+            descartar.append((chave,))
+            total -= tamanho
+        self._db.executemany("DELETE FROM entradas WHERE chave = ?", descartar)
+        self.estatisticas['descartadas_lru'] += len(descartar)
+
+    def invalidar(self, tabelas: Optional[Iterable[str]] = None) -> int:
+        """Remove as entradas que leem alguma das tabelas (todas, se None); retorna quantas"""
+        with self._lock:
+            if tabelas is None:
+                return self._db.execute("DELETE FROM entradas").rowcount
+            removidas = 0
+            for tabela in tabelas:
+                removidas += self._db.execute("DELETE FROM entradas WHERE tabelas LIKE ?",
+                                              (f"%|{tabela}|%",)).rowcount
+            return removidas
+
+    def resumo(self) -> Dict:
+        """Estatísticas desta execução e ocupação atual do cache"""
+        with self._lock:
+            entradas, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entradas").fetchone()
+            estatisticas = dict(self.estatisticas)
+        consultas = estatisticas['acertos'] + estatisticas['faltas']
+        estatisticas['segundos_economizados'] = round(estatisticas['segundos_economizados'], 3)
+        return {
+            **estatisticas,
+            'taxa_acerto': round(estatisticas['acertos'] / consultas, 3) if consultas else None,
+            'entradas': entradas,
+            'tamanho_mb': round(total / (1024 * 1024), 2),
+            'limite_mb': round(self.limite_bytes / (1024 * 1024), 2),
+            'ttl_segundos': self.ttl,
+            'arquivo': self.arquivo
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Dashboard Financeiro por Unidade - Módulo Financeiro
+FoncareSystem
+
+Calcula os indicadores do mês corrente por unidade agregando cada tabela de
+fatos separadamente (uma linha por unidade_id) e só então juntando os
+agregados com unidades.
+
+vw_dashboard_financeiro faz LEFT JOIN das quatro tabelas de uma vez: cada
+unidade gera o produto cartesiano de suas linhas de contas_receber,
+contas_pagar, folha_clt e folha_pj, o que multiplica as somas e o custo da
+consulta. O modo de verificação (comparar_com_view) aponta onde a view
+diverge deste motor e compara os tempos.
+"""
+
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import pandas as pd
+
+
+class DashboardFinanceiro:
+    """Indicadores do mês corrente por unidade sem fan-out entre tabelas"""
+
+    COLUNAS_METRICAS = [
+        'receita_confirmada', 'receita_pendente', 'total_glosas',
+        'despesas_pagas', 'despesas_pendentes', 'folha_clt', 'folha_pj'
+    ]
+
+    # Linhas de cada tabela por unidade: a view multiplica cada soma pelo
+    # produto das contagens das outras tabelas
+    COLUNAS_CONTAGEM = ['linhas_receber', 'linhas_pagar', 'linhas_clt', 'linhas_pj']
+
+    QUERY_ESCOPO = """
+    WITH receber AS (
+        SELECT unidade_id,
+               COUNT(*) as linhas_receber,
+               SUM(valor_liquido) FILTER (WHERE status = 'Recebido') as receita_confirmada,
+               SUM(valor_bruto) FILTER (WHERE status = 'Pendente') as receita_pendente,
+               SUM(valor_glosa) as total_glosas
+        FROM contas_receber
+        WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE){escopo}
+        GROUP BY unidade_id
+    ),
+    pagar AS (
+        SELECT unidade_id,
+               COUNT(*) as linhas_pagar,
+               SUM(valor) FILTER (WHERE status = 'Pago') as despesas_pagas,
+               SUM(valor) FILTER (WHERE status = 'Pendente') as despesas_pendentes
+        FROM contas_pagar
+        WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE){escopo}
+        GROUP BY unidade_id
+    ),
+    clt AS (
+        SELECT unidade_id, COUNT(*) as linhas_clt, SUM(custo_total) as folha_clt
+        FROM folha_clt
+        WHERE mes_referencia = DATE_TRUNC('month', CURRENT_DATE){escopo}
+        GROUP BY unidade_id
+    ),
+    pj AS (
+        SELECT unidade_id, COUNT(*) as linhas_pj, SUM(valor_repasse) as folha_pj
+        FROM folha_pj
+        WHERE mes_referencia = DATE_TRUNC('month', CURRENT_DATE){escopo}
+        GROUP BY unidade_id
+    )
+    SELECT
+        u.id as unidade_id,
+        u.nome as unidade_nome,
+        COALESCE(r.receita_confirmada, 0) as receita_confirmada,
+        COALESCE(r.receita_pendente, 0) as receita_pendente,
+        COALESCE(r.total_glosas, 0) as total_glosas,
+        COALESCE(p.despesas_pagas, 0) as despesas_pagas,
+        COALESCE(p.despesas_pendentes, 0) as despesas_pendentes,
+        COALESCE(c.folha_clt, 0) as folha_clt,
+        COALESCE(j.folha_pj, 0) as folha_pj,
+        COALESCE(r.linhas_receber, 0) as linhas_receber,
+        COALESCE(p.linhas_pagar, 0) as linhas_pagar,
+        COALESCE(c.linhas_clt, 0) as linhas_clt,
+        COALESCE(j.linhas_pj, 0) as linhas_pj
+    FROM unidades u
+    LEFT JOIN receber r ON r.unidade_id = u.id
+    LEFT JOIN pagar p ON p.unidade_id = u.id
+    LEFT JOIN clt c ON c.unidade_id = u.id
+    LEFT JOIN pj j ON j.unidade_id = u.id
+    {escopo_unidades}
+    ORDER BY u.nome
+    """
+    QUERY = QUERY_ESCOPO.format(escopo='', escopo_unidades='')
+
+    # Unidades escolhidas (por nome ou id), aplicadas em cada tabela antes de agregar
+    ESCOPO = (" AND unidade_id = ANY(ARRAY(SELECT id FROM unidades "
+              "WHERE nome = ANY(%(unidades)s) OR id::text = ANY(%(unidades)s)))")
+    ESCOPO_UNIDADES = "WHERE u.nome = ANY(%(unidades)s) OR u.id::text = ANY(%(unidades)s)"
+
+    def __init__(self, executar_query: Callable[..., pd.DataFrame], unidades: Sequence[str] = (),
+                 agregados: Optional[Callable[[], pd.DataFrame]] = None):
+        """
+        Args:
+            executar_query: função que executa SQL e devolve DataFrame (ex.: AnaliseFinanceira.executar_query)
+            unidades: restringe o dashboard a estas unidades (nome ou id); vazio: todas
+            agregados: fonte alternativa das linhas de QUERY_ESCOPO (ex.: BackendLocal, sem banco)
+        """
+        self.executar_query = executar_query
+        self.unidades = list(unidades or ())
+        self.agregados = agregados
+
+    def _consultar(self) -> pd.DataFrame:
+        if self.agregados is not None:
+            df = self.agregados()
+        elif self.unidades:
+            df = self.executar_query(self.QUERY_ESCOPO.format(escopo=self.ESCOPO, escopo_unidades=self.ESCOPO_UNIDADES),
+                                     {'unidades': self.unidades})
+        else:
+            df = self.executar_query(self.QUERY)
+        if df.empty:
+            return pd.DataFrame(columns=['unidade_id', 'unidade_nome']
+                                + self.COLUNAS_METRICAS + self.COLUNAS_CONTAGEM)
+        for coluna in self.COLUNAS_METRICAS:
+            df[coluna] = df[coluna].astype(float)
+        return df
+
+    def por_unidade(self) -> pd.DataFrame:
+        """Indicadores do mês corrente, uma linha por unidade (mesmas colunas da view)"""
+        return self._consultar()[['unidade_nome'] + self.COLUNAS_METRICAS]
+
+    def resumo(self) -> Dict:
+        """Indicadores por unidade e totais, no formato usado nos relatórios"""
+        df = self.por_unidade()
+        if df.empty:
+            return {"erro": "Nenhuma unidade encontrada"}
+        totais = {coluna: round(float(df[coluna].sum()), 2) for coluna in self.COLUNAS_METRICAS}
+        totais['resultado'] = round(totais['receita_confirmada'] - totais['despesas_pagas']
+                                    - totais['folha_clt'] - totais['folha_pj'], 2)
+        return {
+            "unidades": df.round(2).to_dict('records'),
+            "totais": totais
+        }
+
+    def comparar_com_view(self, repeticoes: int = 3, tolerancia: float = 0.01) -> Dict:
+        """Compara vw_dashboard_financeiro com o motor agregado (valores e tempo)
+
+        Returns:
+            divergências por unidade/indicador, com as contagens de linhas que
+            explicam o fan-out, e o menor tempo de cada abordagem
+        """
+        tempos = {'view': [], 'motor': []}
+        view = motor = None
+        for _ in range(max(1, repeticoes)):
+            inicio = time.perf_counter()
+            view = self.executar_query("SELECT * FROM vw_dashboard_financeiro")
+            tempos['view'].append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            motor = self._consultar()
+            tempos['motor'].append(time.perf_counter() - inicio)
+
+        for coluna in self.COLUNAS_METRICAS:
+            view[coluna] = view[coluna].astype(float)
+
+        # A view só expõe o nome; unidades homônimas são comparadas na ordem
+        chave = ['unidade_nome', 'ordem']
+        view = view.assign(ordem=view.groupby('unidade_nome').cumcount())
+        motor = motor.assign(ordem=motor.groupby('unidade_nome').cumcount())
+        combinado = motor.merge(view, on=chave, how='outer', suffixes=('_motor', '_view'), indicator=True)
+
+        divergencias = []
+        for _, linha in combinado.iterrows():
+            if linha['_merge'] != 'both':
+                divergencias.append({'unidade': linha['unidade_nome'],
+                                     'problema': 'ausente na view' if linha['_merge'] == 'left_only'
+                                     else 'ausente no motor'})
+                continue
+
+            indicadores = {}
+            for coluna in self.COLUNAS_METRICAS:
+                valor_view, valor_motor = linha[f"{coluna}_view"], linha[f"{coluna}_motor"]
+                if abs(valor_view - valor_motor) > tolerancia:
+                    indicadores[coluna] = {
+                        'view': round(valor_view, 2),
+                        'motor': round(valor_motor, 2),
+                        'fator': round(valor_view / valor_motor, 2) if valor_motor else None
+                    }
+            if indicadores:
+                divergencias.append({
+                    'unidade': linha['unidade_nome'],
+                    'indicadores': indicadores,
+                    'linhas_por_tabela': {coluna: int(linha[coluna]) for coluna in self.COLUNAS_CONTAGEM}
+                })
+
+        tempo_view, tempo_motor = min(tempos['view']), min(tempos['motor'])
+        return {
+            'unidades_comparadas': int((combinado['_merge'] == 'both').sum()),
+            'unidades_divergentes': len(divergencias),
+            'divergencias': divergencias,
+            'tempo_view_s': round(tempo_view, 4),
+            'tempo_motor_s': round(tempo_motor, 4),
+            'aceleracao': round(tempo_view / tempo_motor, 1) if tempo_motor else None
+        }
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Espelho Local Incremental - Módulo Financeiro
+FoncareSystem
+
+Mantém uma cópia colunar (Parquet, particionada por mês de created_at) de
+contas_receber e contas_pagar. A cada sincronização só são buscadas as
+linhas com updated_at posterior à marca d'água salva; periodicamente os
+totais por mês são comparados com o banco para detectar exclusões.
+
+Todas as leituras de uma tabela são feitas antes de gravar qualquer
+partição: se uma consulta falha, a sincronização é abortada e partições e
+marca d'água ficam como estavam.
+
+Estrutura em disco:
+    <diretorio>/<tabela>/mes=AAAA-MM/dados.parquet
+    <diretorio>/<tabela>/_estado.json
+    <diretorio>/<dimensao>.parquet     (unidades, convenios)
+
+As análises sobre o espelho ficam em backend_financeiro.BackendLocal, que lê
+as partições por carregar/carregar_dimensao.
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+def normalizar_colunas(df: pd.DataFrame, colunas_valor: List[str], datas: List[str] = ()) -> pd.DataFrame:
+    """Converte tipos vindos do psycopg2 (ou de texto) para colunas estáveis
+
+    Valores para float, created_at/updated_at para UTC, `data_*` e `datas`
+    para datetime e ids para string.
+    """
+    for coluna in colunas_valor:
+        if coluna in df:
+            df[coluna] = df[coluna].astype(float)
+    for coluna in ('created_at', 'updated_at'):
+        if coluna in df:
+            df[coluna] = pd.to_datetime(df[coluna], utc=True)
+    for coluna in df.columns:
+        if coluna.startswith('data_') or coluna in datas:
+            df[coluna] = pd.to_datetime(df[coluna])
+        elif coluna.endswith('_id') or coluna == 'id':
+            df[coluna] = df[coluna].astype('string')
+    return df
+
+
+class EspelhoLocal:
+    """Espelho Parquet de contas_receber/contas_pagar sincronizado por updated_at"""
+
+    TABELAS = {
+        'contas_receber': [
+            'id', 'unidade_id', 'convenio_id', 'origem', 'status',
+            'valor_bruto', 'valor_liquido', 'valor_glosa', 'percentual_glosa',
+            'data_vencimento', 'data_recebimento', 'created_at', 'updated_at'
+        ],
+        'contas_pagar': [
+            'id', 'unidade_id', 'categoria', 'status', 'valor',
+            'data_vencimento', 'data_pagamento', 'created_at', 'updated_at'
+        ]
+    }
+
+    COLUNAS_VALOR = {
+        'contas_receber': ['valor_bruto', 'valor_liquido', 'valor_glosa', 'percentual_glosa'],
+        'contas_pagar': ['valor']
+    }
+
+    DIMENSOES = {
+        'unidades': "SELECT id, nome FROM unidades",
+        'convenios': "SELECT id, nome FROM convenios"
+    }
+
+    def __init__(self, executar_query: Callable[..., pd.DataFrame], diretorio: Optional[str] = None,
+                 intervalo_reconciliacao_horas: float = 24, margem_segura_minutos: int = 5):
+        """
+        Args:
+            executar_query: função que executa SQL e devolve DataFrame, propagando as falhas
+                (ex.: AnaliseFinanceira._ler_query); um DataFrame vazio vale como "nenhuma linha"
+            diretorio: raiz do espelho (padrão: FINANCEIRO_ESPELHO_DIR ou .espelho_financeiro)
+            intervalo_reconciliacao_horas: frequência da verificação de exclusões
+            margem_segura_minutos: sobreposição da marca d'água para transações confirmadas com atraso
+        """
+        self.executar_query = executar_query
+        self.diretorio = diretorio or os.getenv('FINANCEIRO_ESPELHO_DIR', '.espelho_financeiro')
+        self.intervalo_reconciliacao = timedelta(hours=intervalo_reconciliacao_horas)
+        self.margem_segura = timedelta(minutes=margem_segura_minutos)
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Estado e partições
+    # ------------------------------------------------------------------
+
+    def _dir_tabela(self, tabela: str) -> str:
+        return os.path.join(self.diretorio, tabela)
+
+    def _arquivo_particao(self, tabela: str, mes: str) -> str:
+        return os.path.join(self._dir_tabela(tabela), f"mes={mes}", "dados.parquet")
+
+    def _carregar_estado(self, tabela: str) -> Dict:
+        caminho = os.path.join(self._dir_tabela(tabela), '_estado.json')
+        if not os.path.exists(caminho):
+            return {}
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _salvar_estado(self, tabela: str, estado: Dict):
+        os.makedirs(self._dir_tabela(tabela), exist_ok=True)
+        caminho = os.path.join(self._dir_tabela(tabela), '_estado.json')
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    def meses_particionados(self, tabela: str) -> List[str]:
+        """Lista os meses (AAAA-MM) presentes no espelho"""
+        raiz = self._dir_tabela(tabela)
+        if not os.path.isdir(raiz):
+            return []
+        return sorted(nome[4:] for nome in os.listdir(raiz)
+                      if nome.startswith('mes=') and os.path.exists(os.path.join(raiz, nome, 'dados.parquet')))
+
+    def _ler_particao(self, tabela: str, mes: str) -> pd.DataFrame:
+        caminho = self._arquivo_particao(tabela, mes)
+        if not os.path.exists(caminho):
+            return pd.DataFrame(columns=self.TABELAS[tabela])
+        return pd.read_parquet(caminho)
+
+    def _gravar_particao(self, tabela: str, mes: str, df: pd.DataFrame):
+        caminho = self._arquivo_particao(tabela, mes)
+        if df.empty:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            return
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = caminho + '.tmp'
+        df.reset_index(drop=True).to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+
+    @staticmethod
+    def _mes_particao(serie: pd.Series) -> pd.Series:
+        """Chave AAAA-MM da partição a partir de created_at (em UTC)"""
+        return pd.to_datetime(serie, utc=True).dt.strftime('%Y-%m')
+
+    def _normalizar(self, tabela: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Converte tipos vindos do psycopg2 para colunas Parquet estáveis"""
+        return normalizar_colunas(df, self.COLUNAS_VALOR[tabela])
+
+    # ------------------------------------------------------------------
+    # Sincronização
+    # ------------------------------------------------------------------
+
+    def _buscar(self, tabela: str, condicao: str, params: tuple) -> pd.DataFrame:
+        colunas = ', '.join(self.TABELAS[tabela])
+        query = f"SELECT {colunas} FROM {tabela} WHERE {condicao}"
+        df = self.executar_query(query, params)
+        # Sem as colunas, a leitura falhou (um leitor que engole erros devolve DataFrame() vazio)
+        if not set(self.TABELAS[tabela]) <= set(df.columns):
+            raise RuntimeError(f"Leitura de {tabela} não retornou as colunas esperadas; sincronização abortada")
+        if df.empty:
+            return pd.DataFrame(columns=self.TABELAS[tabela])
+        return self._normalizar(tabela, df)
+
+    def _preparar_delta(self, tabela: str, delta: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Partições afetadas pelas linhas alteradas, já com as linhas substituídas/inseridas (mês -> dados)"""
+        if delta.empty:
+            return {}
+
+        particoes = {}
+        delta = delta.assign(_mes=self._mes_particao(delta['created_at']))
+        for mes, linhas in delta.groupby('_mes'):
+            linhas = linhas.drop(columns='_mes')
+            atual = self._ler_particao(tabela, mes)
+            if not atual.empty:
+                atual = atual[~atual['id'].isin(linhas['id'])]
+                linhas = pd.concat([atual, linhas], ignore_index=True)
+            particoes[mes] = linhas
+        return particoes
+
+    def sincronizar_tabela(self, tabela: str, forcar_reconciliacao: bool = False) -> Dict:
+        """Traz para o espelho apenas as linhas alteradas desde a última marca d'água"""
+        inicio = time.perf_counter()
+        estado = self._carregar_estado(tabela)
+        marca = estado.get('marca_dagua')
+
+        if marca:
+            limite = pd.Timestamp(marca) - self.margem_segura
+            delta = self._buscar(tabela, "updated_at >= %s", (limite.to_pydatetime(),))
+        else:
+            delta = self._buscar(tabela, "TRUE", None)
+
+        particoes = self._preparar_delta(tabela, delta)
+        reescritas_delta = len(particoes)
+        reconciliacao = None
+        ultima = estado.get('ultima_reconciliacao')
+        if forcar_reconciliacao or not marca or not ultima or \
+                datetime.now() - datetime.fromisoformat(ultima) >= self.intervalo_reconciliacao:
+            refeitas, reconciliacao = self._preparar_reconciliacao(tabela, particoes)
+            particoes = {**particoes, **refeitas}
+
+        # Só grava depois que todas as leituras deram certo
+        for mes, linhas in particoes.items():
+            self._gravar_particao(tabela, mes, linhas)
+        if reconciliacao is not None:
+            estado['ultima_reconciliacao'] = datetime.now().isoformat()
+
+        if not delta.empty and delta['updated_at'].notna().any():
+            nova_marca = delta['updated_at'].max()
+            if not marca or nova_marca > pd.Timestamp(marca):
+                estado['marca_dagua'] = nova_marca.isoformat()
+
+        resultado = {
+            'linhas_recebidas': len(delta),
+            'particoes_reescritas': reescritas_delta,
+            'reconciliacao': reconciliacao
+        }
+
+        self._salvar_estado(tabela, estado)
+        resultado['tempo_segundos'] = round(time.perf_counter() - inicio, 3)
+        return resultado
+
+    def reconciliar_tabela(self, tabela: str) -> Dict:
+        """Compara contagens por mês com o banco e refaz as partições divergentes
+
+        Cobre exclusões (que não alteram updated_at) e linhas cujo created_at
+        mudou de mês. Se alguma consulta falha, nenhuma partição é alterada.
+        """
+        refeitas, resultado = self._preparar_reconciliacao(tabela, {})
+        for mes, linhas in refeitas.items():
+            self._gravar_particao(tabela, mes, linhas)
+        return resultado
+
+    def _preparar_reconciliacao(self, tabela: str, pendentes: Dict[str, pd.DataFrame]):
+        """Lê do banco as partições divergentes, sem gravar
+
+        Args:
+            pendentes: partições ainda não gravadas (mês -> dados), contadas no lugar das do disco
+
+        Returns:
+            (partições a regravar, mês -> dados; vazias são removidas), resumo da reconciliação
+        """
+        remoto = self.executar_query(f"""
+            SELECT TO_CHAR(created_at AT TIME ZONE 'UTC', 'YYYY-MM') as mes, COUNT(*) as quantidade
+            FROM {tabela}
+            GROUP BY 1
+        """)
+        # Zero linhas com as colunas é uma tabela vazia; sem as colunas, a contagem falhou
+        if not {'mes', 'quantidade'} <= set(remoto.columns):
+            raise RuntimeError(f"Contagem por mês de {tabela} não retornou resultado; reconciliação abortada")
+        contagem_remota = {m: int(q) for m, q in zip(remoto['mes'], remoto['quantidade']) if m}
+
+        import pyarrow.parquet as pq
+
+        contagem_local = {mes: pq.ParquetFile(self._arquivo_particao(tabela, mes)).metadata.num_rows
+                          for mes in self.meses_particionados(tabela)}
+        contagem_local.update({mes: len(linhas) for mes, linhas in pendentes.items()})
+
+        divergentes = sorted(mes for mes in set(contagem_remota) | set(contagem_local)
+                             if contagem_remota.get(mes, 0) != contagem_local.get(mes, 0))
+
+        refeitas = {}
+        for mes in divergentes:
+            if mes not in contagem_remota:
+                refeitas[mes] = pd.DataFrame()
+                continue
+            inicio_mes = datetime.strptime(mes, '%Y-%m')
+            fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+            refeitas[mes] = self._buscar(
+                tabela,
+                "created_at >= %s AT TIME ZONE 'UTC' AND created_at < %s AT TIME ZONE 'UTC'",
+                (inicio_mes, fim_mes)
+            )
+
+        return refeitas, {'meses_verificados': len(contagem_remota), 'meses_refeitos': divergentes}
+
+    def sincronizar(self, forcar_reconciliacao: bool = False) -> Dict:
+        """Sincroniza todas as tabelas de fatos e recarrega as dimensões"""
+        resultado = {}
+        for tabela in self.TABELAS:
+            resultado[tabela] = self.sincronizar_tabela(tabela, forcar_reconciliacao)
+
+        for dimensao, query in self.DIMENSOES.items():
+            df = self.executar_query(query)
+            if not df.empty:
+                df['id'] = df['id'].astype('string')
+                df.to_parquet(os.path.join(self.diretorio, f"{dimensao}.parquet"), index=False)
+
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Leitura para as análises
+    # ------------------------------------------------------------------
+
+    def carregar(self, tabela: str, desde: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Lê as partições a partir do mês de `desde` (poda por nome de partição)"""
+        meses = self.meses_particionados(tabela)
+        if desde is not None:
+            primeiro = pd.Timestamp(desde).strftime('%Y-%m')
+            meses = [m for m in meses if m >= primeiro]
+
+        partes = [self._ler_particao(tabela, mes) for mes in meses]
+        if not partes:
+            return pd.DataFrame(columns=self.TABELAS[tabela])
+
+        df = pd.concat(partes, ignore_index=True)
+        if desde is not None:
+            df = df[df['created_at'] >= pd.Timestamp(desde, tz='UTC')]
+        return df
+
+    def carregar_dimensao(self, dimensao: str) -> pd.DataFrame:
+        caminho = os.path.join(self.diretorio, f"{dimensao}.parquet")
+        if not os.path.exists(caminho):
+            return pd.DataFrame(columns=['id', 'nome'])
+        return pd.read_parquet(caminho)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Exportação para Excel - Módulo Financeiro
+FoncareSystem
+
+Grava em .xlsx as seções de receitas por origem, glosas e projeção de um
+relatório já calculado e, opcionalmente, planilhas de detalhe linha a linha
+(contas a receber) lidas em blocos de um cursor no servidor.
+
+O livro é aberto em modo write-only do openpyxl: cada linha é serializada
+para o arquivo temporário da planilha assim que é acrescentada, então a
+memória não cresce com o número de linhas. Os formatos (moeda, percentual,
+datas) são estilos nomeados registrados uma única vez no livro; cada coluna
+formatada usa uma única célula-modelo com o estilo, reaproveitada a cada
+linha, em vez de um objeto de estilo por célula. Detalhes acima do limite
+de linhas do Excel continuam em planilhas "<nome> (2)", "(3)"...
+
+Percentuais do relatório e do banco (0 a 100) são gravados como fração,
+com o formato percentual do Excel.
+"""
+
+import math
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+LIMITE_LINHAS_EXCEL = 1_048_576
+LIMITE_TITULO = 31
+
+ESTILOS = {
+    'moeda': '"R$" #,##0.00;[Red]-"R$" #,##0.00',
+    'percentual': '0.00%',
+    'inteiro': '#,##0',
+    'mes': 'MM/YYYY',
+    'data': 'DD/MM/YYYY',
+    'data_hora': 'DD/MM/YYYY HH:MM:SS',
+}
+PREFIXOS_PERCENTUAIS = ('percentual', 'media_glosa', 'taxa')
+
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Exportação para Excel requer o pacote 'openpyxl' (pip install openpyxl)")
+    return openpyxl
+
+
+def formato_coluna(coluna: str, tipo: str) -> Optional[str]:
+    """Estilo nomeado de uma coluna pelo nome e tipo ('data', 'inteiro', 'decimal' ou 'texto')"""
+    if tipo == 'data':
+        if coluna == 'mes':
+            return 'mes'
+        return 'data' if coluna.startswith('data_') else 'data_hora'
+    if tipo == 'inteiro':
+        return 'inteiro'
+    if tipo == 'decimal':
+        return 'percentual' if coluna.startswith(PREFIXOS_PERCENTUAIS) else 'moeda'
+    return None
+
+
+def _tipo_valor(valor) -> str:
+    if isinstance(valor, (datetime, date)):
+        return 'data'
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return 'texto'
+    return 'inteiro' if isinstance(valor, int) else 'decimal'
+
+
+def _tipo_dtype(dtype) -> str:
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'data'
+    if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+        return 'texto'
+    return 'inteiro' if pd.api.types.is_integer_dtype(dtype) else 'decimal'
+
+
+def _valor(valor):
+    """Escalar aceito pelo openpyxl: NumPy para Python, NaN/NaT para vazio, sem fuso horário"""
+    if valor is None or valor is pd.NaT or valor is pd.NA:
+        return None
+    if hasattr(valor, 'item') and not isinstance(valor, (datetime, date)):
+        valor = valor.item()
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    if isinstance(valor, datetime) and valor.tzinfo is not None:
+        return valor.replace(tzinfo=None)
+    if isinstance(valor, (list, tuple, dict)):
+        return str(valor)
+    return valor
+
+
+class _Planilha:
+    """Planilha write-only com cabeçalho, células-modelo por coluna e continuação acima do limite"""
+
+    def __init__(self, livro, titulo: str, colunas: List[str], tipos: List[str]):
+        self.livro = livro
+        self.titulo = titulo[:LIMITE_TITULO]
+        self.colunas = list(colunas)
+        self.formatos = [formato_coluna(coluna, tipo) for coluna, tipo in zip(colunas, tipos)]
+        self.percentuais = [coluna for coluna, formato in zip(colunas, self.formatos) if formato == 'percentual']
+        self.partes = 0
+        self.linhas = 0
+        self._nova_folha()
+
+    def _nova_folha(self):
+        self.partes += 1
+        sufixo = f" ({self.partes})" if self.partes > 1 else ""
+        self.folha = self.livro.create_sheet(self.titulo[:LIMITE_TITULO - len(sufixo)] + sufixo)
+        self.folha.freeze_panes = 'A2'
+        letras = _openpyxl().utils.get_column_letter
+        for indice, coluna in enumerate(self.colunas, 1):
+            self.folha.column_dimensions[letras(indice)].width = max(12, len(coluna) + 2)
+        self.folha.append([self.celula('cabecalho', coluna) for coluna in self.colunas])
+        # Uma célula estilizada por coluna formatada, reaproveitada em todas as linhas
+        self._modelos = [(indice, self.celula(formato)) for indice, formato in enumerate(self.formatos) if formato]
+        self._linhas_folha = 1
+
+    def celula(self, estilo: Optional[str], valor=None):
+        """Célula avulsa com um dos estilos nomeados do livro"""
+        celula = _openpyxl().cell.WriteOnlyCell(self.folha, valor)
+        if estilo:
+            celula.style = estilo
+        return celula
+
+    def escrever(self, linhas: Iterable[list]):
+        """Acrescenta linhas (listas de valores já convertidos, na ordem das colunas)"""
+        for linha in linhas:
+            if self._linhas_folha >= LIMITE_LINHAS_EXCEL:
+                self._nova_folha()
+            for indice, modelo in self._modelos:
+                # O write-only serializa a linha dentro do append: o modelo pode receber o próximo valor
+                modelo.value = linha[indice]
+                linha[indice] = modelo
+            self.folha.append(linha)
+            self._linhas_folha += 1
+            self.linhas += 1
+
+    def escrever_quadro(self, df: pd.DataFrame):
+        """Acrescenta um bloco com as mesmas colunas da planilha"""
+        df = df[self.colunas]
+        ajustes = {coluna: df[coluna] / 100 for coluna in self.percentuais}
+        for coluna in df.columns:
+            if isinstance(df[coluna].dtype, pd.DatetimeTZDtype):
+                ajustes[coluna] = df[coluna].dt.tz_convert(None)
+        if ajustes:
+            df = df.assign(**ajustes)
+        valores = df.astype(object).where(df.notna(), None)
+        self.escrever(list(linha) for linha in valores.itertuples(index=False, name=None))
+
+
+def _escrever_registros(livro, titulo: str, colunas: List[str], registros: List[list]) -> int:
+    """Planilha pequena a partir de linhas de valores Python (tipos pela primeira linha preenchida)"""
+    registros = [[_valor(valor) for valor in registro] for registro in registros]
+    tipos = []
+    for indice in range(len(colunas)):
+        amostra = next((registro[indice] for registro in registros if registro[indice] is not None), None)
+        tipos.append(_tipo_valor(amostra))
+    planilha = _Planilha(livro, titulo, colunas, tipos)
+    for registro in registros:
+        for coluna in planilha.percentuais:
+            indice = colunas.index(coluna)
+            if isinstance(registro[indice], (int, float)):
+                registro[indice] = registro[indice] / 100
+    planilha.escrever(registros)
+    return planilha.linhas
+
+
+def _tabela(dados: Dict[str, Dict], indice: str) -> Tuple[List[str], List[list]]:
+    """Seção no formato de DataFrame.to_dict() (coluna -> {chave: valor}) como colunas e linhas"""
+    colunas = list(dados)
+    chaves = list(dict.fromkeys(chave for valores in dados.values() for chave in valores))
+    return [indice] + colunas, [[chave] + [dados[coluna].get(chave) for coluna in colunas] for chave in chaves]
+
+
+def _planilhas_receitas(dados: Dict) -> Dict[str, Tuple[List[str], List[list]]]:
+    return {
+        "Receitas por origem": _tabela(dados.get('receitas_por_origem', {}), 'origem'),
+        "Receitas por convênio": _tabela(dados.get('receitas_por_convenio', {}), 'convenio'),
+        "Receitas por mês": _tabela(dados.get('tendencia_mensal', {}), 'mes'),
+    }
+
+
+def _planilhas_glosas(dados: Dict) -> Dict[str, Tuple[List[str], List[list]]]:
+    return {
+        "Glosas por convênio": _tabela(dados.get('glosas_por_convenio', {}), 'convenio'),
+        "Glosas por mês": _tabela(dados.get('evolucao_mensal', {}), 'mes'),
+    }
+
+
+def _planilhas_projecao(dados: Dict) -> Dict[str, Tuple[List[str], List[list]]]:
+    def _limites(intervalo):
+        return list(intervalo) if intervalo else [None, None]
+
+    total = [[p['mes'], p['receita_projetada'], *_limites(p.get('receita_intervalo')),
+              p['despesa_projetada'], *_limites(p.get('despesa_intervalo')), p['resultado_projetado']]
+             for p in dados.get('projecoes', [])]
+    series = []
+    for tipo, chave in (('receita', 'receitas_por_unidade'), ('despesa', 'despesas_por_unidade_categoria')):
+        for serie in dados.get(chave, []):
+            for p in serie['projecoes']:
+                series.append([tipo, serie['unidade'], serie.get('categoria', 'Receita'), p['mes'],
+                               p['projetado'], *_limites(p.get('intervalo'))])
+    return {
+        "Projeção": (['mes', 'receita_projetada', 'receita_limite_inferior', 'receita_limite_superior',
+                      'despesa_projetada', 'despesa_limite_inferior', 'despesa_limite_superior',
+                      'resultado_projetado'], total),
+        "Projeção por série": (['tipo', 'unidade', 'categoria', 'mes', 'projetado',
+                                'limite_inferior', 'limite_superior'], series),
+    }
+
+
+# Seção do relatório -> (planilhas derivadas, indicadores escalares que vão para "Resumo")
+SECOES_EXCEL = {
+    'receitas_por_origem': (_planilhas_receitas, lambda dados: dados),
+    'analise_glosas': (_planilhas_glosas,
+                       lambda dados: {**dados.get('resumo_geral', {}), **dados.get('pior_performance', {})}),
+    'projecao_fluxo_caixa': (_planilhas_projecao, lambda dados: dados.get('historico', {})),
+}
+
+
+def _resumo(relatorio: Dict) -> List[list]:
+    """Indicadores escalares das seções exportadas e do resumo executivo"""
+    fontes = [(secao, indicadores(relatorio[secao])) for secao, (_, indicadores) in SECOES_EXCEL.items()
+              if relatorio.get(secao) and "erro" not in relatorio[secao]]
+    resumo_executivo = relatorio.get('resumo_executivo') or {}
+    if 'indicadores_principais' in resumo_executivo:
+        fontes.append(('resumo_executivo', resumo_executivo['indicadores_principais']))
+    return [[secao, indicador, _valor(valor)] for secao, valores in fontes
+            for indicador, valor in valores.items() if not isinstance(valor, (dict, list))]
+
+
+def exportar_excel(relatorio: Dict, caminho: str,
+                   detalhes: Optional[Dict[str, Iterable[pd.DataFrame]]] = None) -> Dict:
+    """Grava o relatório (e os detalhes, bloco a bloco) em uma pasta de trabalho .xlsx
+
+    Args:
+        relatorio: relatório de AnaliseFinanceira (seções com erro são puladas)
+        caminho: arquivo .xlsx de saída
+        detalhes: nome da planilha -> iterável de DataFrames com as mesmas colunas,
+            consumido uma única vez (ex.: AnaliseFinanceira.detalhe_contas_receber())
+
+    Returns:
+        arquivo gravado, linhas por planilha e tempo total
+    """
+    openpyxl = _openpyxl()
+    inicio = time.perf_counter()
+    livro = openpyxl.Workbook(write_only=True)
+    # Estilos registrados uma vez; as células apenas referenciam o nome
+    for nome, formato in ESTILOS.items():
+        livro.add_named_style(openpyxl.styles.NamedStyle(name=nome, number_format=formato))
+    livro.add_named_style(openpyxl.styles.NamedStyle(name='cabecalho', font=openpyxl.styles.Font(bold=True)))
+
+    planilhas = {}
+    resumo = _resumo(relatorio)
+    if resumo:
+        titulo = "Resumo"
+        planilha = _Planilha(livro, titulo, ['secao', 'indicador', 'valor'], ['texto', 'texto', 'texto'])
+        for secao, indicador, valor in resumo:
+            formato = formato_coluna(indicador, _tipo_valor(valor))
+            if formato == 'percentual':
+                valor = valor / 100
+            planilha.escrever([[secao, indicador, planilha.celula(formato, valor)]])
+        planilhas[titulo] = planilha.linhas
+
+    for secao, (derivar, _) in SECOES_EXCEL.items():
+        dados = relatorio.get(secao)
+        if not dados or "erro" in dados:
+            continue
+        for titulo, (colunas, registros) in derivar(dados).items():
+            if registros:
+                planilhas[titulo] = _escrever_registros(livro, titulo, colunas, registros)
+
+    for titulo, blocos in (detalhes or {}).items():
+        planilha = None
+        for bloco in blocos:
+            if planilha is None:
+                planilha = _Planilha(livro, titulo, list(bloco.columns),
+                                     [_tipo_dtype(dtype) for dtype in bloco.dtypes])
+            planilha.escrever_quadro(bloco)
+        planilhas[titulo] = planilha.linhas if planilha is not None else 0
+
+    if not livro.worksheets:
+        return {"erro": "Nenhuma seção com dados para exportar"}
+    livro.save(caminho)
+
+    return {
+        "arquivo": caminho,
+        "planilhas": planilhas,
+        "segundos": round(time.perf_counter() - inicio, 2)
+    }
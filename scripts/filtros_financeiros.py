@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Filtros de Escopo - Módulo Financeiro
+FoncareSystem
+
+Período, unidades e convênios escolhidos na linha de comando, convertidos em
+condições WHERE parametrizadas e sargáveis sobre a tabela de fatos:
+
+    período   -> t.created_at >= %s AND t.created_at < %s
+                 (limites explícitos; `ate` é inclusivo e vira `< ate + 1 dia`)
+    unidades  -> t.unidade_id = ANY(ARRAY(SELECT id FROM unidades WHERE ...))
+    convênios -> t.convenio_id = ANY(ARRAY(SELECT id FROM convenios WHERE ...))
+
+A lista de ids é resolvida uma vez pelo servidor (InitPlan) e comparada
+direto com a coluna da tabela de fatos: nenhuma função é aplicada à coluna,
+e os índices em created_at/unidade_id continuam utilizáveis. Unidades e
+convênios são aceitos por nome ou id.
+
+Sem `de`, o início é a janela móvel de `meses` meses terminando em `ate`
+(ou hoje): `CURRENT_DATE - make_interval(months => %s)`.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class FiltroFinanceiro:
+    """Escopo de uma análise ou verificação: período de lançamento, unidades e convênios"""
+
+    def __init__(self, de: Optional[date] = None, ate: Optional[date] = None,
+                 unidades: Sequence[str] = (), convenios: Sequence[str] = ()):
+        if de is not None and ate is not None and de > ate:
+            raise ValueError(f"Período inválido: {de} é posterior a {ate}")
+        self.de = de
+        self.ate = ate
+        self.unidades = tuple(unidades or ())
+        self.convenios = tuple(convenios or ())
+
+    @property
+    def vazio(self) -> bool:
+        """Sem nenhuma restrição (escopo completo)"""
+        return self.de is None and self.ate is None and not self.unidades and not self.convenios
+
+    def inicio_periodo(self, meses: Optional[int] = None) -> Tuple[Optional[str], List]:
+        """Expressão SQL (e parâmetros) do início do período; None sem `de` nem `meses`"""
+        if self.de is not None:
+            return "%s::date", [self.de]
+        if meses is None:
+            return None, []
+        if self.ate is not None:
+            return "(%s::date + 1 - make_interval(months => %s))", [self.ate, meses]
+        return "(CURRENT_DATE - make_interval(months => %s))", [meses]
+
+    def fim_periodo(self) -> Tuple[Optional[str], List]:
+        """Expressão SQL (e parâmetros) do fim exclusivo do período; None se aberto"""
+        if self.ate is None:
+            return None, []
+        return "%s::date", [self.ate + timedelta(days=1)]
+
+    def condicoes(self, alias: str, meses: Optional[int] = None, periodo: bool = True,
+                  convenio: bool = True) -> Tuple[List[str], List]:
+        """Condições e parâmetros (posicionais) para a tabela de fatos `alias`
+
+        Args:
+            meses: janela móvel usada quando não há `de` (None: sem limite inferior)
+            periodo: aplica o período em created_at
+            convenio: aplica o filtro de convênios (tabelas sem convenio_id: False)
+        """
+        condicoes, parametros = [], []
+        if periodo:
+            inicio, params_inicio = self.inicio_periodo(meses)
+            if inicio is not None:
+                condicoes.append(f"{alias}.created_at >= {inicio}")
+                parametros += params_inicio
+            fim, params_fim = self.fim_periodo()
+            if fim is not None:
+                condicoes.append(f"{alias}.created_at < {fim}")
+                parametros += params_fim
+        if self.unidades:
+            condicoes.append(f"{alias}.unidade_id = ANY(ARRAY(SELECT id FROM unidades "
+                             f"WHERE nome = ANY(%s) OR id::text = ANY(%s)))")
+            parametros += [list(self.unidades), list(self.unidades)]
+        if convenio and self.convenios:
+            condicoes.append(f"{alias}.convenio_id = ANY(ARRAY(SELECT id FROM convenios "
+                             f"WHERE nome = ANY(%s) OR id::text = ANY(%s)))")
+            parametros += [list(self.convenios), list(self.convenios)]
+        return condicoes, parametros
+
+    def where(self, alias: str, meses: Optional[int] = None, periodo: bool = True, convenio: bool = True,
+              extras: Sequence[str] = ()) -> Tuple[str, tuple]:
+        """Cláusula WHERE completa (com `extras` fixos, sem parâmetros) e a tupla de parâmetros"""
+        condicoes, parametros = self.condicoes(alias, meses, periodo, convenio)
+        condicoes = condicoes + list(extras)
+        return ("WHERE " + "\n        AND ".join(condicoes)) if condicoes else "", tuple(parametros)
+
+    def descricao_periodo(self, meses: int) -> str:
+        """Texto do período para os relatórios"""
+        if self.de is not None and self.ate is not None:
+            return f"De {self.de.isoformat()} a {self.ate.isoformat()}"
+        if self.de is not None:
+            return f"Desde {self.de.isoformat()}"
+        if self.ate is not None:
+            return f"{meses} meses até {self.ate.isoformat()}"
+        return f"Últimos {meses} meses"
+
+    def resumo(self) -> Dict:
+        """Seção `filtros` dos relatórios"""
+        return {
+            'de': self.de.isoformat() if self.de else None,
+            'ate': self.ate.isoformat() if self.ate else None,
+            'unidades': list(self.unidades),
+            'convenios': list(self.convenios)
+        }
+
+
+def argumentos_filtro(parser):
+    """Acrescenta --de, --ate, --unidade e --convenio a um ArgumentParser"""
+    parser.add_argument('--de', type=date.fromisoformat, default=None, metavar='AAAA-MM-DD',
+                        help="início do período (data de lançamento, inclusivo)")
+    parser.add_argument('--ate', type=date.fromisoformat, default=None, metavar='AAAA-MM-DD',
+                        help="fim do período (data de lançamento, inclusivo)")
+    parser.add_argument('--unidade', action='append', default=[], metavar='NOME',
+                        help="restringe a uma unidade (nome ou id); repita para várias")
+    parser.add_argument('--convenio', action='append', default=[], metavar='NOME',
+                        help="restringe a um convênio (nome ou id); repita para vários")
+
+
+def filtro_dos_argumentos(args) -> FiltroFinanceiro:
+    """FiltroFinanceiro a partir dos argumentos de argumentos_filtro"""
+    return FiltroFinanceiro(args.de, args.ate, args.unidade, args.convenio)
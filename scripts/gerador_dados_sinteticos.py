@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Gerador de Dados Sintéticos - Módulo Financeiro
+FoncareSystem
+
+Produz dados consistentes e reprodutíveis (por semente) para unidades,
+convenios, contas_pagar, contas_receber, folha_clt, folha_pj e
+atendimentos_guias_tabuladas, com sazonalidade mensal, crescimento e
+distribuição realista de glosas por convênio. A carga usa COPY FROM STDIN
+em lotes, permitindo milhões de linhas em poucos minutos.
+
+Fator de escala 1 corresponde a ~10 mil contas a receber em 24 meses;
+fator 100 a ~1 milhão; fator 1000 a ~10 milhões.
+"""
+
+import io
+import time
+import uuid
+from datetime import date, datetime
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+
+class GeradorDadosSinteticos:
+    """Gera lotes de DataFrames prontos para COPY nas tabelas financeiras"""
+
+    RECEBER_POR_FATOR = 10_000
+    TAMANHO_LOTE = 200_000
+
+    # Peso relativo de cada mês do ano (jan..dez): férias em jan/jul/dez, pico em mar-jun
+    SAZONALIDADE = np.array([0.78, 0.92, 1.10, 1.12, 1.15, 1.08, 0.88, 1.02, 1.05, 1.07, 1.00, 0.83])
+
+    ORIGENS = ['Guia_Tabulada', 'Particular', 'Procedimento', 'Exame', 'Consulta']
+    PESOS_ORIGEM = [0.35, 0.20, 0.15, 0.12, 0.18]
+    # mediana do valor bruto (R$) por origem
+    TICKET_ORIGEM = {'Guia_Tabulada': 180, 'Particular': 300, 'Procedimento': 620, 'Exame': 350, 'Consulta': 240}
+
+    # nome, código, tipo, probabilidade de glosa
+    CONVENIOS = [
+        ('Unimed', 'UNIMED', 'Plano de Saúde', 0.18),
+        ('Bradesco Saúde', 'BRADESCO', 'Plano de Saúde', 0.12),
+        ('SulAmérica', 'SULAMERICA', 'Plano de Saúde', 0.10),
+        ('Amil', 'AMIL', 'Plano de Saúde', 0.22),
+        ('Hapvida', 'HAPVIDA', 'Plano de Saúde', 0.30),
+        ('NotreDame Intermédica', 'GNDI', 'Plano de Saúde', 0.25),
+        ('Porto Seguro Saúde', 'PORTO', 'Plano de Saúde', 0.08),
+        ('Cassi', 'CASSI', 'Autogestão', 0.14),
+        ('SUS', 'SUS', 'Público', 0.35),
+    ]
+
+    CATEGORIAS_DESPESA = ['Consumo', 'Fixa', 'Variavel', 'Investimento']
+    PESOS_CATEGORIA = [0.35, 0.25, 0.35, 0.05]
+    TICKET_CATEGORIA = {'Consumo': 900, 'Fixa': 6000, 'Variavel': 450, 'Investimento': 15000}
+    FORNECEDORES = {
+        'Consumo': ['CPFL Energia', 'Sabesp', 'Vivo Empresas', 'Comgás'],
+        'Fixa': ['Imobiliária Central', 'Contabilidade Silva', 'Seguradora Alfa'],
+        'Variavel': ['Distribuidora Limpa', 'Papelaria Moderna', 'Farma Insumos', 'Lab Apoio'],
+        'Investimento': ['MedEquip', 'TechClinic', 'Mobiliário Pro'],
+    }
+    PROCEDIMENTOS = [
+        ('10101012', 'Consulta em consultório'),
+        ('20103344', 'Sessão de fonoaudiologia'),
+        ('20103360', 'Sessão de terapia ocupacional'),
+        ('20104057', 'Sessão de psicoterapia'),
+        ('20103530', 'Sessão de fisioterapia'),
+        ('40301630', 'Avaliação neuropsicológica'),
+    ]
+
+    COLUNAS = {
+        'unidades': ['id', 'nome', 'endereco', 'telefone', 'email', 'ativo'],
+        'convenios': ['id', 'nome', 'codigo', 'tipo', 'ativo'],
+        'contas_receber': ['descricao', 'valor_bruto', 'valor_liquido', 'valor_glosa', 'data_vencimento',
+                           'data_recebimento', 'origem', 'convenio_id', 'status', 'numero_guia',
+                           'unidade_id', 'created_at', 'updated_at'],
+        'contas_pagar': ['descricao', 'fornecedor', 'valor', 'data_vencimento', 'data_pagamento',
+                         'categoria', 'status', 'unidade_id', 'created_at', 'updated_at'],
+        'folha_clt': ['mes_referencia', 'salario_base', 'horas_extras', 'adicional_noturno', 'vale_transporte',
+                      'vale_refeicao', 'plano_saude', 'inss', 'irrf', 'fgts', 'salario_liquido',
+                      'encargos_patronais', 'status', 'data_pagamento', 'unidade_id'],
+        'folha_pj': ['mes_referencia', 'valor_bruto', 'percentual_repasse', 'descontos', 'status',
+                     'data_pagamento', 'unidade_id'],
+        'atendimentos_guias_tabuladas': ['unidade_id', 'numero_guia', 'paciente_nome', 'convenio', 'procedimento',
+                                         'codigo_procedimento', 'valor_guia', 'valor_pago', 'valor_glosa',
+                                         'data_atendimento', 'status'],
+    }
+
+    # Tabelas de fatos na ordem de carga (dimensões vêm antes)
+    TABELAS_FATOS = ['contas_receber', 'contas_pagar', 'folha_clt', 'folha_pj', 'atendimentos_guias_tabuladas']
+
+    def __init__(self, fator_escala: float = 1.0, semente: int = 42, meses_historico: int = 24,
+                 data_referencia: date = None):
+        if fator_escala <= 0:
+            raise ValueError("fator_escala deve ser positivo")
+
+        self.fator_escala = fator_escala
+        self.semente = semente
+        self.meses_historico = meses_historico
+        self.data_referencia = data_referencia or date.today()
+
+        self.rng = np.random.default_rng(semente)
+
+        self.total_unidades = max(2, int(round(3 * np.sqrt(fator_escala))))
+        self.total_receber = int(round(self.RECEBER_POR_FATOR * fator_escala))
+        self.total_pagar = int(round(self.total_receber * 0.3))
+        self.total_guias = int(round(self.total_receber * 0.4))
+
+        self.unidades = self._montar_unidades()
+        self.convenios = self._montar_convenios()
+        self.meses = self._montar_meses()
+
+    # ------------------------------------------------------------------
+    # Dimensões e calendário
+    # ------------------------------------------------------------------
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(bytes=self.rng.bytes(16), version=4))
+
+    def _montar_unidades(self) -> pd.DataFrame:
+        ids = [self._uuid() for _ in range(self.total_unidades)]
+        # Algumas unidades concentram mais movimento (distribuição log-normal)
+        porte = self.rng.lognormal(0, 0.6, self.total_unidades)
+        return pd.DataFrame({
+            'id': ids,
+            'nome': [f"Unidade Sintética {i + 1:03d}" for i in range(self.total_unidades)],
+            'endereco': [f"Rua Exemplo, {100 + i}" for i in range(self.total_unidades)],
+            'telefone': [f"(11) 3{i:03d}-{i * 7 % 10000:04d}" for i in range(self.total_unidades)],
+            'email': [f"unidade{i + 1:03d}@foncare.exemplo" for i in range(self.total_unidades)],
+            'ativo': True,
+            '_peso': porte / porte.sum()
+        })
+
+    def _montar_convenios(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'id': [self._uuid() for _ in self.CONVENIOS],
+            'nome': [c[0] for c in self.CONVENIOS],
+            'codigo': [c[1] for c in self.CONVENIOS],
+            'tipo': [c[2] for c in self.CONVENIOS],
+            'ativo': True,
+            '_prob_glosa': [c[3] for c in self.CONVENIOS]
+        })
+
+    def _montar_meses(self) -> pd.DataFrame:
+        """Meses do histórico com peso = sazonalidade × crescimento de ~1,5% a.m."""
+        fim = pd.Timestamp(self.data_referencia).to_period('M')
+        periodos = pd.period_range(end=fim, periods=self.meses_historico, freq='M')
+        crescimento = 1.015 ** np.arange(len(periodos))
+        peso = self.SAZONALIDADE[periodos.month - 1] * crescimento
+        # O mês corrente só tem os dias já decorridos
+        peso[-1] *= self.data_referencia.day / periodos[-1].days_in_month
+        return pd.DataFrame({
+            'inicio': periodos.to_timestamp(),
+            'dias': [min(p.days_in_month, self.data_referencia.day) if p == fim else p.days_in_month
+                     for p in periodos],
+            'peso': peso / peso.sum()
+        })
+
+    def _datas_criacao(self, quantidade: int) -> pd.Series:
+        """Sorteia created_at respeitando sazonalidade e crescimento"""
+        idx_mes = self.rng.choice(len(self.meses), size=quantidade, p=self.meses['peso'].to_numpy())
+        inicio = self.meses['inicio'].to_numpy()[idx_mes]
+        dias = self.meses['dias'].to_numpy()[idx_mes]
+        deslocamento = (self.rng.random(quantidade) * dias * 86400).astype('int64')
+        return pd.Series(inicio + deslocamento.astype('timedelta64[s]'))
+
+    def _lotes(self, total: int) -> Iterator[int]:
+        restante = total
+        while restante > 0:
+            lote = min(self.TAMANHO_LOTE, restante)
+            restante -= lote
+            yield lote
+
+    # ------------------------------------------------------------------
+    # Fatos
+    # ------------------------------------------------------------------
+
+    def gerar_contas_receber(self) -> Iterator[pd.DataFrame]:
+        hoje = pd.Timestamp(self.data_referencia)
+        sequencia = 0
+
+        for n in self._lotes(self.total_receber):
+            created_at = self._datas_criacao(n)
+            origem = self.rng.choice(self.ORIGENS, size=n, p=self.PESOS_ORIGEM)
+            ticket = pd.Series(origem).map(self.TICKET_ORIGEM).to_numpy()
+            valor_bruto = np.round(ticket * self.rng.lognormal(0, 0.35, n), 2)
+
+            # Particular não tem convênio nem glosa
+            particular = origem == 'Particular'
+            idx_convenio = self.rng.integers(0, len(self.convenios), n)
+            convenio_id = np.where(particular, None, self.convenios['id'].to_numpy()[idx_convenio])
+            prob_glosa = np.where(particular, 0.0, self.convenios['_prob_glosa'].to_numpy()[idx_convenio])
+
+            tem_glosa = self.rng.random(n) < prob_glosa
+            glosa_total = tem_glosa & (self.rng.random(n) < 0.06)
+            fracao = np.where(glosa_total, 1.0, np.where(tem_glosa, self.rng.beta(2, 8, n), 0.0))
+            valor_glosa = np.round(valor_bruto * fracao, 2)
+            valor_liquido = np.round(valor_bruto - valor_glosa, 2)
+
+            idade = (hoje - created_at).dt.days.to_numpy()
+            sorteio = self.rng.random(n)
+            status = np.where(idade < 30,
+                              np.where(sorteio < 0.7, 'Pendente', 'Recebido'),
+                              np.where(sorteio < 0.9, 'Recebido', np.where(sorteio < 0.95, 'Atrasado', 'Pendente')))
+            status = np.where(tem_glosa & (status == 'Recebido') & (self.rng.random(n) < 0.5), 'Glosa_Parcial', status)
+            status = np.where(glosa_total, 'Glosa_Total', status)
+
+            data_vencimento = (created_at + pd.Timedelta(days=30)).dt.date
+            recebido = np.isin(status, ['Recebido', 'Glosa_Parcial'])
+            data_recebimento = pd.Series(
+                created_at + pd.to_timedelta(self.rng.integers(20, 45, n), unit='D')
+            ).dt.date.where(recebido, None)
+
+            unidade_id = self.rng.choice(self.unidades['id'].to_numpy(), size=n, p=self.unidades['_peso'].to_numpy())
+            numero_guia = np.where(origem == 'Guia_Tabulada',
+                                   [f"GS{self.semente}-{sequencia + i:09d}" for i in range(n)], None)
+            sequencia += n
+
+            yield pd.DataFrame({
+                'descricao': pd.Series(origem).str.replace('_', ' ') + ' - atendimento',
+                'valor_bruto': valor_bruto,
+                'valor_liquido': valor_liquido,
+                'valor_glosa': valor_glosa,
+                'data_vencimento': data_vencimento,
+                'data_recebimento': data_recebimento,
+                'origem': origem,
+                'convenio_id': convenio_id,
+                'status': status,
+                'numero_guia': numero_guia,
+                'unidade_id': unidade_id,
+                'created_at': created_at,
+                'updated_at': created_at + pd.to_timedelta(self.rng.integers(0, 40, n), unit='D'),
+            })
+
+    def gerar_contas_pagar(self) -> Iterator[pd.DataFrame]:
+        hoje = pd.Timestamp(self.data_referencia)
+
+        for n in self._lotes(self.total_pagar):
+            created_at = self._datas_criacao(n)
+            categoria = self.rng.choice(self.CATEGORIAS_DESPESA, size=n, p=self.PESOS_CATEGORIA)
+            ticket = pd.Series(categoria).map(self.TICKET_CATEGORIA).to_numpy()
+            valor = np.round(ticket * self.rng.lognormal(0, 0.4, n), 2)
+            fornecedor = np.array([self.FORNECEDORES[c][i % len(self.FORNECEDORES[c])]
+                                   for c, i in zip(categoria, self.rng.integers(0, 12, n))])
+
+            vencimento = created_at + pd.to_timedelta(self.rng.integers(0, 31, n), unit='D')
+            vencida = (vencimento < hoje).to_numpy()
+            sorteio = self.rng.random(n)
+            status = np.where(vencida,
+                              np.where(sorteio < 0.92, 'Pago', np.where(sorteio < 0.97, 'Atrasado', 'Cancelado')),
+                              'Pendente')
+            data_pagamento = (vencimento - pd.to_timedelta(self.rng.integers(0, 5, n), unit='D')).dt.date.where(
+                status == 'Pago', None)
+
+            yield pd.DataFrame({
+                'descricao': pd.Series(categoria) + ' - ' + fornecedor,
+                'fornecedor': fornecedor,
+                'valor': valor,
+                'data_vencimento': vencimento.dt.date,
+                'data_pagamento': data_pagamento,
+                'categoria': categoria,
+                'status': status,
+                'unidade_id': self.rng.choice(self.unidades['id'].to_numpy(), size=n,
+                                              p=self.unidades['_peso'].to_numpy()),
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+
+    def _folha_base(self, por_unidade_mes: float) -> pd.DataFrame:
+        """Uma linha por colaborador/profissional em cada unidade e mês"""
+        meses = self.meses['inicio']
+        quantidade = np.maximum(1, np.round(self.unidades['_peso'].to_numpy() * self.total_unidades
+                                            * por_unidade_mes * min(self.fator_escala, 10) ** 0.5)).astype(int)
+        unidade_id = np.repeat(self.unidades['id'].to_numpy(), quantidade)
+        base = pd.DataFrame({'unidade_id': np.tile(unidade_id, len(meses)),
+                             'mes_referencia': np.repeat(meses.to_numpy(), len(unidade_id))})
+        ultimo_mes = meses.iloc[-1]
+        base['status'] = np.where(base['mes_referencia'] < ultimo_mes, 'Pago', 'Pendente')
+        base['data_pagamento'] = (base['mes_referencia'] + pd.offsets.MonthBegin(1)
+                                  + pd.Timedelta(days=4)).dt.date.where(base['status'] == 'Pago', None)
+        base['mes_referencia'] = base['mes_referencia'].dt.date
+        return base
+
+    def gerar_folha_clt(self) -> Iterator[pd.DataFrame]:
+        df = self._folha_base(por_unidade_mes=8)
+        n = len(df)
+        salario = np.round(self.rng.lognormal(np.log(3200), 0.35, n), 2)
+        horas_extras = np.round(np.where(self.rng.random(n) < 0.3, salario * self.rng.uniform(0.02, 0.12, n), 0), 2)
+        inss = np.round(np.minimum(salario * 0.11, 908.85), 2)
+        irrf = np.round(np.maximum(0, (salario - 2259.20) * 0.075), 2)
+        df = df.assign(
+            salario_base=salario,
+            horas_extras=horas_extras,
+            adicional_noturno=0.0,
+            vale_transporte=np.round(salario * 0.06, 2),
+            vale_refeicao=660.0,
+            plano_saude=np.where(self.rng.random(n) < 0.7, 420.0, 0.0),
+            inss=inss,
+            irrf=irrf,
+            fgts=np.round((salario + horas_extras) * 0.08, 2),
+            salario_liquido=np.round(salario + horas_extras - inss - irrf, 2),
+            encargos_patronais=np.round((salario + horas_extras) * 0.34, 2)
+        )
+        yield df[self.COLUNAS['folha_clt']]
+
+    def gerar_folha_pj(self) -> Iterator[pd.DataFrame]:
+        df = self._folha_base(por_unidade_mes=12)
+        n = len(df)
+        df = df.assign(
+            valor_bruto=np.round(self.rng.lognormal(np.log(7000), 0.45, n), 2),
+            percentual_repasse=self.rng.choice([70.0, 75.0, 80.0], size=n, p=[0.2, 0.3, 0.5]),
+            descontos=np.round(np.where(self.rng.random(n) < 0.2, self.rng.uniform(50, 400, n), 0), 2)
+        )
+        yield df[self.COLUNAS['folha_pj']]
+
+    def gerar_atendimentos_guias_tabuladas(self) -> Iterator[pd.DataFrame]:
+        sequencia = 0
+        for n in self._lotes(self.total_guias):
+            data_atendimento = self._datas_criacao(n)
+            idx_convenio = self.rng.integers(0, len(self.convenios), n)
+            idx_proc = self.rng.integers(0, len(self.PROCEDIMENTOS), n)
+            valor_guia = np.round(self.rng.lognormal(np.log(160), 0.3, n), 2)
+
+            tem_glosa = self.rng.random(n) < self.convenios['_prob_glosa'].to_numpy()[idx_convenio]
+            valor_glosa = np.round(np.where(tem_glosa, valor_guia * self.rng.beta(2, 8, n), 0.0), 2)
+
+            sorteio = self.rng.random(n)
+            status = np.where(sorteio < 0.88, 'Realizado',
+                              np.where(sorteio < 0.95, 'Em_Processamento', 'Cancelado'))
+            realizado = status == 'Realizado'
+
+            yield pd.DataFrame({
+                'unidade_id': self.rng.choice(self.unidades['id'].to_numpy(), size=n,
+                                              p=self.unidades['_peso'].to_numpy()),
+                'numero_guia': [f"AT{self.semente}-{sequencia + i:010d}" for i in range(n)],
+                'paciente_nome': [f"Paciente {i:07d}" for i in self.rng.integers(0, max(1000, n // 4), n)],
+                'convenio': self.convenios['nome'].to_numpy()[idx_convenio],
+                'procedimento': [self.PROCEDIMENTOS[i][1] for i in idx_proc],
+                'codigo_procedimento': [self.PROCEDIMENTOS[i][0] for i in idx_proc],
+                'valor_guia': valor_guia,
+                'valor_pago': np.where(realizado, np.round(valor_guia - valor_glosa, 2), None),
+                'valor_glosa': valor_glosa,
+                'data_atendimento': data_atendimento.dt.date,
+                'status': status,
+            })
+            sequencia += n
+
+    def gerar(self, tabela: str) -> Iterator[pd.DataFrame]:
+        """Lotes da tabela pedida, apenas com as colunas que vão para o COPY"""
+        if tabela == 'unidades':
+            yield self.unidades[self.COLUNAS['unidades']]
+        elif tabela == 'convenios':
+            yield self.convenios[self.COLUNAS['convenios']]
+        else:
+            yield from getattr(self, f"gerar_{tabela}")()
+
+    # ------------------------------------------------------------------
+    # Carga via COPY
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def copiar_dataframe(cursor, tabela: str, df: pd.DataFrame, colunas: List[str]):
+        """Envia um DataFrame com COPY ... FROM STDIN (CSV; campo vazio = NULL)"""
+        buffer = io.StringIO()
+        df.to_csv(buffer, columns=colunas, header=False, index=False, na_rep='')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+    def _copiar_dimensao(self, cursor, tabela: str, df: pd.DataFrame):
+        """Dimensões têm ids determinísticos: recarregar a mesma semente não duplica"""
+        colunas = self.COLUNAS[tabela]
+        temporaria = f"_sintetico_{tabela}"
+        cursor.execute(f"CREATE TEMP TABLE {temporaria} (LIKE {tabela} INCLUDING DEFAULTS) ON COMMIT DROP")
+        self.copiar_dataframe(cursor, temporaria, df, colunas)
+        cursor.execute(f"""
+            INSERT INTO {tabela} ({', '.join(colunas)})
+            SELECT {', '.join(colunas)} FROM {temporaria}
+            ON CONFLICT (id) DO NOTHING
+        """)
+
+    def carregar(self, conn, limpar_fatos: bool = False) -> Dict:
+        """Carrega todas as tabelas em uma transação e devolve linhas/tempo por tabela
+
+        Com `limpar_fatos`, as tabelas de fatos são truncadas antes (destrutivo).
+        """
+        resultado = {}
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SET LOCAL synchronous_commit = off")
+
+            if limpar_fatos:
+                cursor.execute(f"TRUNCATE {', '.join(self.TABELAS_FATOS)} CASCADE")
+
+            for tabela in ['unidades', 'convenios'] + self.TABELAS_FATOS:
+                inicio = time.perf_counter()
+                linhas = 0
+                for lote in self.gerar(tabela):
+                    if tabela in ('unidades', 'convenios'):
+                        self._copiar_dimensao(cursor, tabela, lote)
+                    else:
+                        self.copiar_dataframe(cursor, tabela, lote, self.COLUNAS[tabela])
+                    linhas += len(lote)
+                resultado[tabela] = {'linhas': linhas, 'segundos': round(time.perf_counter() - inicio, 2)}
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        return resultado
+
+    def resumo(self) -> Dict:
+        """Parâmetros da geração (para relatórios e benchmarks)"""
+        return {
+            'fator_escala': self.fator_escala,
+            'semente': self.semente,
+            'meses_historico': self.meses_historico,
+            'data_referencia': self.data_referencia.isoformat(),
+            'unidades': self.total_unidades,
+            'convenios': len(self.convenios),
+            'contas_receber': self.total_receber,
+            'contas_pagar': self.total_pagar,
+            'atendimentos_guias_tabuladas': self.total_guias,
+            'gerado_em': datetime.now().isoformat()
+        }
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Gráficos do Relatório Financeiro - Módulo Financeiro
+FoncareSystem
+
+Gera, a partir das seções de um relatório já calculado, os gráficos de
+receitas por origem, evolução das glosas e projeção do fluxo de caixa.
+
+matplotlib e seaborn só são importados dentro dos processos que desenham
+(backend Agg, sem display): execuções sem gráficos não pagam o custo dessas
+importações, e cada gráfico é renderizado em paralelo em seu próprio processo.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def _preparar_matplotlib():
+    """Importa pyplot com backend Agg e aplica o estilo dos relatórios"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.style.use('seaborn-v0_8')
+    sns.set_palette("husl")
+    return plt
+
+
+def _rotulo_mes(mes) -> str:
+    """Rótulo AAAA-MM para chaves de mês (Timestamp, datetime ou texto)"""
+    if hasattr(mes, 'strftime'):
+        return mes.strftime('%Y-%m')
+    return str(mes)[:7]
+
+
+def _grafico_receitas_origem(plt, dados: Dict):
+    """Barras horizontais da receita líquida por origem, com a quantidade de guias"""
+    valores = dados.get('valor_liquido_total', {})
+    guias = dados.get('quantidade_guias', {})
+    origens = sorted(valores, key=valores.get)
+
+    figura, eixo = plt.subplots(figsize=(10, max(3, 0.6 * len(origens) + 1.5)))
+    barras = eixo.barh(origens, [valores[origem] for origem in origens])
+    for barra, origem in zip(barras, origens):
+        eixo.annotate(f" {int(guias.get(origem, 0))} guias", (barra.get_width(), barra.get_y() + barra.get_height() / 2),
+                      va='center', fontsize=8)
+    eixo.set_title("Receita líquida por origem")
+    eixo.set_xlabel("R$")
+    return figura
+
+
+def _grafico_evolucao_glosas(plt, dados: Dict):
+    """Valor provisionado e glosado por mês, com o percentual glosado no eixo secundário"""
+    provisionado = dados.get('valor_provisionado', {})
+    glosa = dados.get('valor_glosa', {})
+    meses = sorted(provisionado)
+    rotulos = [_rotulo_mes(mes) for mes in meses]
+    percentual = [glosa.get(mes, 0) / provisionado[mes] * 100 if provisionado[mes] else 0 for mes in meses]
+
+    figura, eixo = plt.subplots(figsize=(11, 5))
+    eixo.bar(rotulos, [provisionado[mes] for mes in meses], label="Provisionado", alpha=0.5)
+    eixo.bar(rotulos, [glosa.get(mes, 0) for mes in meses], label="Glosado")
+    eixo.set_ylabel("R$")
+    eixo.tick_params(axis='x', rotation=45)
+
+    eixo_percentual = eixo.twinx()
+    eixo_percentual.plot(rotulos, percentual, color='black', marker='o', label="% glosado")
+    eixo_percentual.set_ylabel("% glosado")
+    eixo_percentual.grid(False)
+
+    eixo.set_title("Evolução mensal das glosas")
+    linhas, nomes = eixo.get_legend_handles_labels()
+    linhas_percentual, nomes_percentual = eixo_percentual.get_legend_handles_labels()
+    eixo.legend(linhas + linhas_percentual, nomes + nomes_percentual, loc='upper left')
+    return figura
+
+
+def _grafico_projecao(plt, dados: List[Dict]):
+    """Receita e despesa projetadas por mês com as bandas de confiança"""
+    meses = [projecao['mes'] for projecao in dados]
+
+    figura, eixo = plt.subplots(figsize=(10, 5))
+    for chave, nome in (('receita', "Receita"), ('despesa', "Despesa")):
+        eixo.plot(meses, [projecao[f"{chave}_projetada"] for projecao in dados], marker='o', label=nome)
+        intervalos = [projecao.get(f"{chave}_intervalo") for projecao in dados]
+        if all(intervalos):
+            eixo.fill_between(meses, [i[0] for i in intervalos], [i[1] for i in intervalos], alpha=0.2)
+    eixo.bar(meses, [projecao['resultado_projetado'] for projecao in dados], alpha=0.3,
+             color='gray', label="Resultado")
+    eixo.axhline(0, color='black', linewidth=0.8)
+    eixo.set_title("Projeção do fluxo de caixa")
+    eixo.set_ylabel("R$")
+    eixo.legend(loc='upper left')
+    return figura
+
+
+# Gráfico -> (seção do relatório, chave dentro da seção, função de desenho)
+GRAFICOS = {
+    'receitas_por_origem': ('receitas_por_origem', 'receitas_por_origem', _grafico_receitas_origem),
+    'evolucao_glosas': ('analise_glosas', 'evolucao_mensal', _grafico_evolucao_glosas),
+    'projecao_fluxo_caixa': ('projecao_fluxo_caixa', 'projecoes', _grafico_projecao),
+}
+
+
+def renderizar_grafico(nome: str, dados, caminho: str, dpi: int = 120) -> str:
+    """Desenha um gráfico e grava em `caminho` (executado no processo de renderização)"""
+    plt = _preparar_matplotlib()
+    figura = GRAFICOS[nome][2](plt, dados)
+    try:
+        figura.tight_layout()
+        figura.savefig(caminho, dpi=dpi)
+    finally:
+        plt.close(figura)
+    return caminho
+
+
+def exportar_graficos(relatorio: Dict, diretorio: str = "graficos", max_workers: Optional[int] = None,
+                      formato: str = "png") -> Dict:
+    """Renderiza em paralelo os gráficos das seções disponíveis do relatório
+
+    Seções com erro ou sem dados são puladas. Os processos são criados com
+    'spawn' para não herdar as conexões abertas do pool.
+
+    Returns:
+        caminho de cada gráfico gerado (ou o erro) e o tempo total
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    sufixo = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    tarefas = {}
+    for nome, (secao, chave, _) in GRAFICOS.items():
+        dados = relatorio.get(secao) or {}
+        if "erro" in dados or not dados.get(chave):
+            continue
+        tarefas[nome] = (dados[chave], os.path.join(diretorio, f"{nome}_{sufixo}.{formato}"))
+
+    if not tarefas:
+        return {"erro": "Nenhuma seção com dados para gráficos"}
+
+    inicio = time.perf_counter()
+    resultado = {}
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(max_workers or len(tarefas), len(tarefas)),
+                             mp_context=contexto) as executor:
+        futuros = {nome: executor.submit(renderizar_grafico, nome, dados, caminho)
+                   for nome, (dados, caminho) in tarefas.items()}
+        for nome, futuro in futuros.items():
+            try:
+                resultado[nome] = futuro.result()
+            except Exception as e:
+                resultado[nome] = {"erro": str(e)}
+
+    return {
+        "arquivos": resultado,
+        "segundos": round(time.perf_counter() - inicio, 2)
+    }
@@ -12,30 +12,39 @@ Este script configura automaticamente:
 
 import os
 import sys
-import psycopg2
+import argparse
 from datetime import datetime, timedelta
 import json
 
+from pool_conexoes import configuracao_banco, obter_pool, fechar_pools
+from gerador_dados_sinteticos import GeradorDadosSinteticos
+
 class FinanceiroInitializer:
     def __init__(self):
-        self.db_config = {
-            'host': os.getenv('SUPABASE_DB_HOST', 'localhost'),
-            'database': os.getenv('SUPABASE_DB_NAME', 'postgres'),
-            'user': os.getenv('SUPABASE_DB_USER', 'postgres'),
-            'password': os.getenv('SUPABASE_DB_PASSWORD', ''),
-            'port': os.getenv('SUPABASE_DB_PORT', '5432')
-        }
+        self.db_config = configuracao_banco()
+        self.carga_sintetica = None
         
     def conectar(self):
-        """Testa conexão com o banco"""
+        """Obtém uma conexão do pool compartilhado"""
         try:
-            conn = psycopg2.connect(**self.db_config)
-            print("✅ Conexão com banco de dados estabelecida")
-            return conn
+            return obter_pool(self.db_config).obter()
         except Exception as e:
             print(f"❌ Erro na conexão: {e}")
             return None
     
+    def liberar(self, conn):
+        """Devolve a conexão ao pool"""
+        obter_pool(self.db_config).devolver(conn, descartar=bool(conn.closed))
+    
+    def testar_conexao(self):
+        """Testa conexão com o banco"""
+        conn = self.conectar()
+        if not conn:
+            return False
+        print("✅ Conexão com banco de dados estabelecida")
+        self.liberar(conn)
+        return True
+    
     def executar_sql_file(self, arquivo_sql):
         """Executa arquivo SQL"""
         conn = self.conectar()
@@ -50,7 +59,7 @@ class FinanceiroInitializer:
             cursor.execute(sql_commands)
             conn.commit()
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             
             print(f"✅ Arquivo SQL executado: {arquivo_sql}")
             return True
@@ -58,7 +67,7 @@ class FinanceiroInitializer:
         except Exception as e:
             print(f"❌ Erro ao executar SQL: {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
     def verificar_tabelas(self):
@@ -94,13 +103,13 @@ class FinanceiroInitializer:
                     return False
             
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             return True
             
         except Exception as e:
             print(f"❌ Erro ao verificar tabelas: {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
     def inserir_dados_exemplo(self):
@@ -119,7 +128,7 @@ class FinanceiroInitializer:
             if count_pagar > 0:
                 print("ℹ️ Dados de exemplo já existem")
                 cursor.close()
-                conn.close()
+                self.liberar(conn)
                 return True
             
             # Obter ID da primeira unidade
@@ -224,7 +233,7 @@ class FinanceiroInitializer:
             
             conn.commit()
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             
             print("✅ Dados de exemplo inseridos com sucesso")
             return True
@@ -233,7 +242,34 @@ class FinanceiroInitializer:
             print(f"❌ Erro ao inserir dados de exemplo: {e}")
             if conn:
                 conn.rollback()
-                conn.close()
+                self.liberar(conn)
+            return False
+    
+    def carregar_dados_sinteticos(self, fator_escala: float = 1.0, semente: int = 42,
+                                  limpar_fatos: bool = False):
+        """Gera dados sintéticos na escala pedida e carrega via COPY FROM STDIN"""
+        conn = self.conectar()
+        if not conn:
+            return False
+        
+        gerador = GeradorDadosSinteticos(fator_escala=fator_escala, semente=semente)
+        print(f"ℹ️ Escala {fator_escala}: ~{gerador.total_receber:,} contas a receber, "
+              f"{gerador.total_unidades} unidades (semente {semente})")
+        
+        try:
+            resultado = gerador.carregar(conn, limpar_fatos=limpar_fatos)
+            self.liberar(conn)
+            
+            for tabela, info in resultado.items():
+                print(f"✅ {tabela}: {info['linhas']:,} linhas em {info['segundos']}s")
+            
+            self.carga_sintetica = {"parametros": gerador.resumo(), "tabelas": resultado}
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erro ao carregar dados sintéticos: {e}")
+            if conn:
+                self.liberar(conn)
             return False
     
     def verificar_views(self):
@@ -266,13 +302,13 @@ class FinanceiroInitializer:
                     print(f"❌ View {view} não encontrada")
             
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             return True
             
         except Exception as e:
             print(f"❌ Erro ao verificar views: {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
     def testar_funcionalidades(self):
@@ -303,13 +339,13 @@ class FinanceiroInitializer:
                 print(f"⚠️ Função de encargos retornou valor inesperado: {encargos}")
             
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             return True
             
         except Exception as e:
             print(f"❌ Erro ao testar funcionalidades: {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
     def gerar_relatorio_inicializacao(self):
@@ -322,9 +358,13 @@ class FinanceiroInitializer:
                 "banco_dados": self.db_config['host'],
                 "usuario": self.db_config['user'],
                 "porta": self.db_config['port']
-            }
+            },
+            "pool_conexoes": obter_pool(self.db_config).resumo()
         }
         
+        if self.carga_sintetica:
+            relatorio["carga_sintetica"] = self.carga_sintetica
+        
         with open('financeiro_init_report.json', 'w', encoding='utf-8') as f:
             json.dump(relatorio, f, indent=2, ensure_ascii=False)
         
@@ -332,6 +372,16 @@ class FinanceiroInitializer:
 
 def main():
     """Função principal de inicialização"""
+    parser = argparse.ArgumentParser(description="Inicialização do Módulo Financeiro do FoncareSystem")
+    parser.add_argument("--escala", type=float, default=None,
+                        help="carrega dados sintéticos nesta escala (1 = ~10 mil contas a receber) "
+                             "em vez dos dados de exemplo")
+    parser.add_argument("--semente", type=int, default=42,
+                        help="semente do gerador sintético (reprodutibilidade)")
+    parser.add_argument("--limpar-fatos", action="store_true",
+                        help="TRUNCATE das tabelas financeiras antes da carga sintética (destrutivo)")
+    args = parser.parse_args()
+    
     print("🏥 FoncareSystem - Inicialização do Módulo Financeiro")
     print("=" * 55)
     
@@ -339,7 +389,7 @@ def main():
     
     # 1. Testar conexão
     print("\n1️⃣ Testando conexão com banco de dados...")
-    if not initializer.conectar():
+    if not initializer.testar_conexao():
         print("❌ Falha na conexão. Verifique as configurações.")
         return 1
     
@@ -354,6 +404,11 @@ def main():
     else:
         print(f"⚠️ Arquivo {sql_file} não encontrado. Pulando...")
     
+    # Rollup mensal de contas a receber (opcional, mantido por scripts/rollup_receber.py)
+    rollup_file = 'rollup_receber_mensal.sql'
+    if os.path.exists(rollup_file) and not initializer.executar_sql_file(rollup_file):
+        print("⚠️ Rollup mensal não instalado; as análises continuam lendo contas_receber.")
+    
     # 3. Verificar tabelas
     print("\n3️⃣ Verificando tabelas criadas...")
     if not initializer.verificar_tabelas():
@@ -363,9 +418,13 @@ def main():
     print("\n4️⃣ Verificando views...")
     initializer.verificar_views()
     
-    # 5. Inserir dados de exemplo
-    print("\n5️⃣ Inserindo dados de exemplo...")
-    initializer.inserir_dados_exemplo()
+    # 5. Inserir dados de exemplo (ou carga sintética em escala)
+    if args.escala:
+        print("\n5️⃣ Carregando dados sintéticos...")
+        initializer.carregar_dados_sinteticos(args.escala, args.semente, args.limpar_fatos)
+    else:
+        print("\n5️⃣ Inserindo dados de exemplo...")
+        initializer.inserir_dados_exemplo()
     
     # 6. Testar funcionalidades
     print("\n6️⃣ Testando funcionalidades...")
@@ -374,6 +433,7 @@ def main():
     # 7. Gerar relatório
     print("\n7️⃣ Gerando relatório de inicialização...")
     initializer.gerar_relatorio_inicializacao()
+    fechar_pools()
     
     print("\n🎉 Inicialização do Módulo Financeiro concluída!")
     print("\nPróximos passos:")
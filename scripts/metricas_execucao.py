@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Métricas de Execução - Módulo Financeiro
+FoncareSystem
+
+Mostra para onde vai o tempo de uma execução, por etapa (métodos dos
+relatórios e verificações) e por consulta:
+
+    conexao_s     - checkout da conexão no pool (inclui abrir uma nova)
+    banco_s       - cursor.execute: execução no servidor e recebimento do resultado
+    conversao_s   - fetch*: conversão das linhas recebidas em tuplas Python
+    pandas_s      - montagem do DataFrame (read_sql_query menos banco e conversão)
+    serializacao  - codificação e gravação do relatório
+
+Registra também linhas lidas, bytes dos DataFrames resultantes e o RSS do
+processo. Os tempos de banco vêm de CursorInstrumentado, instalado como
+cursor_factory na configuração do pool, e são contados por thread: cada
+etapa soma o que a sua própria thread fez entre o início e o fim (tempos
+inclusivos; etapas aninhadas também aparecem separadamente). O RSS é do
+processo inteiro, inclusive das outras threads.
+
+O perfil cProfile opcional cobre apenas a thread principal.
+"""
+
+import os
+import sys
+import time
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import psycopg2.extensions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Contadores acumulados pela thread atual (cursor e leituras de DataFrame)
+_por_thread = threading.local()
+_CAMPOS = ('consultas', 'banco_s', 'conversao_s', 'linhas', 'bytes')
+
+
+def _contadores() -> Dict:
+    contadores = getattr(_por_thread, 'contadores', None)
+    if contadores is None:
+        contadores = _por_thread.contadores = dict.fromkeys(_CAMPOS, 0)
+    return contadores
+
+
+class CursorInstrumentado(psycopg2.extensions.cursor):
+    """Cursor que acumula, na thread atual, tempo de banco, tempo de conversão e linhas lidas"""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            contadores = _contadores()
+            contadores['banco_s'] += time.perf_counter() - inicio
+            contadores['consultas'] += 1
+
+    def _medir_fetch(self, funcao, *args):
+        inicio = time.perf_counter()
+        linhas = funcao(*args)
+        contadores = _contadores()
+        contadores['conversao_s'] += time.perf_counter() - inicio
+        if linhas is not None:
+            contadores['linhas'] += len(linhas) if isinstance(linhas, list) else 1
+        return linhas
+
+    def fetchone(self):
+        return self._medir_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._medir_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._medir_fetch(super().fetchall)
+
+
+def instrumentar_config(db_config: Dict) -> Dict:
+    """Instala CursorInstrumentado na configuração do pool (sem sobrepor um cursor_factory próprio)"""
+    db_config.setdefault('cursor_factory', CursorInstrumentado)
+    return db_config
+
+
+def rss_mb() -> Optional[float]:
+    """RSS atual do processo em MB (None fora do Linux)"""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            paginas = int(arquivo.read().split()[1])
+        return round(paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def pico_rss_mb() -> Optional[float]:
+    """Pico de RSS do processo em MB (None se indisponível)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class MedicaoConsulta:
+    """Medição de uma leitura de DataFrame, preenchida por quem executa a consulta"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.conexao_s = 0.0
+        self.leitura_s = None
+        self.pandas_s = 0.0
+        self.linhas = 0
+        self.bytes = 0
+        self.concluida = False
+
+    def conectada(self):
+        """Marca o fim do checkout da conexão"""
+        self.conexao_s = time.perf_counter() - self.inicio
+
+    def ler(self, funcao: Callable):
+        """Executa a leitura (read_sql_query) medindo seu tempo; sem chamada, o resultado veio do cache"""
+        antes = dict(_contadores())
+        inicio = time.perf_counter()
+        try:
+            return funcao()
+        finally:
+            segundos = time.perf_counter() - inicio
+            depois = _contadores()
+            self.leitura_s = (self.leitura_s or 0.0) + segundos
+            # O que não foi execute/fetch do cursor é a montagem do DataFrame
+            self.pandas_s += max(0.0, segundos - (depois['banco_s'] - antes['banco_s'])
+                                 - (depois['conversao_s'] - antes['conversao_s']))
+
+    def resultado(self, df):
+        """Registra linhas e bytes do DataFrame devolvido"""
+        self.linhas = len(df)
+        self.bytes = int(df.memory_usage(deep=True).sum())
+        self.concluida = True
+        return df
+
+
+class MetricasExecucao:
+    """Acumula as métricas de etapas e consultas de uma execução (thread-safe)"""
+
+    MAIS_LENTAS = 10
+    TAMANHO_ROTULO = 120
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.rss_inicial_mb = rss_mb()
+        self.etapas = {}
+        self.consultas = {}
+        self._lock = threading.Lock()
+
+    def iniciar_etapa(self, nome: str) -> tuple:
+        """Início de uma etapa que não cabe em um bloco `with` (encerrar com encerrar_etapa)"""
+        return nome, time.perf_counter(), dict(_contadores()), rss_mb()
+
+    def encerrar_etapa(self, marca: tuple):
+        nome, inicio, antes, rss_antes = marca
+        segundos = time.perf_counter() - inicio
+        depois = _contadores()
+        rss_depois, pico = rss_mb(), pico_rss_mb()
+        with self._lock:
+            etapa = self.etapas.get(nome)
+            if etapa is None:
+                etapa = self.etapas[nome] = {'chamadas': 0, 'segundos': 0.0, **dict.fromkeys(_CAMPOS, 0),
+                                             'variacao_rss_mb': 0.0, 'pico_rss_mb': None}
+            etapa['chamadas'] += 1
+            etapa['segundos'] += segundos
+            for campo in _CAMPOS:
+                etapa[campo] += depois[campo] - antes[campo]
+            if rss_antes is not None and rss_depois is not None:
+                etapa['variacao_rss_mb'] += rss_depois - rss_antes
+            if pico is not None:
+                etapa['pico_rss_mb'] = max(etapa['pico_rss_mb'] or 0.0, pico)
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Mede o bloco como a etapa `nome` (chamadas repetidas se acumulam)"""
+        marca = self.iniciar_etapa(nome)
+        try:
+            yield
+        finally:
+            self.encerrar_etapa(marca)
+
+    @contextmanager
+    def consulta(self, query: str):
+        """Mede uma consulta lida como DataFrame; o bloco usa a MedicaoConsulta devolvida"""
+        antes = dict(_contadores())
+        medicao = MedicaoConsulta()
+        try:
+            yield medicao
+        finally:
+            total = time.perf_counter() - medicao.inicio
+            contadores = _contadores()
+            contadores['bytes'] += medicao.bytes
+            banco = contadores['banco_s'] - antes['banco_s']
+            conversao = contadores['conversao_s'] - antes['conversao_s']
+            chave = " ".join(query.split())
+            with self._lock:
+                registro = self.consultas.get(chave)
+                if registro is None:
+                    registro = self.consultas[chave] = {
+                        'chamadas': 0, 'acertos_cache': 0, 'segundos': 0.0, 'conexao_s': 0.0,
+                        'banco_s': 0.0, 'conversao_s': 0.0, 'pandas_s': 0.0, 'linhas': 0, 'bytes': 0
+                    }
+                registro['chamadas'] += 1
+                registro['acertos_cache'] += medicao.concluida and medicao.leitura_s is None
+                registro['segundos'] += total
+                registro['conexao_s'] += medicao.conexao_s
+                registro['banco_s'] += banco
+                registro['conversao_s'] += conversao
+                registro['pandas_s'] += medicao.pandas_s
+                registro['linhas'] += medicao.linhas
+                registro['bytes'] += medicao.bytes
+
+    @staticmethod
+    def _arredondar(registro: Dict) -> Dict:
+        return {campo: round(valor, 4) if isinstance(valor, float) else valor for campo, valor in registro.items()}
+
+    def resumo(self) -> Dict:
+        """Seção metricas_execucao dos relatórios"""
+        with self._lock:
+            etapas = {nome: self._arredondar(etapa) for nome, etapa in self.etapas.items()}
+            consultas = [(chave, dict(registro)) for chave, registro in self.consultas.items()]
+
+        total = {'consultas_distintas': len(consultas)}
+        for campo in ('chamadas', 'acertos_cache', 'segundos', 'conexao_s', 'banco_s', 'conversao_s',
+                      'pandas_s', 'linhas', 'bytes'):
+            total[campo] = sum(registro[campo] for _, registro in consultas)
+        consultas.sort(key=lambda item: item[1]['segundos'], reverse=True)
+
+        return {
+            'duracao_s': round(time.perf_counter() - self.inicio, 3),
+            'rss_inicial_mb': self.rss_inicial_mb,
+            'rss_final_mb': rss_mb(),
+            'pico_rss_mb': pico_rss_mb(),
+            'etapas': etapas,
+            'consultas': self._arredondar(total),
+            'consultas_mais_lentas': [
+                {'consulta': chave[:self.TAMANHO_ROTULO], **self._arredondar(registro)}
+                for chave, registro in consultas[:self.MAIS_LENTAS]
+            ]
+        }
+
+
+def medir_etapa(nome: str = None):
+    """Decorador de métodos: mede cada chamada como etapa em `self.metricas`, quando houver"""
+    def decorar(metodo):
+        etapa = nome or metodo.__name__.lstrip('_')
+
+        @functools.wraps(metodo)
+        def medido(self, *args, **kwargs):
+            metricas = getattr(self, 'metricas', None)
+            if metricas is None:
+                return metodo(self, *args, **kwargs)
+            with metricas.etapa(etapa):
+                return metodo(self, *args, **kwargs)
+        return medido
+    return decorar
+
+
+@contextmanager
+def perfil_cprofile(caminho: Optional[str]):
+    """Coleta um perfil cProfile da thread principal e grava em `caminho` (formato pstats)
+
+    Sem caminho, não faz nada. Leia com `python -m pstats <arquivo>` ou snakeviz.
+    """
+    if not caminho:
+        yield None
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield perfil
+    finally:
+        perfil.disable()
+        perfil.dump_stats(caminho)
+        print(f"🧪 Perfil cProfile salvo em: {caminho}")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Pool de Conexões Compartilhado - Módulo Financeiro
+FoncareSystem
+
+Mantém sessões abertas com o banco durante toda a execução para que
+AnaliseFinanceira, FinanceiroIntegrityChecker e FinanceiroInitializer
+não paguem o handshake TLS/autenticação a cada consulta.
+
+Configuração por variáveis de ambiente:
+    FINANCEIRO_POOL_MIN  - conexões abertas antecipadamente (padrão 1)
+    FINANCEIRO_POOL_MAX  - limite de conexões simultâneas (padrão 5)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+
+def configuracao_banco() -> Dict:
+    """Monta a configuração de conexão a partir das variáveis de ambiente"""
+    return {
+        'host': os.getenv('SUPABASE_DB_HOST', 'localhost'),
+        'database': os.getenv('SUPABASE_DB_NAME', 'postgres'),
+        'user': os.getenv('SUPABASE_DB_USER', 'postgres'),
+        'password': os.getenv('SUPABASE_DB_PASSWORD', ''),
+        'port': os.getenv('SUPABASE_DB_PORT', '5432')
+    }
+
+
+class PoolEsgotadoError(Exception):
+    """Todas as conexões do pool estão em uso"""
+
+
+class PoolConexoes:
+    """Pool thread-safe de conexões psycopg2 com verificação de vida no checkout"""
+
+    def __init__(self, db_config: Dict, minimo: int = 1, maximo: int = 5,
+                 tempo_espera: float = 30.0):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError(f"Tamanho de pool inválido: minimo={minimo}, maximo={maximo}")
+
+        self.db_config = dict(db_config)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.tempo_espera = tempo_espera
+
+        self._livres = []
+        self._em_uso = set()
+        self._abrindo = 0
+        self._condicao = threading.Condition()
+        self._fechado = False
+
+        self.estatisticas = {
+            'conexoes_abertas': 0,
+            'conexoes_reutilizadas': 0,
+            'conexoes_descartadas': 0,
+            'checkouts': 0
+        }
+
+        for _ in range(minimo):
+            self._livres.append(self._abrir())
+
+    def _abrir(self):
+        """Abre uma nova conexão física"""
+        conn = psycopg2.connect(**self.db_config)
+        self.estatisticas['conexoes_abertas'] += 1
+        return conn
+
+    def _descartar(self, conn):
+        """Fecha uma conexão que não deve voltar ao pool"""
+        self.estatisticas['conexoes_descartadas'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _esta_viva(conn) -> bool:
+        """Verifica se a conexão continua utilizável (pgbouncer pode derrubar sessões ociosas)"""
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reservar(self):
+        """Reserva uma vaga: devolve uma conexão livre ou None para abrir uma nova"""
+        with self._condicao:
+            while True:
+                if self._fechado:
+                    raise PoolEsgotadoError("Pool de conexões já foi fechado")
+                if self._livres:
+                    conn = self._livres.pop()
+                    self._em_uso.add(conn)
+                    return conn
+                if len(self._em_uso) + self._abrindo < self.maximo:
+                    self._abrindo += 1
+                    return None
+                if not self._condicao.wait(timeout=self.tempo_espera):
+                    raise PoolEsgotadoError(
+                        f"Nenhuma conexão livre após {self.tempo_espera:.0f}s (máximo {self.maximo})"
+                    )
+
+    def obter(self):
+        """Retira uma conexão do pool, abrindo uma nova se necessário"""
+        # Handshake e teste de vida acontecem fora do lock para não serializar as threads
+        while True:
+            conn = self._reservar()
+            if conn is None:
+                break
+            if self._esta_viva(conn):
+                with self._condicao:
+                    self.estatisticas['conexoes_reutilizadas'] += 1
+                    self.estatisticas['checkouts'] += 1
+                return conn
+            with self._condicao:
+                self._em_uso.discard(conn)
+                self._descartar(conn)
+                self._condicao.notify()
+
+        try:
+            conn = psycopg2.connect(**self.db_config)
+        except Exception:
+            with self._condicao:
+                self._abrindo -= 1
+                self._condicao.notify()
+            raise
+
+        with self._condicao:
+            self._abrindo -= 1
+            self.estatisticas['conexoes_abertas'] += 1
+            self.estatisticas['checkouts'] += 1
+            self._em_uso.add(conn)
+        return conn
+
+    def devolver(self, conn, descartar: bool = False):
+        """Devolve a conexão ao pool, encerrando qualquer transação pendente"""
+        with self._condicao:
+            self._em_uso.discard(conn)
+
+            if not descartar and not self._fechado and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self._livres.append(conn)
+                except Exception:
+                    self._descartar(conn)
+            else:
+                self._descartar(conn)
+
+            self._condicao.notify()
+
+    @contextmanager
+    def conexao(self):
+        """Context manager que obtém e devolve uma conexão automaticamente"""
+        conn = self.obter()
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            self.devolver(conn, descartar=True)
+            raise
+        except Exception:
+            self.devolver(conn)
+            raise
+        else:
+            self.devolver(conn)
+
+    def ampliar(self, maximo: int):
+        """Garante capacidade para pelo menos `maximo` conexões simultâneas"""
+        with self._condicao:
+            if maximo > self.maximo:
+                self.maximo = maximo
+                self._condicao.notify_all()
+
+    def fechar(self):
+        """Fecha todas as conexões livres e impede novos checkouts"""
+        with self._condicao:
+            self._fechado = True
+            while self._livres:
+                self._livres.pop().close()
+            self._condicao.notify_all()
+
+    def resumo(self) -> Dict:
+        """Resumo do uso do pool para os relatórios"""
+        with self._condicao:
+            return {
+                **self.estatisticas,
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'livres': len(self._livres),
+                'em_uso': len(self._em_uso)
+            }
+
+
+_pools: Dict[tuple, PoolConexoes] = {}
+_pools_lock = threading.Lock()
+
+
+def _chave_config(db_config: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in db_config.items()))
+
+
+def obter_pool(db_config: Optional[Dict] = None, minimo: Optional[int] = None,
+               maximo: Optional[int] = None) -> PoolConexoes:
+    """Retorna o pool compartilhado do processo para a configuração informada"""
+    db_config = db_config or configuracao_banco()
+    chave = _chave_config(db_config)
+
+    with _pools_lock:
+        pool = _pools.get(chave)
+        if pool is None or pool._fechado:
+            pool = PoolConexoes(
+                db_config,
+                minimo=minimo if minimo is not None else int(os.getenv('FINANCEIRO_POOL_MIN', '1')),
+                maximo=maximo if maximo is not None else int(os.getenv('FINANCEIRO_POOL_MAX', '5'))
+            )
+            _pools[chave] = pool
+        return pool
+
+
+def estatisticas_pools() -> Dict:
+    """Estatísticas agregadas de todos os pools do processo"""
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    total = {'conexoes_abertas': 0, 'conexoes_reutilizadas': 0,
+             'conexoes_descartadas': 0, 'checkouts': 0}
+    for pool in pools:
+        for chave in total:
+            total[chave] += pool.estatisticas[chave]
+    return total
+
+
+def fechar_pools():
+    """Fecha todos os pools do processo (chamar ao final da execução)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.fechar()
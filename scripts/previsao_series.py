@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Previsão de Séries Mensais em Lote - Módulo Financeiro
+FoncareSystem
+
+Ajusta, de uma só vez, tendência linear + sazonalidade anual (termos de
+Fourier sobre o mês do calendário) para todas as séries de um DataFrame
+longo (ex.: receita por unidade, despesa por unidade × categoria).
+
+Todas as séries compartilham a mesma matriz de desenho X (mesmos meses), então
+um único np.linalg.lstsq(X, Y) resolve as N séries; prever centenas de séries
+custa praticamente o mesmo que prever uma. As bandas de confiança usam o
+desvio residual de cada série e a alavancagem (X'X)^-1 comum a todas.
+"""
+
+from statistics import NormalDist
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class PrevisorSeries:
+    """Tendência + sazonalidade mensal por mínimos quadrados vetorizados"""
+
+    def __init__(self, harmonicos: int = 2, nivel_confianca: float = 0.95,
+                 minimo_meses_sazonal: int = 24):
+        """
+        Args:
+            harmonicos: pares seno/cosseno da sazonalidade anual
+            nivel_confianca: nível das bandas de previsão (ex.: 0.95)
+            minimo_meses_sazonal: histórico mínimo para ajustar sazonalidade
+                (com menos de dois ciclos ela se confunde com a tendência)
+        """
+        self.harmonicos = harmonicos
+        self.nivel_confianca = nivel_confianca
+        self.minimo_meses_sazonal = minimo_meses_sazonal
+        self.harmonicos_usados = 0
+        self.meses_historico = 0
+
+    def _matriz(self, periodos: pd.PeriodIndex, origem: pd.Period, harmonicos: int) -> np.ndarray:
+        """Intercepto, tendência e termos de Fourier do mês do calendário"""
+        t = np.array([(periodo - origem).n for periodo in periodos], dtype=float)
+        angulo = 2 * np.pi * np.asarray(periodos.month, dtype=float) / 12
+        colunas = [np.ones_like(t), t]
+        for k in range(1, harmonicos + 1):
+            colunas.extend([np.sin(k * angulo), np.cos(k * angulo)])
+        return np.column_stack(colunas)
+
+    @staticmethod
+    def periodos_mensais(serie: pd.Series) -> pd.Series:
+        """Converte datas (com ou sem fuso) em períodos mensais do calendário"""
+        datas = pd.to_datetime(serie)
+        if getattr(datas.dt, 'tz', None) is not None:
+            datas = datas.dt.tz_localize(None)
+        return datas.dt.to_period('M')
+
+    def prever(self, df: pd.DataFrame, chaves: List[str], coluna_mes: str, coluna_valor: str,
+               meses_projecao: int = 6, ultimo_mes: pd.Period = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Ajusta todas as séries e projeta os próximos meses do calendário
+
+        Args:
+            df: formato longo, uma linha por série × mês (meses ausentes valem 0)
+            chaves: colunas que identificam a série
+            coluna_mes: coluna de data (qualquer dia do mês)
+            coluna_valor: valor mensal
+            ultimo_mes: último mês do histórico (padrão: o mais recente com dados);
+                as projeções começam no mês seguinte
+
+        Returns:
+            (projecoes, estatisticas): projeções longas por série × mês com
+            limite_inferior/limite_superior, e média/tendência/desvio de cada série
+        """
+        base = df.assign(_periodo=self.periodos_mensais(df[coluna_mes]),
+                         _valor=df[coluna_valor].astype(float))
+        matriz = base.pivot_table(index=chaves, columns='_periodo', values='_valor',
+                                  aggfunc='sum', fill_value=0.0)
+        periodos = pd.period_range(matriz.columns.min(), ultimo_mes or matriz.columns.max(), freq='M')
+        matriz = matriz.reindex(columns=periodos, fill_value=0.0)
+
+        harmonicos = self.harmonicos if len(periodos) >= self.minimo_meses_sazonal else 0
+        parametros = 2 + 2 * harmonicos
+        if len(periodos) <= parametros:
+            raise ValueError(f"Histórico de {len(periodos)} meses é insuficiente para o modelo")
+        self.harmonicos_usados = harmonicos
+        self.meses_historico = len(periodos)
+
+        origem = periodos[0]
+        X = self._matriz(periodos, origem, harmonicos)
+        Y = matriz.to_numpy().T                                # meses × séries
+        coeficientes = np.linalg.lstsq(X, Y, rcond=None)[0]   # parâmetros × séries
+
+        residuos = Y - X @ coeficientes
+        graus_liberdade = len(periodos) - parametros
+        desvio = np.sqrt((residuos ** 2).sum(axis=0) / graus_liberdade)
+
+        futuros = pd.period_range(periodos[-1] + 1, periodos[-1] + meses_projecao, freq='M')
+        X_futuro = self._matriz(futuros, origem, harmonicos)
+        previsto = X_futuro @ coeficientes                     # meses futuros × séries
+
+        # Variância da previsão: σ² (1 + x0' (X'X)^-1 x0), com (X'X)^-1 comum a todas as séries
+        alavancagem = np.einsum('ij,jk,ik->i', X_futuro, np.linalg.pinv(X.T @ X), X_futuro)
+        z = NormalDist().inv_cdf(0.5 + self.nivel_confianca / 2)
+        margem = z * np.sqrt(1 + alavancagem)[:, None] * desvio[None, :]
+
+        # Valores monetários não ficam negativos
+        indice = matriz.index.to_frame(index=False)
+        projecoes = pd.concat([indice] * len(futuros), ignore_index=True)
+        projecoes['mes'] = np.repeat([str(periodo) for periodo in futuros], len(indice))
+        projecoes['projetado'] = np.clip(previsto, 0, None).ravel()
+        projecoes['limite_inferior'] = np.clip(previsto - margem, 0, None).ravel()
+        projecoes['limite_superior'] = np.clip(previsto + margem, 0, None).ravel()
+
+        estatisticas = indice.assign(
+            media_mensal=Y.mean(axis=0),
+            tendencia_mensal=coeficientes[1],
+            desvio_residual=desvio
+        )
+        return projecoes, estatisticas
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Relatórios Financeiros por Unidade - Módulo Financeiro
+FoncareSystem
+
+Gera um relatório por unidade (receitas, glosas, projeção e resumo
+executivo) a partir de uma única extração: os fatos de contas a receber e os
+históricos de receitas/despesas são lidos do banco (ou do espelho/rollup) uma
+vez só, gravados em arquivos Arrow IPC e mapeados em memória pelos processos
+de trabalho. Cada processo filtra a sua unidade sobre o mesmo buffer, sem
+cópias nem novas consultas, e grava um arquivo por unidade mais um índice.
+
+Uso:
+    python scripts/relatorios_unidades.py --diretorio relatorios/unidades --max-workers 8
+"""
+
+import os
+import re
+import time
+import argparse
+import tempfile
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from pool_conexoes import fechar_pools
+from analise_financeira import AnaliseFinanceira
+from serializacao_relatorio import gravar_json
+
+# Conjuntos extraídos, mapeados uma vez por processo de trabalho
+_CONJUNTO: Dict[str, pa.Table] = {}
+
+SEM_UNIDADE = 'Sem unidade'
+
+
+def _gravar_arrow(df: pd.DataFrame, caminho: str):
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(caminho, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+
+
+def _abrir_conjunto(arquivos: Dict[str, str]):
+    """Inicializador dos processos: mapeia os arquivos Arrow sem copiá-los"""
+    for nome, caminho in arquivos.items():
+        _CONJUNTO[nome] = pa.ipc.open_file(pa.memory_map(caminho, 'r')).read_all()
+
+
+def _filtrar(nome: str, unidade: str) -> pd.DataFrame:
+    """Linhas de uma unidade no conjunto compartilhado"""
+    tabela = _CONJUNTO[nome]
+    if tabela.num_rows and 'unidade' in tabela.column_names:
+        tabela = tabela.filter(pc.equal(tabela['unidade'], unidade))
+    return tabela.to_pandas()
+
+
+def _relatorio_unidade(unidade: str, caminho: str, dashboard: Optional[Dict],
+                       meses: int, meses_projecao: int) -> Dict:
+    """Monta e grava o relatório de uma unidade (executado no processo de trabalho)"""
+    analise = AnaliseFinanceira()
+    fatos = _filtrar('fatos', unidade)
+    receitas = analise._executar_secao("receitas por origem", analise.gerar_relatorio_receitas_origem,
+                                       meses, fatos)
+    glosas = analise._executar_secao("análise de glosas", analise.analise_glosas_detalhada, fatos)
+    projecao = analise._executar_secao("projeção de fluxo de caixa", analise._calcular_projecao,
+                                       _filtrar('historico_receitas', unidade),
+                                       _filtrar('historico_despesas', unidade), meses_projecao)
+    resumo = analise._gerar_resumo_executivo(receitas, glosas, projecao)
+
+    relatorio = {
+        "data_geracao": datetime.now().isoformat(),
+        "versao": "1.0",
+        "unidade": unidade,
+        "receitas_por_origem": receitas,
+        "analise_glosas": glosas,
+        "projecao_fluxo_caixa": projecao,
+        "dashboard_unidade": dashboard or {"erro": "Unidade sem indicadores no mês corrente"},
+        "resumo_executivo": resumo
+    }
+    gravar_json(relatorio, caminho)
+
+    return {
+        "unidade": unidade,
+        "arquivo": os.path.basename(caminho),
+        "receita_liquida_total": receitas.get("total_receita_liquida"),
+        "percentual_glosa_geral": receitas.get("percentual_glosa_geral"),
+        "resultado_projetado_6m": round(sum(p["resultado_projetado"] for p in projecao["projecoes"]), 2)
+                                  if "projecoes" in projecao else None,
+        "alertas": resumo.get("alertas_gestao", []),
+        "secoes_com_erro": [nome for nome, secao in (("receitas_por_origem", receitas),
+                                                    ("analise_glosas", glosas),
+                                                    ("projecao_fluxo_caixa", projecao)) if "erro" in secao]
+    }
+
+
+class RelatoriosPorUnidade:
+    """Extrai os dados uma vez e gera os relatórios das unidades em paralelo"""
+
+    def __init__(self, analise: AnaliseFinanceira, diretorio: str = "relatorios_unidades",
+                 max_workers: Optional[int] = None):
+        """
+        Args:
+            analise: AnaliseFinanceira já configurada (banco, espelho ou rollup)
+            diretorio: onde gravar os relatórios e o índice
+            max_workers: processos de trabalho (padrão: núcleos disponíveis)
+        """
+        self.analise = analise
+        self.diretorio = diretorio
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    @staticmethod
+    def nome_arquivo(unidade: str) -> str:
+        """Nome de arquivo seguro derivado do nome da unidade"""
+        texto = unicodedata.normalize('NFKD', unidade).encode('ascii', 'ignore').decode()
+        return re.sub(r'[^0-9A-Za-z]+', '_', texto).strip('_').lower() or 'unidade'
+
+    def extrair(self, destino: str, meses: int = 12) -> Dict:
+        """Lê os conjuntos usados pelos relatórios e grava cada um em Arrow IPC"""
+        inicio = time.perf_counter()
+        historico = self.analise.MESES_HISTORICO_PROJECAO + 1
+        conjuntos = {
+            'fatos': self.analise.extrair_fatos_receber(meses),
+            'historico_receitas': self.analise._carregar_historico_receitas(historico),
+            'historico_despesas': self.analise._carregar_historico_despesas(historico)
+        }
+        dashboard = self.analise._executar_secao("dashboard por unidade", self.analise.dashboard_unidades)
+
+        arquivos = {}
+        for nome, df in conjuntos.items():
+            arquivos[nome] = os.path.join(destino, f"{nome}.arrow")
+            _gravar_arrow(df, arquivos[nome])
+
+        unidades = set()
+        for df in conjuntos.values():
+            if 'unidade' in df:
+                unidades.update(df['unidade'].dropna().unique())
+        unidades.discard(SEM_UNIDADE)
+
+        return {
+            "arquivos": arquivos,
+            "unidades": sorted(unidades),
+            "dashboard": {linha['unidade_nome']: linha for linha in dashboard.get('unidades', [])},
+            "linhas": {nome: len(df) for nome, df in conjuntos.items()},
+            "bytes": {nome: os.path.getsize(caminho) for nome, caminho in arquivos.items()},
+            "segundos": round(time.perf_counter() - inicio, 2)
+        }
+
+    def gerar(self, meses: int = 12, meses_projecao: int = 6) -> Dict:
+        """Gera um relatório por unidade e o índice; retorna o conteúdo do índice"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        sufixo = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        with tempfile.TemporaryDirectory(prefix="conjunto_unidades_") as destino:
+            extracao = self.extrair(destino, meses)
+
+            nomes_usados = set()
+            tarefas = []
+            for unidade in extracao["unidades"]:
+                nome = base = self.nome_arquivo(unidade)
+                contador = 2
+                while nome in nomes_usados:
+                    nome, contador = f"{base}_{contador}", contador + 1
+                nomes_usados.add(nome)
+                tarefas.append((unidade, os.path.join(self.diretorio, f"relatorio_{nome}_{sufixo}.json")))
+
+            inicio = time.perf_counter()
+            resultados: List[Dict] = []
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=max(1, min(self.max_workers, len(tarefas))),
+                                     mp_context=contexto, initializer=_abrir_conjunto,
+                                     initargs=(extracao["arquivos"],)) as executor:
+                futuros = [(unidade, executor.submit(_relatorio_unidade, unidade, caminho,
+                                                     extracao["dashboard"].get(unidade), meses, meses_projecao))
+                           for unidade, caminho in tarefas]
+                for unidade, futuro in futuros:
+                    try:
+                        resultados.append(futuro.result())
+                    except Exception as e:
+                        print(f"❌ Falha no relatório da unidade {unidade}: {e}")
+                        resultados.append({"unidade": unidade, "erro": str(e)})
+
+        indice = {
+            "data_geracao": datetime.now().isoformat(),
+            "periodo_analise": f"Últimos {meses} meses",
+            "extracao": {
+                "linhas": extracao["linhas"],
+                "bytes_arrow": extracao["bytes"],
+                "segundos": extracao["segundos"]
+            },
+            "geracao": {
+                "processos": max(1, min(self.max_workers, len(tarefas))),
+                "segundos": round(time.perf_counter() - inicio, 2)
+            },
+            "unidades": resultados
+        }
+        if self.analise.espelho is not None:
+            indice["espelho_local"] = self.analise.espelho.diretorio
+        elif self.analise.rollup is not None:
+            indice["rollup_mensal"] = self.analise.atualizacao_rollup
+
+        caminho_indice = os.path.join(self.diretorio, f"indice_unidades_{sufixo}.json")
+        gravar_json(indice, caminho_indice)
+        indice["arquivo_indice"] = caminho_indice
+        return indice
+
+
+def main():
+    """Gera os relatórios de todas as unidades (para execução agendada)"""
+    parser = argparse.ArgumentParser(description="Relatórios financeiros por unidade")
+    parser.add_argument("--diretorio", default="relatorios_unidades",
+                        help="diretório de saída dos relatórios e do índice")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="processos de geração (padrão: núcleos disponíveis)")
+    parser.add_argument("--espelho", nargs="?", const="", default=None, metavar="DIR",
+                        help="sincroniza o espelho Parquet local e extrai a partir dele")
+    parser.add_argument("--rollup", action="store_true",
+                        help="lê contas a receber do rollup mensal (atualiza os meses pendentes antes)")
+    args = parser.parse_args()
+
+    print("🏥 FoncareSystem - Relatórios Financeiros por Unidade")
+    print("=" * 50)
+
+    analise = AnaliseFinanceira()
+    try:
+        if args.espelho is not None:
+            print("🔄 Sincronizando espelho local...")
+            analise.usar_espelho(args.espelho or None)
+        elif args.rollup:
+            print("🔄 Atualizando rollup mensal...")
+            analise.usar_rollup()
+
+        print("🔄 Extraindo dados e gerando relatórios...")
+        indice = RelatoriosPorUnidade(analise, args.diretorio, args.max_workers).gerar()
+
+        falhas = [item for item in indice["unidades"] if "erro" in item]
+        print(f"✅ {len(indice['unidades']) - len(falhas)} relatórios gerados "
+              f"(extração {indice['extracao']['segundos']}s, geração {indice['geracao']['segundos']}s "
+              f"com {indice['geracao']['processos']} processos)")
+        print(f"📑 Índice: {indice['arquivo_indice']}")
+        return 1 if falhas else 0
+    except Exception as e:
+        print(f"❌ Erro ao gerar relatórios por unidade: {e}")
+        return 1
+    finally:
+        fechar_pools()
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Rollup Mensal de Contas a Receber - Módulo Financeiro
+FoncareSystem
+
+Mantém rollup_receber_mensal (ver rollup_receber_mensal.sql) com os agregados
+de contas_receber por mês, unidade, origem e convênio. Cada atualização
+recalcula apenas os meses tocados desde a anterior:
+    - meses com linhas de updated_at posterior à marca d'água (inserções e
+      o mês novo de linhas alteradas);
+    - meses registrados em rollup_receber_pendencias pelos triggers de
+      exclusão/alteração (o mês antigo das linhas).
+
+Uso (agendar, ex.: a cada 15 minutos):
+    python scripts/rollup_receber.py [--instalar] [--completo]
+"""
+
+import os
+import time
+import argparse
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from pool_conexoes import configuracao_banco, obter_pool, fechar_pools
+
+
+ARQUIVO_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rollup_receber_mensal.sql')
+
+# Chave de pg_advisory_xact_lock para serializar atualizações concorrentes
+CHAVE_BLOQUEIO = 'rollup_receber_mensal'
+
+
+class RollupReceberMensal:
+    """Rollup mensal de contas_receber atualizado incrementalmente"""
+
+    # Tabelas gravadas por atualizar() (para invalidar caches de leitura)
+    TABELAS = ('rollup_receber_mensal', 'rollup_receber_controle', 'rollup_receber_pendencias')
+
+    COLUNAS = [
+        'mes', 'unidade_id', 'origem', 'convenio_id',
+        'quantidade_guias', 'guias_com_glosa', 'guias_status_glosa', 'recebidos', 'pendentes',
+        'valor_bruto_total', 'valor_liquido_total', 'valor_glosa_total', 'valor_liquido_recebido',
+        'soma_percentual_glosa', 'qtd_percentual_glosa', 'menor_glosa', 'maior_glosa', 'distribuicao_glosa'
+    ]
+
+    # Parciais por (mês, unidade, origem, convênio, percentual_glosa) sobre contas_receber cr
+    AGREGACAO_LINHAS = """
+        DATE_TRUNC('month', cr.created_at) AS mes,
+        cr.unidade_id,
+        cr.origem,
+        cr.convenio_id,
+        cr.percentual_glosa,
+        COUNT(*) AS quantidade_guias,
+        COUNT(*) FILTER (WHERE cr.valor_glosa > 0) AS guias_com_glosa,
+        COUNT(*) FILTER (WHERE cr.status IN ('Glosa_Total', 'Glosa_Parcial')) AS guias_status_glosa,
+        COUNT(*) FILTER (WHERE cr.status = 'Recebido') AS recebidos,
+        COUNT(*) FILTER (WHERE cr.status = 'Pendente') AS pendentes,
+        SUM(cr.valor_bruto) AS valor_bruto_total,
+        SUM(cr.valor_liquido) AS valor_liquido_total,
+        SUM(cr.valor_glosa) AS valor_glosa_total,
+        SUM(cr.valor_liquido) FILTER (WHERE cr.status = 'Recebido') AS valor_liquido_recebido
+    """
+
+    # Agregados do grão (mês, unidade, origem, convênio) sobre os parciais g. A
+    # distribuição (percentual -> quantidade) permite a mediana exata de grupos somados
+    AGREGACAO = """
+        g.mes,
+        g.unidade_id,
+        g.origem,
+        g.convenio_id,
+        SUM(g.quantidade_guias) AS quantidade_guias,
+        SUM(g.guias_com_glosa) AS guias_com_glosa,
+        SUM(g.guias_status_glosa) AS guias_status_glosa,
+        SUM(g.recebidos) AS recebidos,
+        SUM(g.pendentes) AS pendentes,
+        SUM(g.valor_bruto_total) AS valor_bruto_total,
+        SUM(g.valor_liquido_total) AS valor_liquido_total,
+        SUM(g.valor_glosa_total) AS valor_glosa_total,
+        SUM(g.valor_liquido_recebido) AS valor_liquido_recebido,
+        SUM(g.percentual_glosa * g.quantidade_guias) AS soma_percentual_glosa,
+        COALESCE(SUM(g.quantidade_guias) FILTER (WHERE g.percentual_glosa IS NOT NULL), 0) AS qtd_percentual_glosa,
+        MIN(g.percentual_glosa) AS menor_glosa,
+        MAX(g.percentual_glosa) AS maior_glosa,
+        jsonb_object_agg(g.percentual_glosa::text, g.quantidade_guias)
+            FILTER (WHERE g.percentual_glosa IS NOT NULL) AS distribuicao_glosa
+    """
+
+    # Janela igual à das análises: meses completos vêm do rollup e o mês
+    # parcial do início da janela é agregado direto de contas_receber
+    JANELA = """
+        janela AS (
+            SELECT inicio, DATE_TRUNC('month', inicio) + INTERVAL '1 month' AS primeiro_mes_completo
+            FROM (SELECT (CURRENT_DATE - make_interval(months => %s))::timestamptz AS inicio) l
+        )
+    """
+
+    COLUNAS_VALOR_FATOS = ['valor_bruto_total', 'valor_liquido_total', 'valor_glosa_total',
+                           'menor_glosa', 'maior_glosa', 'media_glosa', 'mediana_glosa']
+
+    @classmethod
+    def _agregar(cls, origem: str) -> str:
+        """SELECT dos agregados do grão sobre as linhas de contas_receber cr de `origem` (FROM ... WHERE ...)"""
+        return f"""
+            SELECT {cls.AGREGACAO}
+            FROM (SELECT {cls.AGREGACAO_LINHAS} {origem} GROUP BY 1, 2, 3, 4, 5) g
+            GROUP BY 1, 2, 3, 4
+        """
+
+    def __init__(self, executar_query: Callable[..., pd.DataFrame], db_config: Optional[Dict] = None,
+                 margem_segura_minutos: int = 5):
+        """
+        Args:
+            executar_query: função que executa SQL e devolve DataFrame, propagando as falhas
+                (ex.: AnaliseFinanceira._ler_query)
+            db_config: configuração do banco para as escritas (padrão: variáveis de ambiente)
+            margem_segura_minutos: sobreposição da marca d'água para transações confirmadas com atraso
+        """
+        self.executar_query = executar_query
+        self.db_config = db_config or configuracao_banco()
+        self.margem_segura = timedelta(minutes=margem_segura_minutos)
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+
+    def instalar(self):
+        """Cria tabelas, triggers e views do rollup (idempotente)"""
+        with open(ARQUIVO_SQL, 'r', encoding='utf-8') as f:
+            ddl = f.read()
+        with obter_pool(self.db_config).conexao() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(ddl)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def atualizar(self, completo: bool = False) -> Dict:
+        """Recalcula os meses tocados desde a última atualização (ou tudo, se `completo`)"""
+        inicio_execucao = time.perf_counter()
+        colunas = ', '.join(self.COLUNAS)
+
+        with obter_pool(self.db_config).conexao() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s)), now()", (CHAVE_BLOQUEIO,))
+                    inicio_transacao = cursor.fetchone()[1]
+
+                    cursor.execute("SELECT marca_dagua FROM rollup_receber_controle WHERE id = 1")
+                    linha = cursor.fetchone()
+                    marca_dagua = linha[0] if linha else None
+
+                    cursor.execute("SELECT mes, registrado_em FROM rollup_receber_pendencias")
+                    pendencias = cursor.fetchall()
+
+                    if completo or marca_dagua is None:
+                        meses = None
+                        cursor.execute("DELETE FROM rollup_receber_mensal")
+                        cursor.execute(f"INSERT INTO rollup_receber_mensal ({colunas}) "
+                                       f"{self._agregar('FROM contas_receber cr')}")
+                        linhas_gravadas = cursor.rowcount
+                    else:
+                        cursor.execute("""
+                            SELECT DISTINCT DATE_TRUNC('month', created_at)
+                            FROM contas_receber
+                            WHERE updated_at > %s
+                        """, (marca_dagua - self.margem_segura,))
+                        meses = sorted({m for (m,) in cursor.fetchall()} | {m for m, _ in pendencias})
+
+                        if meses:
+                            cursor.execute("DELETE FROM rollup_receber_mensal WHERE mes = ANY(%s)", (meses,))
+                            cursor.execute(f"INSERT INTO rollup_receber_mensal ({colunas}) " + self._agregar("""
+                                FROM contas_receber cr
+                                JOIN unnest(%s::timestamptz[]) AS m(mes)
+                                  ON cr.created_at >= m.mes AND cr.created_at < m.mes + INTERVAL '1 month'
+                            """), (meses,))
+                        linhas_gravadas = cursor.rowcount if meses else 0
+
+                    # Remove só as pendências lidas; registros novos dos triggers ficam para a próxima
+                    if pendencias:
+                        cursor.execute("""
+                            DELETE FROM rollup_receber_pendencias p
+                            USING unnest(%s::timestamptz[], %s::timestamptz[]) AS l(mes, registrado_em)
+                            WHERE p.mes = l.mes AND p.registrado_em = l.registrado_em
+                        """, ([m for m, _ in pendencias], [r for _, r in pendencias]))
+
+                    cursor.execute("""
+                        INSERT INTO rollup_receber_controle (id, marca_dagua, ultima_atualizacao)
+                        VALUES (1, %s, clock_timestamp())
+                        ON CONFLICT (id) DO UPDATE
+                        SET marca_dagua = EXCLUDED.marca_dagua,
+                            ultima_atualizacao = EXCLUDED.ultima_atualizacao
+                    """, (inicio_transacao,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return {
+            'modo': 'completo' if meses is None else 'incremental',
+            'meses_recalculados': 'todos' if meses is None else [m.strftime('%Y-%m') for m in meses],
+            'linhas_gravadas': linhas_gravadas,
+            'marca_dagua': inicio_transacao.isoformat(),
+            'segundos': round(time.perf_counter() - inicio_execucao, 3)
+        }
+
+    # ------------------------------------------------------------------
+    # Leitura (mesmas saídas de AnaliseFinanceira)
+    # ------------------------------------------------------------------
+
+    def fatos_receber(self, meses: int = 12) -> pd.DataFrame:
+        """Mesmos fatos de AnaliseFinanceira.extrair_fatos_receber, lidos do rollup
+
+        Um nome de unidade ou convênio pode somar vários ids; a mediana é
+        recalculada das distribuições somadas, como PERCENTILE_CONT(0.5).
+        """
+        mes_parcial = self._agregar("""
+            FROM contas_receber cr, janela j
+            WHERE cr.created_at >= j.inicio AND cr.created_at < j.primeiro_mes_completo
+        """)
+        query = f"""
+        WITH {self.JANELA},
+        base AS (
+            SELECT {', '.join('r.' + coluna for coluna in self.COLUNAS)}
+            FROM rollup_receber_mensal r, janela j
+            WHERE r.mes >= j.primeiro_mes_completo
+
+            UNION ALL
+
+            {mes_parcial}
+        ),
+        grupos AS (
+            SELECT b.*, u.nome as unidade, c.nome as convenio
+            FROM base b
+            JOIN unidades u ON b.unidade_id = u.id
+            LEFT JOIN convenios c ON b.convenio_id = c.id
+        ),
+        distribuicao AS (
+            SELECT g.mes, g.unidade, g.origem, g.convenio, d.key::numeric as valor, SUM(d.value::bigint) as quantidade
+            FROM grupos g, jsonb_each_text(g.distribuicao_glosa) d
+            GROUP BY 1, 2, 3, 4, 5
+        ),
+        acumulada AS (
+            SELECT d.*,
+                   SUM(quantidade) OVER (PARTITION BY mes, unidade, origem, convenio ORDER BY valor) as ate,
+                   SUM(quantidade) OVER (PARTITION BY mes, unidade, origem, convenio)::bigint as total
+            FROM distribuicao d
+        ),
+        medianas AS (
+            -- média dos valores nas posições centrais (iguais quando o total é ímpar)
+            SELECT mes, unidade, origem, convenio,
+                   ((MIN(valor) FILTER (WHERE ate >= (total + 1) / 2)
+                     + MIN(valor) FILTER (WHERE ate >= total / 2 + 1)) / 2)::float as mediana_glosa
+            FROM acumulada
+            GROUP BY 1, 2, 3, 4
+        )
+        SELECT
+            f.*,
+            m.mediana_glosa
+        FROM (
+            SELECT
+                g.mes,
+                g.unidade,
+                g.origem,
+                g.convenio,
+                SUM(g.quantidade_guias)::bigint as quantidade_guias,
+                SUM(g.guias_com_glosa)::bigint as guias_com_glosa,
+                SUM(g.valor_bruto_total) as valor_bruto_total,
+                SUM(g.valor_liquido_total) as valor_liquido_total,
+                SUM(g.valor_glosa_total) as valor_glosa_total,
+                MIN(g.menor_glosa) as menor_glosa,
+                MAX(g.maior_glosa) as maior_glosa,
+                SUM(g.soma_percentual_glosa) / NULLIF(SUM(g.qtd_percentual_glosa), 0) as media_glosa
+            FROM grupos g
+            GROUP BY g.mes, g.unidade, g.origem, g.convenio
+        ) f
+        LEFT JOIN medianas m ON m.mes = f.mes AND m.unidade = f.unidade AND m.origem = f.origem
+                            AND m.convenio IS NOT DISTINCT FROM f.convenio
+        """
+        fatos = self.executar_query(query, (meses,))
+
+        for coluna in self.COLUNAS_VALOR_FATOS:
+            if coluna in fatos:
+                fatos[coluna] = fatos[coluna].astype(float)
+        return fatos
+
+    def historico_receitas(self, meses: int = 12) -> pd.DataFrame:
+        """Receitas recebidas por mês e unidade (mesma saída de _carregar_historico_receitas)"""
+        query = f"""
+        WITH {self.JANELA}
+        SELECT h.mes, COALESCE(u.nome, 'Sem unidade') as unidade, SUM(h.receita) as receita_total
+        FROM (
+            SELECT r.mes, r.unidade_id, r.valor_liquido_recebido as receita, r.recebidos
+            FROM rollup_receber_mensal r, janela j
+            WHERE r.mes >= j.primeiro_mes_completo
+
+            UNION ALL
+
+            SELECT DATE_TRUNC('month', cr.created_at), cr.unidade_id, cr.valor_liquido, 1
+            FROM contas_receber cr, janela j
+            WHERE cr.created_at >= j.inicio AND cr.created_at < j.primeiro_mes_completo
+            AND cr.status = 'Recebido'
+        ) h
+        LEFT JOIN unidades u ON u.id = h.unidade_id
+        GROUP BY h.mes, COALESCE(u.nome, 'Sem unidade')
+        HAVING SUM(h.recebidos) > 0
+        ORDER BY h.mes
+        """
+        return self.executar_query(query, (meses,))
+
+    def estado(self) -> Dict:
+        """Marca d'água, pendências e volume atual do rollup"""
+        df = self.executar_query("""
+            SELECT
+                (SELECT marca_dagua FROM rollup_receber_controle WHERE id = 1) as marca_dagua,
+                (SELECT ultima_atualizacao FROM rollup_receber_controle WHERE id = 1) as ultima_atualizacao,
+                (SELECT COUNT(*) FROM rollup_receber_pendencias) as meses_pendentes,
+                (SELECT COUNT(*) FROM rollup_receber_mensal) as linhas_rollup
+        """)
+        if df.empty:
+            raise RuntimeError("Consulta ao estado do rollup não retornou linha")
+        linha = df.iloc[0]
+        if pd.isna(linha['marca_dagua']) and pd.isna(linha['ultima_atualizacao']):
+            raise RuntimeError("rollup_receber_controle vazio: execute rollup_receber.py para a primeira carga")
+        return {
+            'marca_dagua': linha['marca_dagua'].isoformat() if pd.notna(linha['marca_dagua']) else None,
+            'ultima_atualizacao': (linha['ultima_atualizacao'].isoformat()
+                                   if pd.notna(linha['ultima_atualizacao']) else None),
+            'meses_pendentes': int(linha['meses_pendentes']),
+            'linhas_rollup': int(linha['linhas_rollup'])
+        }
+
+
+def main():
+    """Atualiza o rollup mensal (para execução agendada)"""
+    parser = argparse.ArgumentParser(description="Atualização do rollup mensal de contas a receber")
+    parser.add_argument('--instalar', action='store_true',
+                        help="cria/atualiza tabelas, triggers e views do rollup antes de atualizar")
+    parser.add_argument('--completo', action='store_true',
+                        help="recalcula todos os meses em vez de só os alterados")
+    args = parser.parse_args()
+
+    db_config = configuracao_banco()
+
+    def executar_query(query, params=None):
+        with obter_pool(db_config).conexao() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    rollup = RollupReceberMensal(executar_query, db_config)
+    try:
+        if args.instalar:
+            print("🔧 Instalando estrutura do rollup...")
+            rollup.instalar()
+
+        resultado = rollup.atualizar(completo=args.completo)
+        meses = resultado['meses_recalculados']
+        print(f"✅ Rollup atualizado ({resultado['modo']}) em {resultado['segundos']}s - "
+              f"meses: {meses if isinstance(meses, str) else ', '.join(meses) or 'nenhum'}")
+        return 0
+    except Exception as e:
+        print(f"❌ Erro ao atualizar rollup: {e}")
+        return 1
+    finally:
+        fechar_pools()
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Serialização dos Relatórios - Módulo Financeiro
+FoncareSystem
+
+Converte os resultados das análises (dicts vindos de DataFrame.to_dict e de
+groupby, com chaves Timestamp, escalares NumPy, Decimal e NaN) em estruturas
+nativas de JSON antes de gravar, em vez de depender de `default=str`, que não
+cobre chaves de dicionário e transforma números em texto.
+
+Regras:
+    datas/Timestamp -> ISO 8601        NaN/NaT/inf/pd.NA -> null
+    NumPy -> int/float/bool/list       Decimal -> texto exato ('123.45'),
+    Period -> '2026-05'                            centavos (int) ou float
+
+Gravação em JSON (indentado ou compacto) ou NDJSON, uma seção por linha,
+gravada assim que fica pronta; ambos opcionalmente com gzip ou zstd
+(zstd requer o pacote `zstandard`).
+"""
+
+import io
+import gzip
+import json
+import math
+import uuid
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal, ROUND_HALF_EVEN
+from functools import lru_cache
+from typing import BinaryIO, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # opcional: acelera a codificação
+    orjson = None
+
+COMPRESSOES = {'gzip': '.gz', 'zstd': '.zst'}
+MODOS_DECIMAL = ('texto', 'centavos', 'float')
+
+
+def _decimal(valor: Decimal, decimais: str):
+    if not valor.is_finite():
+        return None
+    if decimais == 'centavos':
+        return int((valor * 100).to_integral_value(ROUND_HALF_EVEN))
+    if decimais == 'float':
+        return float(valor)
+    return str(valor)
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _chave(chave) -> str:
+    """Chave de dicionário em texto, como o json faria (datas viram ISO 8601)
+
+    Os relatórios repetem as mesmas chaves de mês em várias seções; o cache
+    evita refazer Timestamp.isoformat para cada ocorrência. O cache é tipado
+    porque True, 1 e 1.0 são iguais como chaves, mas viram textos diferentes.
+    """
+    if isinstance(chave, str):
+        return chave
+    if isinstance(chave, np.generic):
+        chave = chave.item()
+    if isinstance(chave, (bool, int, float)) or chave is None:
+        return json.dumps(chave)
+    if isinstance(chave, (datetime, date, hora)):
+        return chave.isoformat()
+    if isinstance(chave, tuple):
+        return " | ".join(str(_chave(parte)) for parte in chave)
+    return str(chave)
+
+
+# Tipos já nativos de JSON (checagem por tipo exato: subclasses vão para o caminho geral)
+_NATIVOS = {str, int, bool, type(None)}
+
+
+def para_json(valor, decimais: str = 'texto'):
+    """Converte recursivamente um resultado de análise em tipos nativos de JSON
+
+    Args:
+        valor: dict/list/DataFrame/Series/escalar
+        decimais: 'texto' (exato), 'centavos' (inteiro) ou 'float'
+    """
+    tipo = type(valor)
+    if tipo in _NATIVOS:
+        return valor
+    if tipo is float:
+        return valor if math.isfinite(valor) else None
+    if tipo is dict:
+        return {chave if type(chave) is str else _chave(chave): para_json(item, decimais)
+                for chave, item in valor.items()}
+    if tipo is list or tipo is tuple:
+        return [para_json(item, decimais) for item in valor]
+    return _converter(valor, decimais)
+
+
+def _converter(valor, decimais: str):
+    """Caminho geral de para_json para tipos que não são nativos de JSON"""
+    if isinstance(valor, Decimal):
+        return _decimal(valor, decimais)
+    if isinstance(valor, np.generic):
+        return para_json(valor.item(), decimais)
+    if isinstance(valor, (str, bool)):
+        return valor
+    if isinstance(valor, int):
+        return int(valor)
+    if isinstance(valor, float):
+        return float(valor) if math.isfinite(valor) else None
+    if valor is pd.NaT or valor is pd.NA:
+        return None
+    if isinstance(valor, (datetime, date, hora)):
+        return valor.isoformat()
+    if isinstance(valor, dict):
+        return {_chave(chave): para_json(item, decimais) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple, set)):
+        return [para_json(item, decimais) for item in valor]
+    if isinstance(valor, pd.DataFrame):
+        return para_json(valor.to_dict('records'), decimais)
+    if isinstance(valor, pd.Series):
+        return para_json(valor.to_dict(), decimais)
+    if isinstance(valor, np.ndarray):
+        return para_json(valor.tolist(), decimais)
+    if isinstance(valor, pd.Period):
+        return str(valor)
+    if isinstance(valor, timedelta):
+        return valor.total_seconds()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    return str(valor)
+
+
+_CONTEINERES = {dict, list, tuple}
+
+
+def _normalizar_chaves(valor):
+    """Reconstrói apenas dicts/listas, convertendo as chaves; os valores ficam para o orjson"""
+    tipo = type(valor)
+    if tipo is dict:
+        return {chave if type(chave) is str else _chave(chave):
+                _normalizar_chaves(item) if type(item) in _CONTEINERES else item
+                for chave, item in valor.items()}
+    if tipo is list or tipo is tuple:
+        return [_normalizar_chaves(item) if type(item) in _CONTEINERES else item for item in valor]
+    return valor
+
+
+def codificar(valor, compacto: bool = False, decimais: str = 'texto') -> bytes:
+    """Codifica em JSON UTF-8
+
+    Com orjson, NumPy, NaN e floats são tratados em C e só os demais tipos
+    passam por `_converter`; sem ele, o resultado de para_json vai para o json.
+    """
+    if orjson is not None:
+        opcoes = orjson.OPT_SERIALIZE_NUMPY | (0 if compacto else orjson.OPT_INDENT_2)
+        return orjson.dumps(_normalizar_chaves(valor), default=lambda item: _converter(item, decimais),
+                            option=opcoes)
+    nativo = para_json(valor, decimais)
+    if compacto:
+        return json.dumps(nativo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(nativo, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def caminho_saida(caminho: str, compressao: Optional[str] = None) -> str:
+    """Acrescenta a extensão da compressão ao caminho, se ainda não tiver"""
+    if compressao is None:
+        return caminho
+    if compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão desconhecida: {compressao} (use {', '.join(COMPRESSOES)})")
+    extensao = COMPRESSOES[compressao]
+    return caminho if caminho.endswith(extensao) else caminho + extensao
+
+
+def abrir_saida(caminho: str, compressao: Optional[str] = None) -> BinaryIO:
+    """Abre o arquivo de saída binário, comprimido conforme `compressao`"""
+    if compressao == 'gzip':
+        return gzip.open(caminho, 'wb', compresslevel=6)
+    if compressao == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Compressão zstd requer o pacote 'zstandard' (pip install zstandard)")
+        arquivo = open(caminho, 'wb')
+        return zstandard.ZstdCompressor(level=3).stream_writer(arquivo, closefd=True)
+    return open(caminho, 'wb')
+
+
+def _acrescentar_secoes(conteudo: bytes, secoes: dict, compacto: bool, decimais: str) -> bytes:
+    """Acrescenta seções ao fim de um objeto JSON já codificado
+
+    As seções são codificadas como objeto de topo, com a mesma indentação do
+    documento; basta trocar o fechamento de um pela abertura do outro.
+    """
+    extra = codificar(secoes, compacto, decimais)
+    corpo = conteudo.rstrip()[:-1].rstrip()
+    if corpo == b'{':
+        return extra
+    return corpo + b',' + extra.lstrip()[1:]
+
+
+def gravar_json(dados, caminho: str, compacto: bool = False, compressao: Optional[str] = None,
+                decimais: str = 'texto', secoes_finais: Optional[Callable[[], dict]] = None) -> str:
+    """Grava `dados` como um único documento JSON e retorna o caminho final
+
+    `secoes_finais`, se informado, é chamado depois que `dados` foi codificado;
+    as seções que devolver entram no fim do documento (ex.: métricas que
+    incluem o tempo da própria codificação).
+    """
+    caminho = caminho_saida(caminho, compressao)
+    conteudo = codificar(dados, compacto, decimais)
+    if secoes_finais is not None:
+        secoes = secoes_finais()
+        if secoes:
+            conteudo = _acrescentar_secoes(conteudo, secoes, compacto, decimais)
+    with abrir_saida(caminho, compressao) as arquivo:
+        arquivo.write(conteudo)
+    return caminho
+
+
+def ler_relatorio(caminho: str):
+    """Lê um relatório JSON ou NDJSON (comprimido ou não) de volta para dict"""
+    if caminho.endswith('.gz'):
+        with gzip.open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+    elif caminho.endswith('.zst'):
+        import zstandard
+        with open(caminho, 'rb') as arquivo:
+            conteudo = zstandard.ZstdDecompressor().stream_reader(arquivo).read()
+    else:
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+
+    if '.ndjson' not in caminho:
+        return json.loads(conteudo)
+    relatorio = {}
+    for linha in io.BytesIO(conteudo):
+        if linha.strip():
+            registro = json.loads(linha)
+            relatorio[registro['secao']] = registro['dados']
+    return relatorio
+
+
+class EscritorNDJSON:
+    """Grava um relatório seção a seção: uma linha {"secao": ..., "dados": ...} por seção
+
+    Cada seção é convertida e gravada quando fica pronta, sem montar o
+    documento inteiro em memória; uma execução interrompida mantém as seções
+    já concluídas.
+    """
+
+    def __init__(self, caminho: str, compressao: Optional[str] = None, decimais: str = 'texto'):
+        self.caminho = caminho_saida(caminho, compressao)
+        self.decimais = decimais
+        self.secoes = 0
+        self._arquivo = abrir_saida(self.caminho, compressao)
+
+    def escrever(self, secao: str, dados):
+        self._arquivo.write(codificar({"secao": secao, "dados": dados}, compacto=True,
+                                      decimais=self.decimais) + b"\n")
+        self._arquivo.flush()
+        self.secoes += 1
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
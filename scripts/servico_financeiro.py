@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Serviço Residente de Relatórios - Módulo Financeiro
+FoncareSystem
+
+Processo de longa duração que mantém o pool de conexões e os relatórios mais
+recentes em memória. AnaliseFinanceira e FinanceiroIntegrityChecker são
+reexecutados em intervalos próprios; o resultado é serializado uma vez por
+execução e servido por HTTP local, com ETag / If-None-Match, para o frontend
+consultar a cada carregamento de página sem tocar no banco.
+
+Rotas (somente GET/HEAD):
+    /saude                              estado das tarefas agendadas e dos pools de conexões
+    /relatorios/financeiro[/<secao>]    relatório financeiro (ou uma seção)
+    /relatorios/integridade[/<secao>]   relatório de integridade (ou uma seção)
+
+Cada seção tem ETag própria: o dashboard deve consultar só as seções que
+exibe (ex.: /relatorios/financeiro/dashboard_unidades), que respondem 304
+enquanto os dados não mudam. Seções com medições de tempo (projeção,
+verificações de performance) mudam a cada execução.
+
+Uso:
+    python scripts/servico_financeiro.py --porta 8765 --intervalo-analise 900 --intervalo-integridade 3600
+"""
+
+import gzip
+import time
+import signal
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from pool_conexoes import estatisticas_pools, fechar_pools
+from analise_financeira import AnaliseFinanceira
+from verificar_integridade_financeiro import FinanceiroIntegrityChecker
+from serializacao_relatorio import codificar
+
+# Corpos menores que isso não compensam o gzip
+TAMANHO_MINIMO_GZIP = 1024
+
+# Seções que mudam a cada execução mesmo sem mudança nos dados; ficam fora da
+# ETag do documento completo (que por isso é fraca, W/)
+SECOES_VOLATEIS = {'data_geracao', 'data_verificacao', 'estatisticas_conexoes', 'pool_conexoes', 'cache_consultas',
+                   'metricas_execucao'}
+
+
+class CacheRelatorios:
+    """Relatórios serializados em memória, com ETag por documento e por seção"""
+
+    def __init__(self):
+        self._entradas: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entrada(dados, gerado_em: str, etag: str = None) -> Dict:
+        corpo = codificar(dados, compacto=True)
+        etag = etag or '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+        return {
+            "corpo": corpo,
+            "corpo_gzip": gzip.compress(corpo, 6) if len(corpo) >= TAMANHO_MINIMO_GZIP else None,
+            "etag": etag,
+            "gerado_em": gerado_em
+        }
+
+    def publicar(self, nome: str, relatorio: Dict):
+        """Serializa o relatório e cada seção de primeiro nível; substitui a versão anterior"""
+        gerado_em = datetime.now().isoformat()
+        entradas = {f"{nome}/{secao}": self._entrada(dados, gerado_em) for secao, dados in relatorio.items()}
+
+        assinatura = hashlib.sha256()
+        for secao in relatorio:
+            if secao not in SECOES_VOLATEIS:
+                assinatura.update(f"{secao}={entradas[f'{nome}/{secao}']['etag']};".encode())
+        entradas[nome] = self._entrada(relatorio, gerado_em, 'W/"' + assinatura.hexdigest()[:32] + '"')
+
+        with self._lock:
+            for chave in [chave for chave in self._entradas if chave == nome or chave.startswith(nome + "/")]:
+                del self._entradas[chave]
+            self._entradas.update(entradas)
+
+    def obter(self, chave: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entradas.get(chave)
+
+
+class ServicoFinanceiro:
+    """Agenda as análises e publica os resultados no cache servido por HTTP"""
+
+    def __init__(self, intervalo_analise: int = 900, intervalo_integridade: int = 3600,
+                 espelho: Optional[str] = None, rollup: bool = False,
+                 paralelo: bool = True, max_workers: int = 4, cache_consultas: Optional[str] = None):
+        """
+        Args:
+            intervalo_analise: segundos entre execuções de AnaliseFinanceira
+            intervalo_integridade: segundos entre execuções do FinanceiroIntegrityChecker
+            espelho: diretório do espelho Parquet ('' para o padrão); None lê do banco
+            rollup: lê contas a receber do rollup mensal
+            paralelo, max_workers: modo de geração do relatório financeiro
+            cache_consultas: diretório do cache persistente de consultas ('' para o padrão); None desativa
+        """
+        self.cache = CacheRelatorios()
+        self.espelho = espelho
+        self.rollup = rollup
+        self.paralelo = paralelo
+        self.max_workers = max_workers
+        self.analise = AnaliseFinanceira()
+        if cache_consultas is not None:
+            self.analise.usar_cache(cache_consultas or None)
+
+        self.tarefas: Dict[str, Dict] = {
+            "financeiro": {"intervalo": intervalo_analise, "funcao": self._relatorio_financeiro},
+            "integridade": {"intervalo": intervalo_integridade, "funcao": self._relatorio_integridade},
+        }
+        for tarefa in self.tarefas.values():
+            tarefa.update({"execucoes": 0, "falhas": 0, "ultima_execucao": None,
+                           "duracao_segundos": None, "proxima_execucao": None, "ultimo_erro": None,
+                           "executando": False})
+
+        self._parar = threading.Event()
+        self._threads = []
+
+    def _relatorio_financeiro(self) -> Dict:
+        if self.espelho is not None:
+            self.analise.usar_espelho(self.espelho or None)
+        elif self.rollup:
+            self.analise.usar_rollup()
+        return self.analise.gerar_relatorio_completo(salvar_arquivo=False, paralelo=self.paralelo,
+                                                     max_workers=self.max_workers)
+
+    def _relatorio_integridade(self) -> Dict:
+        # Alertas e verificações se acumulam na instância: uma nova por execução
+        checker = FinanceiroIntegrityChecker()
+        checker.cache = self.analise.cache
+        checker.executar_verificacoes()
+        return checker.montar_relatorio_integridade()
+
+    def executar_tarefa(self, nome: str):
+        """Executa uma tarefa agora e publica o resultado; falhas mantêm a versão anterior"""
+        tarefa = self.tarefas[nome]
+        tarefa["executando"] = True
+        inicio = time.perf_counter()
+        try:
+            self.cache.publicar(nome, tarefa["funcao"]())
+            tarefa["ultimo_erro"] = None
+        except Exception as e:
+            tarefa["falhas"] += 1
+            tarefa["ultimo_erro"] = str(e)
+            print(f"❌ Falha na tarefa {nome}: {e}")
+        finally:
+            tarefa["executando"] = False
+            tarefa["execucoes"] += 1
+            tarefa["ultima_execucao"] = datetime.now().isoformat()
+            tarefa["duracao_segundos"] = round(time.perf_counter() - inicio, 2)
+
+    def _ciclo(self, nome: str):
+        tarefa = self.tarefas[nome]
+        while not self._parar.is_set():
+            self.executar_tarefa(nome)
+            tarefa["proxima_execucao"] = datetime.fromtimestamp(time.time() + tarefa["intervalo"]).isoformat()
+            self._parar.wait(tarefa["intervalo"])
+
+    def iniciar(self):
+        """Inicia uma thread de agendamento por tarefa (a primeira execução é imediata)"""
+        for nome in self.tarefas:
+            thread = threading.Thread(target=self._ciclo, args=(nome,), name=f"tarefa-{nome}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def parar(self, espera: float = 30):
+        self._parar.set()
+        for thread in self._threads:
+            thread.join(espera)
+
+    def saude(self) -> Dict:
+        return {
+            "tarefas": {nome: {chave: valor for chave, valor in tarefa.items() if chave != "funcao"}
+                        for nome, tarefa in self.tarefas.items()},
+            "pool_conexoes": self.analise.estatisticas_conexoes(),
+            # Análise, verificação e rollup do processo, somados
+            "pools_processo": estatisticas_pools()
+        }
+
+
+def _criar_manipulador(servico: ServicoFinanceiro) -> type:
+    class Manipulador(BaseHTTPRequestHandler):
+        server_version = "FoncareFinanceiro/1.0"
+
+        def _responder(self, status: int, corpo: bytes = b"", cabecalhos: Dict = None, enviar_corpo: bool = True):
+            self.send_response(status)
+            for chave, valor in (cabecalhos or {}).items():
+                self.send_header(chave, valor)
+            if status != 304:
+                self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            if enviar_corpo and status != 304:
+                self.wfile.write(corpo)
+
+        def _erro(self, status: int, mensagem: str, enviar_corpo: bool, cabecalhos: Dict = None):
+            self._responder(status, codificar({"erro": mensagem}, compacto=True),
+                            {"Content-Type": "application/json; charset=utf-8", **(cabecalhos or {})},
+                            enviar_corpo)
+
+        def _atender(self, enviar_corpo: bool):
+            partes = [parte for parte in self.path.split("?")[0].split("/") if parte]
+            if partes == ["saude"]:
+                self._responder(200, codificar(servico.saude(), compacto=True),
+                                {"Content-Type": "application/json; charset=utf-8",
+                                 "Cache-Control": "no-store"}, enviar_corpo)
+                return
+            if len(partes) not in (2, 3) or partes[0] != "relatorios" or partes[1] not in servico.tarefas:
+                self._erro(404, "Rota não encontrada", enviar_corpo)
+                return
+
+            entrada = servico.cache.obter("/".join(partes[1:]))
+            if entrada is None:
+                if servico.cache.obter(partes[1]) is None:
+                    self._erro(503, "Relatório ainda não gerado", enviar_corpo, {"Retry-After": "30"})
+                else:
+                    self._erro(404, f"Seção inexistente: {partes[2]}", enviar_corpo)
+                return
+
+            usar_gzip = entrada["corpo_gzip"] is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+            etag = entrada["etag"][:-1] + '-gz"' if usar_gzip else entrada["etag"]
+            cabecalhos = {
+                "Content-Type": "application/json; charset=utf-8",
+                "ETag": etag,
+                "Cache-Control": "no-cache",
+                "Vary": "Accept-Encoding",
+                "X-Gerado-Em": entrada["gerado_em"]
+            }
+
+            # If-None-Match usa comparação fraca: W/ é ignorado dos dois lados
+            informadas = [valor.strip().removeprefix("W/")
+                          for valor in self.headers.get("If-None-Match", "").split(",") if valor.strip()]
+            if "*" in informadas or etag.removeprefix("W/") in informadas:
+                self._responder(304, cabecalhos=cabecalhos)
+                return
+
+            if usar_gzip:
+                cabecalhos["Content-Encoding"] = "gzip"
+                self._responder(200, entrada["corpo_gzip"], cabecalhos, enviar_corpo)
+            else:
+                self._responder(200, entrada["corpo"], cabecalhos, enviar_corpo)
+
+        def do_GET(self):
+            self._atender(enviar_corpo=True)
+
+        def do_HEAD(self):
+            self._atender(enviar_corpo=False)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return Manipulador
+
+
+def main():
+    """Executa o serviço até receber SIGINT/SIGTERM"""
+    parser = argparse.ArgumentParser(description="Serviço residente de relatórios financeiros")
+    parser.add_argument("--host", default="127.0.0.1", help="endereço de escuta (padrão: somente local)")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--intervalo-analise", type=int, default=900,
+                        help="segundos entre execuções da análise financeira")
+    parser.add_argument("--intervalo-integridade", type=int, default=3600,
+                        help="segundos entre verificações de integridade")
+    parser.add_argument("--max-workers", type=int, default=4,
+                        help="workers (e conexões) da análise financeira")
+    parser.add_argument("--sequencial", action="store_true",
+                        help="gera as seções do relatório financeiro sem paralelismo")
+    parser.add_argument("--espelho", nargs="?", const="", default=None, metavar="DIR",
+                        help="sincroniza o espelho Parquet local a cada execução e analisa a partir dele")
+    parser.add_argument("--rollup", action="store_true",
+                        help="lê contas a receber do rollup mensal (atualizado a cada execução)")
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="reaproveita entre execuções resultados de consultas cujas tabelas não mudaram")
+    args = parser.parse_args()
+
+    print("🏥 FoncareSystem - Serviço de Relatórios Financeiros")
+    print("=" * 50)
+
+    servico = ServicoFinanceiro(args.intervalo_analise, args.intervalo_integridade, args.espelho,
+                                args.rollup, not args.sequencial, args.max_workers, args.cache)
+    servidor = ThreadingHTTPServer((args.host, args.porta), _criar_manipulador(servico))
+    servidor.daemon_threads = True
+
+    def _encerrar(*_):
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _encerrar)
+
+    try:
+        servico.iniciar()
+        print(f"🌐 Servindo em http://{args.host}:{args.porta} "
+              f"(análise a cada {args.intervalo_analise}s, integridade a cada {args.intervalo_integridade}s)")
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("🛑 Encerrando serviço...")
+        servidor.server_close()
+        servico.parar()
+        fechar_pools()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,65 @@
+"""Fixtures dos testes dos scripts financeiros (rodam sem PostgreSQL)"""
+
+import os
+import re
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend_financeiro import InstantaneoSQLite  # noqa: E402
+from gerador_dados_sinteticos import GeradorDadosSinteticos  # noqa: E402
+
+
+def tabelas_sinteticas(fator_escala: float = 0.2, semente: int = 7) -> dict:
+    """Tabelas do instantâneo geradas em memória, com as colunas calculadas pelo banco"""
+    gerador = GeradorDadosSinteticos(fator_escala=fator_escala, semente=semente)
+    tabelas = {tabela: pd.concat(list(gerador.gerar(tabela)), ignore_index=True)
+               for tabela in ('contas_receber', 'contas_pagar', 'folha_clt', 'folha_pj')}
+    for df in tabelas.values():
+        df['id'] = [str(uuid.UUID(int=i + 1)) for i in range(len(df))]
+
+    receber = tabelas['contas_receber']
+    receber['percentual_glosa'] = np.where(receber['valor_bruto'] > 0,
+                                           (receber['valor_glosa'] / receber['valor_bruto'] * 100).round(2), 0.0)
+    receber['metodo_recebimento'] = None
+    folha_clt = tabelas['folha_clt']
+    folha_clt['custo_total'] = folha_clt['salario_base'] + folha_clt['horas_extras'] + folha_clt['encargos_patronais']
+    folha_pj = tabelas['folha_pj']
+    folha_pj['valor_repasse'] = (folha_pj['valor_bruto'] * folha_pj['percentual_repasse'] / 100).round(2)
+
+    tabelas['unidades'] = gerador.unidades[['id', 'nome']]
+    tabelas['convenios'] = gerador.convenios[['id', 'nome']]
+    return tabelas
+
+
+def gravar_instantaneo(tabelas: dict, caminho: str) -> str:
+    """Grava as tabelas com InstantaneoSQLite.criar, respondendo às consultas dele em memória"""
+    def executar_query(query, params=None):
+        colunas, tabela = re.fullmatch(r"SELECT (.+) FROM (\w+)", query.strip()).groups()
+        return tabelas[tabela][[coluna.strip() for coluna in colunas.split(',')]].copy()
+
+    InstantaneoSQLite.criar(caminho, executar_query)
+    return caminho
+
+
+@pytest.fixture(scope='session')
+def tabelas():
+    return tabelas_sinteticas()
+
+
+@pytest.fixture(scope='session')
+def instantaneo(tabelas, tmp_path_factory) -> str:
+    """Arquivo SQLite do instantâneo das tabelas sintéticas"""
+    return gravar_instantaneo(tabelas, str(tmp_path_factory.mktemp('instantaneo') / 'financeiro.sqlite'))
+
+
+@pytest.fixture
+def sem_banco(monkeypatch):
+    """Configuração que não alcança nenhum banco: qualquer conexão falha"""
+    monkeypatch.setenv('SUPABASE_DB_HOST', '/nao/existe')
+    monkeypatch.setenv('SUPABASE_DB_PORT', '1')
@@ -0,0 +1,82 @@
+"""Sincronização do espelho local com falhas de leitura do banco"""
+
+import re
+
+import pandas as pd
+import pytest
+
+from espelho_local import EspelhoLocal
+
+
+class BancoFalso:
+    """Leitor de consultas do espelho sobre um DataFrame; `falhar` simula erro do banco"""
+
+    def __init__(self, linhas: pd.DataFrame):
+        self.linhas = linhas
+        self.falhar = False
+
+    def __call__(self, query, params=None):
+        if self.falhar:
+            raise RuntimeError("conexão perdida")
+        if 'GROUP BY' in query:
+            meses = self.linhas['created_at'].dt.strftime('%Y-%m')
+            return meses.value_counts().rename_axis('mes').reset_index(name='quantidade')
+        if 'FROM unidades' in query or 'FROM convenios' in query:
+            return pd.DataFrame({'id': ['u1'], 'nome': ['Unidade 1']})
+        tabela = re.search(r"FROM (\w+)", query).group(1)
+        colunas = EspelhoLocal.TABELAS[tabela]
+        if tabela != 'contas_receber':
+            return pd.DataFrame(columns=colunas)
+        df = self.linhas
+        if params and 'updated_at' in query:
+            df = df[df['updated_at'] >= pd.Timestamp(params[0])]
+        elif params:
+            df = df[(df['created_at'] >= pd.Timestamp(params[0], tz='UTC'))
+                    & (df['created_at'] < pd.Timestamp(params[1], tz='UTC'))]
+        return df[colunas].copy()
+
+
+@pytest.fixture
+def banco():
+    criado = pd.to_datetime(['2026-01-10', '2026-01-20', '2026-02-05'], utc=True)
+    return BancoFalso(pd.DataFrame({
+        'id': ['a', 'b', 'c'], 'unidade_id': 'u1', 'convenio_id': None, 'origem': 'Particular',
+        'status': 'Recebido', 'valor_bruto': 100.0, 'valor_liquido': 100.0, 'valor_glosa': 0.0,
+        'percentual_glosa': 0.0, 'data_vencimento': criado, 'data_recebimento': criado,
+        'created_at': criado, 'updated_at': criado
+    }))
+
+
+def test_falha_na_reconciliacao_nao_apaga_o_espelho(banco, tmp_path):
+    espelho = EspelhoLocal(banco, str(tmp_path))
+    espelho.sincronizar()
+    estado = espelho._carregar_estado('contas_receber')
+    assert espelho.meses_particionados('contas_receber') == ['2026-01', '2026-02']
+
+    banco.falhar = True
+    with pytest.raises(RuntimeError):
+        espelho.sincronizar(forcar_reconciliacao=True)
+    assert espelho.meses_particionados('contas_receber') == ['2026-01', '2026-02']
+    assert espelho._carregar_estado('contas_receber') == estado
+
+
+def test_leitor_que_engole_erros_nao_conta_como_tabela_vazia(banco, tmp_path):
+    espelho = EspelhoLocal(banco, str(tmp_path))
+    espelho.sincronizar()
+
+    espelho.executar_query = lambda query, params=None: pd.DataFrame()
+    with pytest.raises(RuntimeError):
+        espelho.sincronizar_tabela('contas_receber', forcar_reconciliacao=True)
+    with pytest.raises(RuntimeError):
+        espelho.reconciliar_tabela('contas_receber')
+    assert espelho.meses_particionados('contas_receber') == ['2026-01', '2026-02']
+
+
+def test_reconciliacao_remove_linhas_excluidas(banco, tmp_path):
+    espelho = EspelhoLocal(banco, str(tmp_path))
+    espelho.sincronizar()
+
+    banco.linhas = banco.linhas[banco.linhas['id'] != 'c']
+    resultado = espelho.sincronizar(forcar_reconciliacao=True)
+    assert resultado['contas_receber']['reconciliacao']['meses_refeitos'] == ['2026-02']
+    assert espelho.meses_particionados('contas_receber') == ['2026-01']
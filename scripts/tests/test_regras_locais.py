@@ -0,0 +1,100 @@
+"""Paridade das regras de integridade do backend local com as condições SQL do verificador"""
+
+import re
+import sqlite3
+import time
+import uuid
+
+import pandas as pd
+import pytest
+
+from backend_financeiro import BackendLocal, InstantaneoSQLite
+from conftest import gravar_instantaneo
+from filtros_financeiros import FiltroFinanceiro
+from verificar_integridade_financeiro import FinanceiroIntegrityChecker
+
+REGRAS_SQL = FinanceiroIntegrityChecker.REGRAS_POR_TABELA
+
+# Diferenças de dialeto entre as condições (PostgreSQL) e o SQLite do instantâneo
+DIALETO_SQLITE = [
+    (r"CURRENT_DATE \+ INTERVAL '(\d+) (years|days)'", r"date('now', '+\1 \2')"),
+    (r"CURRENT_DATE", "date('now')"),
+    (r"::float", " * 1.0"),
+]
+
+
+def _para_sqlite(expressao: str) -> str:
+    for padrao, substituto in DIALETO_SQLITE:
+        expressao = re.sub(padrao, substituto, expressao)
+    return expressao
+
+
+def _varredura_sqlite(caminho: str) -> dict:
+    """As regras SQL do verificador avaliadas direto no arquivo do instantâneo"""
+    resultado = {}
+    with sqlite3.connect(caminho) as conn:
+        for tabela, regras in REGRAS_SQL.items():
+            avaliadas = {}
+            for regra in regras:
+                condicao = _para_sqlite(regra['condicao'])
+                colunas = [f"COUNT(*) FILTER (WHERE {condicao})"]
+                colunas += [f"{funcao}({_para_sqlite(expressao)}) FILTER (WHERE {condicao})"
+                            for funcao, expressao in regra.get('medidas', {}).values()]
+                valores = conn.execute(f"SELECT {', '.join(colunas)} FROM {tabela} t "
+                                       f"LEFT JOIN unidades u ON t.unidade_id = u.id").fetchone()
+                avaliadas[regra['nome']] = dict(zip(['quantidade', *regra.get('medidas', {})], valores))
+            resultado[tabela] = avaliadas
+    return resultado
+
+
+@pytest.fixture(scope='module')
+def instantaneo_com_violacoes(tabelas, tmp_path_factory) -> str:
+    """Instantâneo sintético com algumas linhas que violam cada regra de integridade"""
+    tabelas = {nome: df.copy() for nome, df in tabelas.items()}
+    hoje = pd.Timestamp.now(tz='UTC')
+    orfa = str(uuid.uuid4())
+    for nome, valor in (('contas_pagar', 'valor'), ('contas_receber', 'valor_liquido')):
+        df = tabelas[nome]
+        df.loc[df.index[:2], 'unidade_id'] = orfa
+        df.loc[df.index[2:5], valor] = -10.0
+        df.loc[df.index[5:7], 'data_vencimento'] = (hoje + pd.DateOffset(years=3)).date()
+        df.loc[df.index[7:10], ['status', 'data_vencimento']] = ['Pendente', (hoje - pd.Timedelta(days=10)).date()]
+    receber = tabelas['contas_receber']
+    receber.loc[receber.index[10:14], 'valor_liquido'] = receber.loc[receber.index[10:14], 'valor_bruto'] + 1
+    return gravar_instantaneo(tabelas, str(tmp_path_factory.mktemp('violacoes') / 'financeiro.sqlite'))
+
+
+def test_regras_locais_cobrem_as_regras_sql():
+    regras = {(tabela, regra['nome']) for tabela, lista in REGRAS_SQL.items() for regra in lista}
+    medidas = {(tabela, medida) for tabela, lista in REGRAS_SQL.items()
+               for regra in lista for medida in regra.get('medidas', {})}
+    assert set(BackendLocal.REGRAS) == regras
+    assert set(BackendLocal.MEDIDAS) == medidas
+
+
+def test_regras_locais_contam_como_o_sql(instantaneo_com_violacoes):
+    esperado = _varredura_sqlite(instantaneo_com_violacoes)
+    local = BackendLocal(InstantaneoSQLite(instantaneo_com_violacoes)).varredura(
+        REGRAS_SQL, FiltroFinanceiro(), FinanceiroIntegrityChecker.TAMANHO_AMOSTRA)
+
+    for tabela, regras in esperado.items():
+        for nome, valores in regras.items():
+            avaliada = local[tabela]['regras'][nome]
+            assert avaliada['quantidade'] == valores['quantidade'], f"{tabela}.{nome}"
+            # Cada regra é exercitada pelo instantâneo (as violações foram inseridas de propósito)
+            assert valores['quantidade'] > 0, f"{tabela}.{nome}"
+            for medida, valor in valores.items():
+                if medida != 'quantidade':
+                    assert avaliada[medida] == pytest.approx(valor), f"{tabela}.{nome}.{medida}"
+
+
+@pytest.mark.parametrize('fuso', ['Etc/GMT-14', 'Etc/GMT+12'])
+def test_hoje_em_utc_em_qualquer_fuso(monkeypatch, fuso):
+    # Em qualquer instante, a data local de um desses fusos difere da data em UTC
+    monkeypatch.setenv('TZ', fuso)
+    time.tzset()
+    try:
+        assert BackendLocal._hoje() == pd.Timestamp(time.strftime('%Y-%m-%d', time.gmtime()))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,27 @@
+"""Relatório completo sobre um instantâneo SQLite, sem acesso ao banco"""
+
+import pool_conexoes
+from analise_financeira import AnaliseFinanceira
+
+SECOES = ('receitas_por_origem', 'analise_glosas', 'projecao_fluxo_caixa', 'dashboard_unidades', 'resumo_executivo')
+
+
+def _relatorio(instantaneo, paralelo):
+    analise = AnaliseFinanceira()
+    analise.usar_instantaneo(instantaneo)
+    relatorio = analise.gerar_relatorio_completo(salvar_arquivo=False, paralelo=paralelo, max_workers=3)
+    # Único campo de tempo dentro das seções
+    relatorio["projecao_fluxo_caixa"]["modelo"].pop("tempo_ajuste_ms")
+    return relatorio
+
+
+def test_sequencial_e_paralelo_sem_banco(instantaneo, sem_banco):
+    sequencial = _relatorio(instantaneo, paralelo=False)
+    paralelo = _relatorio(instantaneo, paralelo=True)
+
+    for secao in SECOES:
+        assert "erro" not in sequencial[secao], sequencial[secao]
+        assert paralelo[secao] == sequencial[secao], secao
+    assert sequencial["receitas_por_origem"]["total_receita_bruta"] > 0
+    # Nenhum pool foi criado: o modo paralelo não reservou conexões
+    assert not pool_conexoes._pools
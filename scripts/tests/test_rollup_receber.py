@@ -0,0 +1,38 @@
+"""Leitura do rollup mensal com falhas e sem carga inicial"""
+
+import pandas as pd
+import pytest
+
+from rollup_receber import RollupReceberMensal
+
+
+def _rollup(executar_query):
+    return RollupReceberMensal(executar_query, {'host': 'sem-banco'})
+
+
+def test_falha_de_leitura_propaga():
+    def falhar(query, params=None):
+        raise RuntimeError("relation rollup_receber_mensal does not exist")
+
+    with pytest.raises(RuntimeError, match="does not exist"):
+        _rollup(falhar).fatos_receber(12)
+    with pytest.raises(RuntimeError, match="does not exist"):
+        _rollup(falhar).estado()
+
+
+def test_estado_com_controle_vazio():
+    vazio = pd.DataFrame({'marca_dagua': [None], 'ultima_atualizacao': [None],
+                          'meses_pendentes': [0], 'linhas_rollup': [0]})
+    with pytest.raises(RuntimeError, match="rollup_receber_controle vazio"):
+        _rollup(lambda query, params=None: vazio).estado()
+    with pytest.raises(RuntimeError, match="não retornou linha"):
+        _rollup(lambda query, params=None: pd.DataFrame()).estado()
+
+
+def test_estado_carregado():
+    marca = pd.Timestamp('2026-10-01 12:00', tz='UTC')
+    df = pd.DataFrame({'marca_dagua': [marca], 'ultima_atualizacao': [marca],
+                       'meses_pendentes': [2], 'linhas_rollup': [40]})
+    assert _rollup(lambda query, params=None: df).estado() == {
+        'marca_dagua': marca.isoformat(), 'ultima_atualizacao': marca.isoformat(),
+        'meses_pendentes': 2, 'linhas_rollup': 40}
@@ -0,0 +1,25 @@
+"""Status do ExecutorVerificacoes conforme o retorno das verificações"""
+
+from verificacoes_async import ExecutorVerificacoes
+
+
+def _falha():
+    raise ValueError("consulta inválida")
+
+
+def test_retorno_false_vira_falhou(monkeypatch):
+    # Sem conexões pré-abertas: as verificações de teste não usam o banco
+    monkeypatch.setenv('FINANCEIRO_POOL_MIN', '0')
+    config = {'host': '/nao/existe', 'port': 1, 'dbname': 'x', 'user': 'x', 'password': 'x'}
+    resultados = ExecutorVerificacoes(config, max_conexoes=2).executar_sincrono({
+        'aprovada': (lambda: True, 5),
+        'sem_retorno': (lambda: None, 5),
+        'reprovada': (lambda: False, 5),
+        'quebrada': (_falha, 5),
+    })
+
+    assert resultados['aprovada']['status'] == 'ok'
+    assert resultados['sem_retorno']['status'] == 'ok'
+    assert resultados['reprovada']['status'] == 'falhou'
+    assert resultados['reprovada']['retorno'] is False
+    assert resultados['quebrada']['status'] == 'erro'
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tipos das Extrações - Módulo Financeiro
+FoncareSystem
+
+pd.read_sql_query entrega NUMERIC como objetos Decimal e textos como str do
+Python, de modo que os groupby das análises rodam no caminho de objetos,
+lento e pesado em memória. Este módulo fixa os dtypes dos quadros extraídos:
+
+    valores monetários -> int64 em centavos (exato: somas sem erro de float)
+    chaves de baixa cardinalidade (unidade, origem, convênio...) -> category
+    meses/datas -> datetime64
+    NUMERIC não monetário (percentuais de glosa) -> float64
+
+As consultas no PostgreSQL já devolvem os valores em centavos, com o alias
+`<coluna>_centavos`; espelho e rollup entregam reais (Decimal ou float),
+convertidos aqui. Os relatórios voltam a reais só na saída, com `reais()`.
+"""
+
+import math
+import time
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+SUFIXO_CENTAVOS = '_centavos'
+CHAVES_CATEGORICAS = ('unidade', 'origem', 'convenio', 'categoria', 'status')
+
+
+def _decimal_para_centavos(valor) -> int:
+    if valor is None or valor is pd.NA or (isinstance(valor, float) and not math.isfinite(valor)):
+        return 0
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor))
+    if not valor.is_finite():
+        return 0
+    return int(valor.scaleb(2).to_integral_value(ROUND_HALF_EVEN))
+
+
+def para_centavos(serie: pd.Series) -> pd.Series:
+    """Valores em reais (Decimal, float ou texto) para int64 em centavos; nulos viram 0"""
+    if pd.api.types.is_numeric_dtype(serie):
+        valores = np.rint(serie.to_numpy(dtype=float, na_value=0.0) * 100)
+        return pd.Series(valores.astype(np.int64), index=serie.index, name=serie.name)
+    return pd.Series(np.fromiter((_decimal_para_centavos(valor) for valor in serie), dtype=np.int64,
+                                 count=len(serie)), index=serie.index, name=serie.name)
+
+
+def tipar(df: pd.DataFrame, monetarias: Iterable[str] = (), numericas: Iterable[str] = (),
+          categoricas: Iterable[str] = CHAVES_CATEGORICAS, datas: Iterable[str] = ('mes',)) -> pd.DataFrame:
+    """Aplica os dtypes do módulo a um quadro extraído
+
+    Args:
+        monetarias: colunas em centavos no resultado; aceita `<coluna>_centavos`
+            (já inteiro, vindo do SQL) ou `<coluna>` em reais
+        numericas: NUMERIC não monetário, convertido para float64
+        categoricas: chaves convertidas para category (as ausentes são ignoradas)
+        datas: colunas convertidas para datetime64
+    """
+    if df.empty and not len(df.columns):
+        return df
+
+    em_centavos = {coluna + SUFIXO_CENTAVOS: coluna for coluna in monetarias if coluna + SUFIXO_CENTAVOS in df}
+    df = df.rename(columns=em_centavos)
+    for coluna in monetarias:
+        if coluna in em_centavos.values():
+            df[coluna] = df[coluna].fillna(0).astype(np.int64)
+        elif coluna in df:
+            df[coluna] = para_centavos(df[coluna])
+    for coluna in numericas:
+        if coluna in df:
+            df[coluna] = df[coluna].astype(float)
+    for coluna in categoricas:
+        if coluna in df and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    for coluna in datas:
+        if coluna in df and not pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            df[coluna] = pd.to_datetime(df[coluna])
+    return df
+
+
+def reais(centavos):
+    """Centavos (escalar, Series ou DataFrame) de volta para reais"""
+    if isinstance(centavos, (pd.Series, pd.DataFrame)):
+        return centavos / 100
+    return float(centavos) / 100
+
+
+def em_reais(df: pd.DataFrame, colunas: Iterable[str]) -> pd.DataFrame:
+    """Converte para reais as colunas monetárias de um quadro agregado"""
+    return df.assign(**{coluna: df[coluna] / 100 for coluna in colunas if coluna in df})
+
+
+def memoria_mb(df: pd.DataFrame) -> float:
+    """Memória ocupada pelo quadro, incluindo os objetos Python das colunas"""
+    return round(float(df.memory_usage(deep=True).sum()) / (1024 * 1024), 3)
+
+
+def comparar_tipagem(bruto: pd.DataFrame, chaves: List[str], monetarias: List[str],
+                     repeticoes: int = 3) -> Dict:
+    """Mede memória e tempo de agregação de um quadro como lido do banco e depois de tipado
+
+    As agregações são as das análises: soma das colunas monetárias por cada
+    chave e pela combinação de todas. Também confere que os totais batem.
+    """
+    inicio = time.perf_counter()
+    tipado = tipar(bruto, monetarias)
+    tempo_tipagem = time.perf_counter() - inicio
+
+    def _agregar(df: pd.DataFrame) -> pd.Series:
+        for chave in chaves:
+            df.groupby(chave, observed=True)[monetarias].sum()
+        return df.groupby(chaves, observed=True)[monetarias].sum().sum()
+
+    def _medir(df: pd.DataFrame):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            totais = _agregar(df)
+            tempos.append(time.perf_counter() - inicio)
+        return min(tempos), totais
+
+    tempo_antes, totais_antes = _medir(bruto)
+    tempo_depois, totais_depois = _medir(tipado)
+    memoria_antes, memoria_depois = memoria_mb(bruto), memoria_mb(tipado)
+
+    return {
+        "linhas": len(bruto),
+        "memoria_mb": {"antes": memoria_antes, "depois": memoria_depois},
+        "agregacao_s": {"antes": round(tempo_antes, 4), "depois": round(tempo_depois, 4)},
+        "tipagem_s": round(tempo_tipagem, 4),
+        "reducao_memoria": round(memoria_antes / memoria_depois, 1) if memoria_depois else None,
+        "aceleracao_agregacao": round(tempo_antes / tempo_depois, 1) if tempo_depois else None,
+        "dtypes_depois": {coluna: str(dtype) for coluna, dtype in tipado.dtypes.items()},
+        "totais_conferem": all(_decimal_para_centavos(totais_antes[coluna]) == int(totais_depois[coluna])
+                               for coluna in monetarias)
+    }
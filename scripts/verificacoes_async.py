@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Execução Concorrente de Verificações - Módulo Financeiro
+FoncareSystem
+
+Agenda as verificações do FinanceiroIntegrityChecker com asyncio sobre um
+número limitado de conexões. Cada verificação roda em uma thread com:
+
+- statement_timeout próprio, aplicado pelo servidor a toda consulta que ela
+  fizer (as conexões são preparadas em preparar_conexao ao sair do pool);
+- prazo no cliente para a verificação inteira. Ao expirar, as consultas em
+  andamento são canceladas no servidor com pg_cancel_backend e novas
+  consultas da verificação são recusadas.
+
+Verificações lentas aparecem como 'timeout' no relatório em vez de travar a
+execução inteira.
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from pool_conexoes import obter_pool
+
+# Verificação em execução na thread atual (definida pelo executor)
+_contexto = threading.local()
+
+
+class VerificacaoCancelada(Exception):
+    """A verificação excedeu o prazo e não pode iniciar novas consultas"""
+
+
+def preparar_conexao(conn):
+    """Aplica o statement_timeout da verificação atual e registra o backend para cancelamento
+
+    Sem verificação em andamento na thread (execução sequencial), não faz nada.
+    """
+    registro = getattr(_contexto, 'registro', None)
+    if registro is None:
+        return
+    if registro['cancelada']:
+        raise VerificacaoCancelada(f"Verificação {registro['nome']} cancelada por tempo")
+
+    with conn.cursor() as cursor:
+        cursor.execute("SET statement_timeout = %s", (registro['statement_timeout_ms'],))
+    conn.commit()
+    with registro['lock']:
+        registro['backends'][id(conn)] = conn.get_backend_pid()
+
+
+def restaurar_conexao(conn) -> bool:
+    """Desfaz o statement_timeout antes de a conexão voltar ao pool
+
+    Returns:
+        False se a conexão não pôde ser restaurada e deve ser descartada
+    """
+    registro = getattr(_contexto, 'registro', None)
+    if registro is None:
+        return True
+    with registro['lock']:
+        if registro['backends'].pop(id(conn), None) is None:
+            return True
+    if conn.closed:
+        return False
+    try:
+        if not conn.autocommit and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("RESET statement_timeout")
+        conn.commit()
+        return True
+    except Exception:
+        return False
+
+
+class ExecutorVerificacoes:
+    """Executa verificações concorrentes com limite de conexões, prazo e cancelamento"""
+
+    def __init__(self, db_config: Dict, max_conexoes: int = 3, espera_cancelamento: float = 5.0):
+        """
+        Args:
+            db_config: configuração do pool usado pelas verificações
+            max_conexoes: verificações (e conexões) simultâneas
+            espera_cancelamento: segundos aguardando a verificação encerrar após o cancelamento
+        """
+        self.db_config = db_config
+        self.max_conexoes = max_conexoes
+        self.espera_cancelamento = espera_cancelamento
+        self._conexao_cancelamento = None
+        self._lock_cancelamento = threading.Lock()
+
+    def _cancelar(self, registro: Dict) -> int:
+        """Cancela no servidor as consultas em andamento da verificação"""
+        registro['cancelada'] = True
+        with registro['lock']:
+            backends = list(registro['backends'].values())
+        if not backends:
+            return 0
+
+        # Conexão própria: o pool pode estar todo ocupado pelas verificações
+        with self._lock_cancelamento:
+            if self._conexao_cancelamento is None or self._conexao_cancelamento.closed:
+                self._conexao_cancelamento = psycopg2.connect(**self.db_config)
+                self._conexao_cancelamento.autocommit = True
+            with self._conexao_cancelamento.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FILTER (WHERE pg_cancel_backend(pid)) FROM unnest(%s::int[]) pid",
+                               (backends,))
+                return cursor.fetchone()[0]
+
+    @staticmethod
+    def _em_thread(registro: Dict, funcao: Callable):
+        _contexto.registro = registro
+        try:
+            return funcao()
+        finally:
+            _contexto.registro = None
+
+    async def _executar_uma(self, nome: str, funcao: Callable, limite: float,
+                            executor: ThreadPoolExecutor, semaforo: asyncio.Semaphore) -> Dict:
+        async with semaforo:
+            loop = asyncio.get_running_loop()
+            registro = {
+                'nome': nome,
+                'statement_timeout_ms': max(1, int(limite * 1000)),
+                'cancelada': False,
+                'backends': {},
+                'lock': threading.Lock()
+            }
+            inicio = time.perf_counter()
+            futuro = loop.run_in_executor(executor, self._em_thread, registro, funcao)
+            resultado = {'limite_s': limite}
+            try:
+                retorno = await asyncio.wait_for(asyncio.shield(futuro), limite)
+                # Verificações sinalizam falha retornando False
+                resultado['status'] = 'falhou' if retorno is False else 'ok'
+                if isinstance(retorno, (bool, int, float, str)) or retorno is None:
+                    resultado['retorno'] = retorno
+            except asyncio.TimeoutError:
+                resultado['status'] = 'timeout'
+                try:
+                    resultado['consultas_canceladas'] = await asyncio.to_thread(self._cancelar, registro)
+                except Exception as e:
+                    resultado['erro_cancelamento'] = str(e)
+                try:
+                    await asyncio.wait_for(asyncio.shield(futuro), self.espera_cancelamento)
+                except asyncio.TimeoutError:
+                    resultado['encerrada'] = False
+                except Exception:
+                    pass
+            except Exception as e:
+                resultado['status'] = 'erro'
+                resultado['erro'] = str(e)
+            resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+            return resultado
+
+    async def executar(self, verificacoes: Dict[str, Tuple[Callable, float]]) -> Dict[str, Dict]:
+        """Executa as verificações {nome: (função, limite em segundos)} concorrentemente
+
+        Returns:
+            por verificação: status ('ok', 'falhou', 'timeout' ou 'erro'), segundos e limite
+        """
+        obter_pool(self.db_config).ampliar(self.max_conexoes)
+        semaforo = asyncio.Semaphore(self.max_conexoes)
+        # Uma thread por verificação: o semáforo limita a concorrência, e uma
+        # verificação que não encerrou após o cancelamento não bloqueia as demais
+        executor = ThreadPoolExecutor(max_workers=max(1, len(verificacoes)), thread_name_prefix="verificacao")
+        try:
+            resultados = await asyncio.gather(*[
+                self._executar_uma(nome, funcao, limite, executor, semaforo)
+                for nome, (funcao, limite) in verificacoes.items()
+            ])
+        finally:
+            # Verificações que não encerraram após o cancelamento não seguram o resultado
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock_cancelamento:
+                if self._conexao_cancelamento is not None:
+                    self._conexao_cancelamento.close()
+                    self._conexao_cancelamento = None
+        return dict(zip(verificacoes, resultados))
+
+    def executar_sincrono(self, verificacoes: Dict[str, Tuple[Callable, float]]) -> Dict[str, Dict]:
+        """Atalho para uso fora de um loop asyncio"""
+        return asyncio.run(self.executar(verificacoes))
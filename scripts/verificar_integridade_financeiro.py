@@ -10,31 +10,180 @@ Este script verifica:
 4. Alertas de inconsistências
 """
 
-import psycopg2
-import os
+import glob
+import time
+import argparse
+import threading
+from functools import partial
 from datetime import datetime, timedelta
 import json
 
+import pandas as pd
+
+from pool_conexoes import configuracao_banco, obter_pool, fechar_pools
+from dashboard_financeiro import DashboardFinanceiro
+from cache_consultas import CacheConsultas
+from verificacoes_async import (ExecutorVerificacoes, VerificacaoCancelada,
+                                preparar_conexao, restaurar_conexao)
+from metricas_execucao import MetricasExecucao, instrumentar_config, medir_etapa, perfil_cprofile
+from filtros_financeiros import FiltroFinanceiro, argumentos_filtro, filtro_dos_argumentos
+from backend_financeiro import BackendLocal, abrir_instantaneo
+
 class FinanceiroIntegrityChecker:
+    # Regras avaliadas linha a linha, todas na mesma varredura de cada tabela.
+    # `amostra` guarda alguns IDs violadores; `medidas` são agregados extras
+    # calculados só sobre as linhas que atendem a condição.
+    REGRAS_POR_TABELA = {
+        'contas_pagar': [
+            {'nome': 'orfaos', 'condicao': "t.unidade_id IS NOT NULL AND u.id IS NULL", 'amostra': True},
+            {'nome': 'valores_negativos', 'condicao': "t.valor < 0", 'amostra': True},
+            {'nome': 'datas_futuras', 'condicao': "t.data_vencimento > CURRENT_DATE + INTERVAL '2 years'", 'amostra': True},
+            {'nome': 'em_atraso', 'condicao': "t.status = 'Pendente' AND t.data_vencimento < CURRENT_DATE",
+             'medidas': {'valor_total': ('SUM', 't.valor')}},
+            {'nome': 'vencimento_30d',
+             'condicao': "t.data_vencimento BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'",
+             'medidas': {'valor_total': ('SUM', 't.valor')}},
+        ],
+        'contas_receber': [
+            {'nome': 'orfaos', 'condicao': "t.unidade_id IS NOT NULL AND u.id IS NULL", 'amostra': True},
+            {'nome': 'valores_negativos', 'condicao': "t.valor_bruto < 0 OR t.valor_liquido < 0", 'amostra': True},
+            {'nome': 'liquido_maior_bruto', 'condicao': "t.valor_liquido > t.valor_bruto", 'amostra': True},
+            {'nome': 'datas_futuras', 'condicao': "t.data_vencimento > CURRENT_DATE + INTERVAL '2 years'", 'amostra': True},
+            {'nome': 'em_atraso', 'condicao': "t.status = 'Pendente' AND t.data_vencimento < CURRENT_DATE",
+             'medidas': {'valor_total': ('SUM', 't.valor_liquido')}},
+            {'nome': 'glosa_alta', 'condicao': "t.valor_bruto > 0 AND (t.valor_glosa::float / t.valor_bruto) * 100 > 30",
+             'medidas': {'percentual_medio': ('AVG', '(t.valor_glosa::float / NULLIF(t.valor_bruto, 0)) * 100')}},
+            {'nome': 'vencimento_30d',
+             'condicao': "t.data_vencimento BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'",
+             'medidas': {'valor_total': ('SUM', 't.valor_liquido')}},
+        ],
+    }
+    TAMANHO_AMOSTRA = 5
+
+    # Índices que os filtros e agrupamentos das análises, views e sincronizações
+    # precisam. Um índice existente cobre a recomendação quando começa pelas
+    # mesmas colunas. DATE_TRUNC('month', created_at) não é indexável em
+    # timestamptz (a função não é IMMUTABLE); o índice em created_at atende os
+    # filtros de janela `created_at >= ...`, que são sargáveis.
+    INDICES_RECOMENDADOS = [
+        {'tabela': 'contas_receber', 'colunas': ['created_at'], 'nome': 'idx_contas_receber_created_at',
+         'motivo': "janela de 12 meses em extrair_fatos_receber, vw_analise_glosas e vw_receitas_origem"},
+        {'tabela': 'contas_pagar', 'colunas': ['created_at'], 'nome': 'idx_contas_pagar_created_at',
+         'motivo': "histórico de despesas da projeção de fluxo de caixa"},
+        {'tabela': 'contas_pagar', 'colunas': ['status', 'data_vencimento'],
+         'nome': 'idx_contas_pagar_status_vencimento',
+         'motivo': "contas em atraso (status = 'Pendente' AND data_vencimento < CURRENT_DATE)"},
+        {'tabela': 'contas_receber', 'colunas': ['status', 'data_vencimento'],
+         'nome': 'idx_contas_receber_status_vencimento',
+         'motivo': "contas a receber em atraso e atualização de status"},
+        {'tabela': 'contas_receber', 'colunas': ['updated_at'], 'nome': 'idx_contas_receber_updated_at',
+         'motivo': "sincronização incremental do espelho local e do rollup mensal"},
+        {'tabela': 'contas_pagar', 'colunas': ['updated_at'], 'nome': 'idx_contas_pagar_updated_at',
+         'motivo': "sincronização incremental do espelho local"},
+        {'tabela': 'contas_receber', 'colunas': ['unidade_id', 'created_at'],
+         'nome': 'idx_contas_receber_unidade_created_at',
+         'motivo': "filtros --unidade com --de/--ate (unidade_id = ANY(...) AND created_at no período)"},
+    ]
+    # Abaixo disso uma varredura sequencial é mais barata que qualquer índice
+    MINIMO_LINHAS_INDICE = 10000
+
+    # Prazo (segundos) de cada verificação no modo assíncrono; também é o
+    # statement_timeout das consultas que ela faz
+    LIMITES_VERIFICACAO = {
+        'estrutura_tabelas': 30,
+        'integridade_dados': 120,
+        'performance_queries': 300,
+        'alertas_financeiros': 120,
+        'indices': 60,
+        'dashboard': 120,
+    }
+
     def __init__(self):
-        self.db_config = {
-            'host': os.getenv('SUPABASE_DB_HOST', 'localhost'),
-            'database': os.getenv('SUPABASE_DB_NAME', 'postgres'),
-            'user': os.getenv('SUPABASE_DB_USER', 'postgres'),
-            'password': os.getenv('SUPABASE_DB_PASSWORD', ''),
-            'port': os.getenv('SUPABASE_DB_PORT', '5432')
-        }
+        self.db_config = configuracao_banco()
+        # Tempo de banco e linhas lidas por verificação (seção metricas_execucao)
+        instrumentar_config(self.db_config)
+        self.metricas = MetricasExecucao()
         self.alertas = []
         self.verificacoes = {}
+        self._varredura = None
+        self._lock_varredura = threading.Lock()
+        # Cache persistente de resultados (opcional) para as consultas de dados
+        self.cache = None
+        # Escopo das regras de linha (período de lançamento, unidades, convênios)
+        self.filtro = FiltroFinanceiro()
+        # Backend local (opcional): regras de linha avaliadas em processo sobre um instantâneo
+        self.backend = None
+    
+    def usar_filtros(self, filtro):
+        """Restringe a varredura de integridade e alertas a um período, unidades e convênios
+
+        As verificações estruturais (tabelas, performance, índices, dashboard)
+        continuam sobre o banco inteiro.
+        """
+        self.filtro = filtro
+        self._varredura = None
+        return self.filtro.resumo()
+    
+    # Verificações que dependem só das regras de linha, disponíveis sobre um instantâneo
+    SECOES_LOCAIS = ('integridade_dados', 'alertas_financeiros')
+
+    def usar_instantaneo(self, caminho):
+        """Avalia as regras de linha em processo a partir de um instantâneo, sem acessar o banco
+
+        Só integridade_dados e alertas_financeiros rodam nesse modo; estrutura,
+        performance, índices e dashboard dependem do catálogo e do planejador
+        do PostgreSQL.
+        """
+        self.backend = BackendLocal(abrir_instantaneo(caminho))
+        self._varredura = None
+        return self.backend.descricao()
+    
+    def usar_cache(self, diretorio=None, ttl_segundos=None, limite_mb=None):
+        """Reaproveita resultados de consultas enquanto as tabelas lidas não mudarem"""
+        self.cache = CacheConsultas(diretorio, ttl_segundos, limite_mb, identificacao_banco=
+                                    f"{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}")
+        return self.cache.resumo()
+    
+    def _obter_conexao(self):
+        """Retira uma conexão do pool já com os limites da verificação em andamento"""
+        pool = obter_pool(self.db_config)
+        conn = pool.obter()
+        try:
+            preparar_conexao(conn)
+        except Exception:
+            pool.devolver(conn, descartar=not restaurar_conexao(conn))
+            raise
+        return conn
     
     def conectar(self):
-        """Conecta ao banco de dados"""
+        """Obtém uma conexão do pool compartilhado"""
         try:
-            return psycopg2.connect(**self.db_config)
+            return self._obter_conexao()
+        except VerificacaoCancelada:
+            raise
         except Exception as e:
             self.alertas.append(f"CRÍTICO: Erro de conexão - {e}")
             return None
     
+    def liberar(self, conn):
+        """Devolve a conexão ao pool para a próxima verificação"""
+        restaurada = restaurar_conexao(conn)
+        obter_pool(self.db_config).devolver(conn, descartar=bool(conn.closed) or not restaurada)
+    
+    def executar_query(self, query, params=None, usar_cache=True):
+        """Executa uma consulta e devolve DataFrame (para os motores compartilhados com os relatórios)"""
+        with self.metricas.consulta(query) as medicao:
+            conn = self._obter_conexao()
+            medicao.conectada()
+            try:
+                ler = partial(medicao.ler, lambda: pd.read_sql_query(query, conn, params=params))
+                if usar_cache and self.cache is not None:
+                    return medicao.resultado(self.cache.consultar(conn, query, params, ler))
+                return medicao.resultado(ler())
+            finally:
+                self.liberar(conn)
+    
+    @medir_etapa()
     def verificar_estrutura_tabelas(self):
         """Verifica se todas as tabelas necessárias existem"""
         conn = self.conectar()
@@ -72,117 +221,230 @@ class FinanceiroIntegrityChecker:
             self.verificacoes['tabelas_faltando'] = tabelas_faltando
             
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             return len(tabelas_faltando) == 0
             
         except Exception as e:
             self.alertas.append(f"ERRO: Falha na verificação de estrutura - {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
-    def verificar_integridade_dados(self):
-        """Verifica integridade referencial e consistência dos dados"""
+    def _query_varredura(self, tabela: str):
+        """Monta a consulta que avalia todas as regras da tabela em uma única passada
+
+        Returns:
+            (query, parâmetros); os parâmetros são None sem filtro de escopo
+        """
+        colunas = []
+        for regra in self.REGRAS_POR_TABELA[tabela]:
+            filtro = f"FILTER (WHERE {regra['condicao']})"
+            colunas.append(f"COUNT(*) {filtro} AS {regra['nome']}__quantidade")
+            if regra.get('amostra'):
+                colunas.append(
+                    f"(array_agg(t.id::text) {filtro})[1:{self.TAMANHO_AMOSTRA}] AS {regra['nome']}__amostra_ids"
+                )
+            for medida, (funcao, expressao) in regra.get('medidas', {}).items():
+                colunas.append(f"{funcao}({expressao}) {filtro} AS {regra['nome']}__{medida}")
+
+        # contas_pagar não tem convênio: lá só período e unidades se aplicam
+        where, parametros = self.filtro.where('t', convenio=tabela == 'contas_receber')
+        return f"""
+            SELECT COUNT(*) AS total_registros,
+                   {', '.join(colunas)}
+            FROM {tabela} t
+            LEFT JOIN unidades u ON t.unidade_id = u.id
+            {where}
+        """, parametros or None
+
+    def varredura_consolidada(self, forcar=False):
+        """Avalia as regras de linha de cada tabela com uma varredura por tabela
+
+        O resultado fica em cache para que verificar_integridade_dados e
+        verificar_alertas_financeiros compartilhem a mesma leitura (também
+        quando rodam ao mesmo tempo no modo assíncrono).
+        """
+        with self._lock_varredura:
+            if self._varredura is not None and not forcar:
+                return self._varredura
+            return self._executar_varredura()
+
+    @medir_etapa()
+    def _executar_varredura(self):
+        inicio = datetime.now()
+        if self.backend is not None:
+            try:
+                resultado = self.backend.varredura(self.REGRAS_POR_TABELA, self.filtro, self.TAMANHO_AMOSTRA)
+            except Exception as e:
+                self.alertas.append(f"ERRO: Falha na varredura consolidada - {e}")
+                return None
+        else:
+            resultado = self._varredura_sql()
+            if resultado is None:
+                return None
+
+        self._varredura = resultado
+        self.verificacoes['varredura_consolidada'] = {
+            'tempo_s': round((datetime.now() - inicio).total_seconds(), 3),
+            'tabelas': resultado
+        }
+        return resultado
+
+    def _varredura_sql(self):
         conn = self.conectar()
         if not conn:
-            return False
-            
+            return None
+
+        resultado = {}
         try:
             cursor = conn.cursor()
-            
-            # 1. Verificar referências órfãs
-            cursor.execute("""
-                SELECT 
-                    'contas_pagar' as tabela,
-                    COUNT(*) as registros_orfaos
-                FROM contas_pagar cp
-                LEFT JOIN unidades u ON cp.unidade_id = u.id
-                WHERE cp.unidade_id IS NOT NULL AND u.id IS NULL
-                
-                UNION ALL
-                
-                SELECT 
-                    'contas_receber' as tabela,
-                    COUNT(*) as registros_orfaos
-                FROM contas_receber cr
-                LEFT JOIN unidades u ON cr.unidade_id = u.id
-                WHERE cr.unidade_id IS NOT NULL AND u.id IS NULL
-            """)
-            
-            orfaos = cursor.fetchall()
-            for tabela, count in orfaos:
-                if count > 0:
-                    self.alertas.append(f"ATENÇÃO: {count} registros órfãos em {tabela}")
-            
-            # 2. Verificar valores negativos inconsistentes
-            cursor.execute("""
-                SELECT 
-                    'contas_pagar' as tabela,
-                    COUNT(*) as valores_negativos
-                FROM contas_pagar 
-                WHERE valor < 0
-                
-                UNION ALL
-                
-                SELECT 
-                    'contas_receber' as tabela,
-                    COUNT(*) as valores_negativos
-                FROM contas_receber 
-                WHERE valor_bruto < 0 OR valor_liquido < 0
-            """)
-            
-            valores_negativos = cursor.fetchall()
-            for tabela, count in valores_negativos:
-                if count > 0:
-                    self.alertas.append(f"ATENÇÃO: {count} valores negativos em {tabela}")
-            
-            # 3. Verificar consistência de glosas
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM contas_receber 
-                WHERE valor_liquido > valor_bruto
-            """)
-            
-            glosas_inconsistentes = cursor.fetchone()[0]
-            if glosas_inconsistentes > 0:
-                self.alertas.append(f"ERRO: {glosas_inconsistentes} registros com valor líquido > bruto")
-            
-            # 4. Verificar datas futuras excessivas
-            cursor.execute("""
-                SELECT 
-                    'contas_pagar' as tabela,
-                    COUNT(*) as datas_futuras
-                FROM contas_pagar 
-                WHERE data_vencimento > CURRENT_DATE + INTERVAL '2 years'
-                
-                UNION ALL
-                
-                SELECT 
-                    'contas_receber' as tabela,
-                    COUNT(*) as datas_futuras
-                FROM contas_receber 
-                WHERE data_vencimento > CURRENT_DATE + INTERVAL '2 years'
-            """)
-            
-            datas_futuras = cursor.fetchall()
-            for tabela, count in datas_futuras:
-                if count > 0:
-                    self.alertas.append(f"ATENÇÃO: {count} datas de vencimento > 2 anos em {tabela}")
-            
-            self.verificacoes['integridade_dados'] = 'verificada'
-            
+            for tabela in self.REGRAS_POR_TABELA:
+                query, parametros = self._query_varredura(tabela)
+
+                def _ler():
+                    cursor.execute(query, parametros)
+                    return [coluna[0] for coluna in cursor.description], cursor.fetchone()
+
+                try:
+                    if self.cache is not None:
+                        nomes, linha = self.cache.consultar(conn, query, parametros, _ler)
+                    else:
+                        nomes, linha = _ler()
+                except Exception as e:
+                    conn.rollback()
+                    self.alertas.append(f"ERRO: Falha na varredura de {tabela} - {e}")
+                    continue
+
+                regras = {}
+                for nome, valor in zip(nomes[1:], linha[1:]):
+                    regra, campo = nome.split('__', 1)
+                    if campo == 'amostra_ids':
+                        valor = valor or []
+                    elif campo != 'quantidade':
+                        valor = float(valor) if valor is not None else None
+                    regras.setdefault(regra, {})[campo] = valor
+
+                resultado[tabela] = {'total_registros': linha[0], 'regras': regras}
+
             cursor.close()
-            conn.close()
-            return True
-            
+            self.liberar(conn)
         except Exception as e:
-            self.alertas.append(f"ERRO: Falha na verificação de integridade - {e}")
-            if conn:
-                conn.close()
+            self.alertas.append(f"ERRO: Falha na varredura consolidada - {e}")
+            self.liberar(conn)
+            return None
+        return resultado
+
+    def _regra(self, tabela, nome):
+        """Resultado de uma regra da varredura (vazio se a tabela falhou)"""
+        return (self._varredura or {}).get(tabela, {}).get('regras', {}).get(nome, {})
+
+    @medir_etapa()
+    def verificar_integridade_dados(self):
+        """Verifica integridade referencial e consistência dos dados"""
+        varredura = self.varredura_consolidada()
+        if varredura is None:
             return False
+
+        # 1. Referências órfãs
+        for tabela in ('contas_pagar', 'contas_receber'):
+            count = self._regra(tabela, 'orfaos').get('quantidade', 0)
+            if count > 0:
+                self.alertas.append(f"ATENÇÃO: {count} registros órfãos em {tabela}")
+
+        # 2. Valores negativos inconsistentes
+        for tabela in ('contas_pagar', 'contas_receber'):
+            count = self._regra(tabela, 'valores_negativos').get('quantidade', 0)
+            if count > 0:
+                self.alertas.append(f"ATENÇÃO: {count} valores negativos em {tabela}")
+
+        # 3. Consistência de glosas
+        glosas_inconsistentes = self._regra('contas_receber', 'liquido_maior_bruto').get('quantidade', 0)
+        if glosas_inconsistentes > 0:
+            self.alertas.append(f"ERRO: {glosas_inconsistentes} registros com valor líquido > bruto")
+
+        # 4. Datas futuras excessivas
+        for tabela in ('contas_pagar', 'contas_receber'):
+            count = self._regra(tabela, 'datas_futuras').get('quantidade', 0)
+            if count > 0:
+                self.alertas.append(f"ATENÇÃO: {count} datas de vencimento > 2 anos em {tabela}")
+
+        self.verificacoes['integridade_dados'] = 'verificada'
+        return len(varredura) == len(self.REGRAS_POR_TABELA)
     
-    def verificar_performance_queries(self):
-        """Verifica performance das principais consultas"""
+    @staticmethod
+    def _percentil(valores, p):
+        """Percentil com interpolação linear (valores já ordenados)"""
+        if len(valores) == 1:
+            return valores[0]
+        posicao = (len(valores) - 1) * p / 100
+        base = int(posicao)
+        topo = min(base + 1, len(valores) - 1)
+        return valores[base] + (valores[topo] - valores[base]) * (posicao - base)
+
+    @staticmethod
+    def _acessos_plano(plano):
+        """Mapeia cada tabela/índice acessado no plano para o tipo de nó usado"""
+        acessos = {}
+        pendentes = [plano.get('Plan', plano)]
+        while pendentes:
+            no = pendentes.pop()
+            if 'Relation Name' in no:
+                acessos.setdefault(no['Relation Name'], set()).add(no['Node Type'])
+            pendentes.extend(no.get('Plans', []))
+        return {relacao: sorted(tipos) for relacao, tipos in acessos.items()}
+
+    @staticmethod
+    def _planos_relatorio_anterior():
+        """Planos capturados no integrity_report_*.json mais recente, se houver"""
+        relatorios = sorted(glob.glob('integrity_report_*.json'))
+        for arquivo in reversed(relatorios):
+            try:
+                with open(arquivo, 'r', encoding='utf-8') as f:
+                    planos = json.load(f).get('verificacoes', {}).get('planos_execucao')
+            except (OSError, ValueError):
+                continue
+            if planos:
+                return arquivo, planos
+        return None, {}
+
+    def _comparar_planos(self, planos):
+        """Aponta mudanças de plano em relação ao relatório anterior"""
+        arquivo, anteriores = self._planos_relatorio_anterior()
+        if not anteriores:
+            return
+
+        mudancas = {}
+        for nome, plano in planos.items():
+            if nome not in anteriores:
+                continue
+            antes = self._acessos_plano(anteriores[nome])
+            agora = self._acessos_plano(plano)
+            diferencas = {
+                relacao: {'antes': antes.get(relacao, []), 'agora': agora.get(relacao, [])}
+                for relacao in set(antes) | set(agora)
+                if antes.get(relacao) != agora.get(relacao)
+            }
+            if not diferencas:
+                continue
+            mudancas[nome] = diferencas
+
+            for relacao, tipos in diferencas.items():
+                if 'Seq Scan' in tipos['agora'] and 'Seq Scan' not in tipos['antes'] and tipos['antes']:
+                    self.alertas.append(
+                        f"PERFORMANCE: Plano de '{nome}' mudou - Seq Scan em {relacao} "
+                        f"substituiu {', '.join(tipos['antes'])}"
+                    )
+
+        self.verificacoes['mudancas_plano'] = {'comparado_com': arquivo, 'queries': mudancas}
+
+    @medir_etapa()
+    def verificar_performance_queries(self, perfil=False, repeticoes=5, aquecimento=1):
+        """Verifica performance das principais consultas
+
+        Com `perfil=True` cada consulta é aquecida, medida `repeticoes` vezes
+        (min/p50/p95) e tem o plano capturado com EXPLAIN (ANALYZE, BUFFERS),
+        que é comparado com o plano do relatório anterior.
+        """
         conn = self.conectar()
         if not conn:
             return False
@@ -195,6 +457,10 @@ class FinanceiroIntegrityChecker:
                     'nome': 'Dashboard Principal',
                     'query': 'SELECT * FROM vw_dashboard_financeiro LIMIT 10'
                 },
+                {
+                    'nome': 'Dashboard Agregado por Unidade',
+                    'query': DashboardFinanceiro.QUERY
+                },
                 {
                     'nome': 'Análise de Glosas',
                     'query': 'SELECT * FROM vw_analise_glosas LIMIT 10'
@@ -213,127 +479,344 @@ class FinanceiroIntegrityChecker:
             ]
             
             tempos_execucao = {}
+            planos = {}
             
             for teste in queries_teste:
-                inicio = datetime.now()
                 try:
-                    cursor.execute(teste['query'])
-                    cursor.fetchall()
-                    tempo = (datetime.now() - inicio).total_seconds()
-                    tempos_execucao[teste['nome']] = tempo
+                    if not perfil:
+                        inicio = time.perf_counter()
+                        cursor.execute(teste['query'])
+                        cursor.fetchall()
+                        tempo = time.perf_counter() - inicio
+                        tempos_execucao[teste['nome']] = tempo
+                    else:
+                        for _ in range(aquecimento):
+                            cursor.execute(teste['query'])
+                            cursor.fetchall()
+
+                        medicoes = []
+                        for _ in range(max(1, repeticoes)):
+                            inicio = time.perf_counter()
+                            cursor.execute(teste['query'])
+                            cursor.fetchall()
+                            medicoes.append(time.perf_counter() - inicio)
+                        medicoes.sort()
+
+                        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {teste['query']}")
+                        plano = cursor.fetchone()[0]
+                        plano = plano[0] if isinstance(plano, list) else json.loads(plano)[0]
+                        planos[teste['nome']] = plano
+
+                        tempo = self._percentil(medicoes, 50)
+                        tempos_execucao[teste['nome']] = {
+                            'execucoes': len(medicoes),
+                            'min': round(medicoes[0], 6),
+                            'p50': round(tempo, 6),
+                            'p95': round(self._percentil(medicoes, 95), 6),
+                            'execucao_servidor_ms': plano.get('Execution Time'),
+                            'planejamento_ms': plano.get('Planning Time')
+                        }
                     
                     if tempo > 5:  # Mais de 5 segundos
                         self.alertas.append(f"PERFORMANCE: Query '{teste['nome']}' demorou {tempo:.2f}s")
                         
                 except Exception as e:
+                    conn.rollback()
                     self.alertas.append(f"ERRO: Query '{teste['nome']}' falhou - {e}")
                     tempos_execucao[teste['nome']] = 'ERRO'
             
             self.verificacoes['performance_queries'] = tempos_execucao
+            if perfil:
+                self._comparar_planos(planos)
+                self.verificacoes['planos_execucao'] = planos
             
             cursor.close()
-            conn.close()
+            self.liberar(conn)
             return True
             
         except Exception as e:
             self.alertas.append(f"ERRO: Falha na verificação de performance - {e}")
             if conn:
-                conn.close()
+                self.liberar(conn)
             return False
     
+    @medir_etapa()
     def verificar_alertas_financeiros(self):
         """Verifica alertas específicos do módulo financeiro"""
+        varredura = self.varredura_consolidada()
+        if varredura is None:
+            return False
+
+        # 1. Contas em atraso
+        for tipo, tabela in (('Contas a Pagar', 'contas_pagar'), ('Contas a Receber', 'contas_receber')):
+            atraso = self._regra(tabela, 'em_atraso')
+            qtd = atraso.get('quantidade', 0)
+            if qtd > 0:
+                self.alertas.append(f"ATENÇÃO: {qtd} {tipo} em atraso (R$ {atraso['valor_total'] or 0:,.2f})")
+
+        # 2. Glosas altas
+        glosa_alta = self._regra('contas_receber', 'glosa_alta')
+        if glosa_alta.get('quantidade', 0) > 0:
+            self.alertas.append(f"ATENÇÃO: {glosa_alta['quantidade']} registros com glosa > 30% "
+                                f"(média: {glosa_alta['percentual_medio']:.1f}%)")
+
+        # 3. Fluxo de caixa crítico
+        entradas = self._regra('contas_receber', 'vencimento_30d').get('valor_total') or 0.0
+        saidas = self._regra('contas_pagar', 'vencimento_30d').get('valor_total') or 0.0
+        saldo_projetado = round(entradas - saidas, 2)
+
+        if saldo_projetado < 0:
+            self.alertas.append(f"CRÍTICO: Fluxo de caixa negativo próximos 30 dias (R$ {saldo_projetado:,.2f})")
+
+        self.verificacoes['alertas_financeiros'] = {
+            'entradas_30d': entradas,
+            'saidas_30d': saidas,
+            'saldo_projetado': saldo_projetado
+        }
+        return True
+    
+    @medir_etapa()
+    def verificar_dashboard(self, repeticoes=3):
+        """Compara vw_dashboard_financeiro com o motor agregado por unidade"""
+        try:
+            # Sem cache: a comparação também mede o tempo da view e do motor
+            comparacao = DashboardFinanceiro(partial(self.executar_query, usar_cache=False)).comparar_com_view(repeticoes)
+        except Exception as e:
+            self.alertas.append(f"ERRO: Falha na verificação do dashboard - {e}")
+            return False
+
+        if comparacao['unidades_divergentes'] > 0:
+            self.alertas.append(
+                f"ATENÇÃO: vw_dashboard_financeiro diverge do dashboard agregado em "
+                f"{comparacao['unidades_divergentes']} unidade(s) (somas multiplicadas pelos LEFT JOINs)"
+            )
+        if comparacao['tempo_view_s'] > 5:
+            self.alertas.append(f"PERFORMANCE: vw_dashboard_financeiro demorou {comparacao['tempo_view_s']:.2f}s "
+                                f"(agregado por unidade: {comparacao['tempo_motor_s']:.2f}s)")
+
+        self.verificacoes['dashboard'] = comparacao
+        return comparacao['unidades_divergentes'] == 0
+    
+    @medir_etapa()
+    def verificar_indices(self, aplicar=False):
+        """Compara os índices existentes com os que as análises precisam
+
+        Propõe os índices recomendados ausentes, aponta índices sem uso ou
+        inválidos e tabelas lidas majoritariamente por varredura sequencial.
+        Com `aplicar=True` cria os índices propostos com CREATE INDEX
+        CONCURRENTLY (sem bloquear escritas).
+        """
         conn = self.conectar()
         if not conn:
             return False
-            
+
+        tabelas = sorted({indice['tabela'] for indice in self.INDICES_RECOMENDADOS})
         try:
             cursor = conn.cursor()
-            
-            # 1. Contas em atraso
-            cursor.execute("""
-                SELECT 
-                    'Contas a Pagar' as tipo,
-                    COUNT(*) as quantidade,
-                    COALESCE(SUM(valor), 0) as valor_total
-                FROM contas_pagar 
-                WHERE status = 'Pendente' AND data_vencimento < CURRENT_DATE
-                
-                UNION ALL
-                
-                SELECT 
-                    'Contas a Receber' as tipo,
-                    COUNT(*) as quantidade,
-                    COALESCE(SUM(valor_liquido), 0) as valor_total
-                FROM contas_receber 
-                WHERE status = 'Pendente' AND data_vencimento < CURRENT_DATE
-            """)
-            
-            contas_atraso = cursor.fetchall()
-            for tipo, qtd, valor in contas_atraso:
-                if qtd > 0:
-                    self.alertas.append(f"ATENÇÃO: {qtd} {tipo} em atraso (R$ {valor:,.2f})")
-            
-            # 2. Glosas altas
             cursor.execute("""
-                SELECT 
-                    COUNT(*) as registros_alta_glosa,
-                    AVG(percentual_glosa) as percentual_medio
-                FROM (
-                    SELECT 
-                        (valor_glosa::float / NULLIF(valor_bruto, 0)) * 100 as percentual_glosa
-                    FROM contas_receber 
-                    WHERE valor_bruto > 0
-                ) sq
-                WHERE percentual_glosa > 30
-            """)
-            
-            resultado_glosa = cursor.fetchone()
-            if resultado_glosa[0] > 0:
-                self.alertas.append(f"ATENÇÃO: {resultado_glosa[0]} registros com glosa > 30% (média: {resultado_glosa[1]:.1f}%)")
-            
-            # 3. Fluxo de caixa crítico
+                SELECT c.relname,
+                       i.relname,
+                       ARRAY(SELECT pg_get_indexdef(ix.indexrelid, k, true)
+                             FROM generate_series(1, ix.indnkeyatts) k ORDER BY k),
+                       ix.indisunique OR ix.indisprimary,
+                       ix.indisvalid,
+                       ix.indpred IS NOT NULL,
+                       COALESCE(s.idx_scan, 0),
+                       pg_relation_size(ix.indexrelid)
+                FROM pg_index ix
+                JOIN pg_class i ON i.oid = ix.indexrelid
+                JOIN pg_class c ON c.oid = ix.indrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = ix.indexrelid
+                WHERE n.nspname = current_schema() AND c.relname = ANY(%s)
+            """, (tabelas,))
+            existentes = cursor.fetchall()
+
             cursor.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN tipo = 'Entrada' THEN valor ELSE 0 END), 0) as entradas,
-                    COALESCE(SUM(CASE WHEN tipo = 'Saida' THEN valor ELSE 0 END), 0) as saidas
-                FROM (
-                    SELECT valor_liquido as valor, 'Entrada' as tipo
-                    FROM contas_receber 
-                    WHERE data_vencimento BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'
-                    
-                    UNION ALL
-                    
-                    SELECT valor as valor, 'Saida' as tipo
-                    FROM contas_pagar 
-                    WHERE data_vencimento BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'
-                ) fluxo
-            """)
-            
-            entradas, saidas = cursor.fetchone()
-            saldo_projetado = entradas - saidas
-            
-            if saldo_projetado < 0:
-                self.alertas.append(f"CRÍTICO: Fluxo de caixa negativo próximos 30 dias (R$ {saldo_projetado:,.2f})")
-            
-            self.verificacoes['alertas_financeiros'] = {
-                'entradas_30d': entradas,
-                'saidas_30d': saidas,
-                'saldo_projetado': saldo_projetado
-            }
-            
+                SELECT relname, COALESCE(seq_scan, 0), COALESCE(seq_tup_read, 0),
+                       COALESCE(idx_scan, 0), n_live_tup
+                FROM pg_stat_user_tables
+                WHERE schemaname = current_schema() AND relname = ANY(%s)
+            """, (tabelas,))
+            estatisticas = {linha[0]: linha[1:] for linha in cursor.fetchall()}
             cursor.close()
-            conn.close()
-            return True
-            
+            self.liberar(conn)
         except Exception as e:
-            self.alertas.append(f"ERRO: Falha na verificação de alertas - {e}")
-            if conn:
-                conn.close()
+            self.alertas.append(f"ERRO: Falha na verificação de índices - {e}")
+            self.liberar(conn)
             return False
+
+        # 1. Índices recomendados ausentes
+        propostas = []
+        for recomendado in self.INDICES_RECOMENDADOS:
+            coberto = any(
+                tabela == recomendado['tabela'] and valido and not parcial
+                and [c.strip('"') for c in colunas[:len(recomendado['colunas'])]] == recomendado['colunas']
+                for tabela, _, colunas, _, valido, parcial, _, _ in existentes
+            )
+            if not coberto:
+                propostas.append({
+                    **recomendado,
+                    'ddl': f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {recomendado['nome']} "
+                           f"ON {recomendado['tabela']}({', '.join(recomendado['colunas'])})"
+                })
+
+        # 2. Índices sem uso desde o último reset de estatísticas e índices inválidos
+        sem_uso = []
+        invalidos = []
+        for tabela, indice, colunas, unico, valido, _, varreduras, tamanho in existentes:
+            if not valido:
+                invalidos.append(indice)
+                self.alertas.append(f"ERRO: Índice {indice} em {tabela} está inválido (build CONCURRENTLY interrompido?)")
+            elif varreduras == 0 and not unico:
+                sem_uso.append({'tabela': tabela, 'indice': indice, 'colunas': colunas,
+                                'tamanho_kb': round(tamanho / 1024, 1)})
+
+        # 3. Tabelas grandes lidas principalmente por varredura sequencial
+        tabelas_seq_scan = {}
+        for tabela, (seq_scan, seq_tup_read, idx_scan, linhas) in estatisticas.items():
+            if linhas >= self.MINIMO_LINHAS_INDICE and seq_scan > idx_scan:
+                tabelas_seq_scan[tabela] = {'seq_scan': seq_scan, 'idx_scan': idx_scan,
+                                            'linhas_lidas_seq': seq_tup_read, 'linhas': linhas}
+
+        for proposta in propostas:
+            linhas = estatisticas.get(proposta['tabela'], (0, 0, 0, 0))[3]
+            if linhas >= self.MINIMO_LINHAS_INDICE:
+                self.alertas.append(
+                    f"PERFORMANCE: Índice ausente em {proposta['tabela']}({', '.join(proposta['colunas'])}) - "
+                    f"{proposta['motivo']}"
+                )
+
+        self.verificacoes['indices'] = {
+            'propostos': propostas,
+            'sem_uso': sem_uso,
+            'invalidos': invalidos,
+            'tabelas_seq_scan': tabelas_seq_scan
+        }
+
+        if aplicar and propostas:
+            self.verificacoes['indices']['aplicados'] = self.aplicar_indices(propostas)
+
+        return not propostas and not invalidos
+
+    @medir_etapa()
+    def aplicar_indices(self, propostas):
+        """Cria os índices propostos com CONCURRENTLY (fora de transação)"""
+        conn = self.conectar()
+        if not conn:
+            return {}
+
+        resultado = {}
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            for proposta in propostas:
+                inicio = time.perf_counter()
+                try:
+                    cursor.execute(proposta['ddl'])
+                    resultado[proposta['nome']] = {'status': 'criado',
+                                                   'segundos': round(time.perf_counter() - inicio, 2)}
+                except Exception as e:
+                    # Um build CONCURRENTLY que falha deixa um índice inválido para trás
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {proposta['nome']}")
+                    resultado[proposta['nome']] = {'status': 'erro', 'erro': str(e)}
+                    self.alertas.append(f"ERRO: Falha ao criar índice {proposta['nome']} - {e}")
+            cursor.close()
+        finally:
+            conn.autocommit = False
+            self.liberar(conn)
+        return resultado
     
-    def gerar_relatorio_integridade(self):
-        """Gera relatório detalhado de integridade"""
+    def executar_verificacoes(self, perfil=False, repeticoes=5, aquecimento=1, aplicar_indices=False,
+                              assincrono=False, max_conexoes=3, limite_segundos=None, secoes=None):
+        """Executa as verificações (todas ou as de `secoes`), em sequência ou concorrentes com prazo"""
+        desconhecidas = set(secoes or ()) - set(self.LIMITES_VERIFICACAO)
+        if desconhecidas:
+            raise ValueError(f"Verificações desconhecidas: {', '.join(sorted(desconhecidas))}")
+        secoes = [secao for secao in self.LIMITES_VERIFICACAO if not secoes or secao in secoes]
+        # Métricas novas a cada execução: a duração conta só as verificações, não a configuração antes delas
+        self.metricas = MetricasExecucao()
+        if self.backend is not None:
+            # Sem banco: só as regras de linha, em sequência (a varredura é uma só, em memória)
+            ignoradas = [secao for secao in secoes if secao not in self.SECOES_LOCAIS]
+            if ignoradas:
+                print(f"ℹ️ Instantâneo local: ignorando {', '.join(ignoradas)}")
+            secoes = [secao for secao in secoes if secao in self.SECOES_LOCAIS]
+            assincrono = False
+        
+        if assincrono:
+            return self.executar_verificacoes_async(perfil, repeticoes, aquecimento, aplicar_indices,
+                                                    max_conexoes, limite_segundos, secoes)
+        
+        if 'estrutura_tabelas' in secoes:
+            print("\n1️⃣ Verificando estrutura das tabelas...")
+            self.verificar_estrutura_tabelas()
+        
+        if 'integridade_dados' in secoes:
+            print("2️⃣ Verificando integridade dos dados...")
+            self.verificar_integridade_dados()
+        
+        if 'performance_queries' in secoes:
+            print("3️⃣ Verificando performance das queries...")
+            self.verificar_performance_queries(perfil=perfil, repeticoes=repeticoes, aquecimento=aquecimento)
+        
+        if 'alertas_financeiros' in secoes:
+            print("4️⃣ Verificando alertas financeiros...")
+            self.verificar_alertas_financeiros()
+        
+        if 'indices' in secoes:
+            print("5️⃣ Verificando índices...")
+            self.verificar_indices(aplicar=aplicar_indices)
+        
+        if 'dashboard' in secoes:
+            print("6️⃣ Comparando dashboard com vw_dashboard_financeiro...")
+            self.verificar_dashboard()
+    
+    def executar_verificacoes_async(self, perfil=False, repeticoes=5, aquecimento=1, aplicar_indices=False,
+                                    max_conexoes=3, limite_segundos=None, secoes=None):
+        """Executa as verificações concorrentemente, cada uma com statement_timeout e prazo próprios
+        
+        Verificações que excedem o prazo têm as consultas canceladas no
+        servidor e são registradas como timeout, sem bloquear as demais.
+        """
+        verificacoes = {
+            'estrutura_tabelas': self.verificar_estrutura_tabelas,
+            'integridade_dados': self.verificar_integridade_dados,
+            'performance_queries': partial(self.verificar_performance_queries, perfil=perfil,
+                                           repeticoes=repeticoes, aquecimento=aquecimento),
+            'alertas_financeiros': self.verificar_alertas_financeiros,
+            'indices': partial(self.verificar_indices, aplicar=aplicar_indices),
+            'dashboard': self.verificar_dashboard,
+        }
+        tarefas = {nome: (funcao, limite_segundos or self.LIMITES_VERIFICACAO[nome])
+                   for nome, funcao in verificacoes.items() if not secoes or nome in secoes}
+        
+        print(f"\n⚡ Executando {len(tarefas)} verificações concorrentes ({max_conexoes} conexões)...")
+        inicio = time.perf_counter()
+        resultados = ExecutorVerificacoes(self.db_config, max_conexoes).executar_sincrono(tarefas)
+        
+        for nome, resultado in resultados.items():
+            if resultado['status'] == 'timeout':
+                self.alertas.append(f"PERFORMANCE: Verificação {nome} excedeu {resultado['limite_s']}s "
+                                    f"e foi cancelada")
+            elif resultado['status'] == 'erro':
+                self.alertas.append(f"ERRO: Verificação {nome} falhou - {resultado['erro']}")
+            elif resultado['status'] == 'falhou':
+                self.alertas.append(f"ATENÇÃO: Verificação {nome} retornou falha")
+            print(f"   {nome}: {resultado['status']} em {resultado['segundos']}s")
+        
+        self.verificacoes['execucao_verificacoes'] = {
+            'modo': 'assincrono',
+            'max_conexoes': max_conexoes,
+            'tempo_total_s': round(time.perf_counter() - inicio, 3),
+            'por_status': {status: sum(1 for r in resultados.values() if r['status'] == status)
+                           for status in ('ok', 'falhou', 'timeout', 'erro')},
+            'verificacoes': resultados
+        }
+        return resultados
+    
+    def montar_relatorio_integridade(self):
+        """Monta o relatório de integridade (sem gravar)"""
         relatorio = {
             "data_verificacao": datetime.now().isoformat(),
             "versao": "1.0",
@@ -344,6 +827,19 @@ class FinanceiroIntegrityChecker:
             "recomendacoes": []
         }
         
+        if self.backend is not None:
+            relatorio["backend"] = self.backend.descricao()
+        else:
+            try:
+                relatorio["pool_conexoes"] = obter_pool(self.db_config).resumo()
+            except Exception as e:
+                relatorio["pool_conexoes"] = {"erro": str(e)}
+        if self.cache is not None:
+            relatorio["cache_consultas"] = self.cache.resumo()
+        if not self.filtro.vazio:
+            relatorio["filtros"] = self.filtro.resumo()
+        relatorio["metricas_execucao"] = self.metricas.resumo()
+        
         # Adicionar recomendações baseadas nos alertas
         if any("CRÍTICO" in alerta for alerta in self.alertas):
             relatorio["recomendacoes"].append("Resolver problemas críticos imediatamente")
@@ -357,6 +853,12 @@ class FinanceiroIntegrityChecker:
         if any("atraso" in alerta.lower() for alerta in self.alertas):
             relatorio["recomendacoes"].append("Implementar rotina de cobrança automática")
         
+        return relatorio
+    
+    def gerar_relatorio_integridade(self):
+        """Gera relatório detalhado de integridade"""
+        relatorio = self.montar_relatorio_integridade()
+        
         # Salvar relatório
         filename = f'integrity_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
         with open(filename, 'w', encoding='utf-8') as f:
@@ -366,27 +868,61 @@ class FinanceiroIntegrityChecker:
 
 def main():
     """Função principal de verificação"""
+    parser = argparse.ArgumentParser(description="Verificação de integridade do módulo financeiro")
+    parser.add_argument('--perfil', action='store_true',
+                        help="mede cada consulta várias vezes e captura os planos de execução")
+    parser.add_argument('--repeticoes', type=int, default=5,
+                        help="execuções medidas por consulta no modo perfil (padrão 5)")
+    parser.add_argument('--aquecimento', type=int, default=1,
+                        help="execuções descartadas antes da medição no modo perfil (padrão 1)")
+    parser.add_argument('--aplicar-indices', action='store_true',
+                        help="cria os índices propostos com CREATE INDEX CONCURRENTLY")
+    parser.add_argument('--assincrono', action='store_true',
+                        help="executa as verificações concorrentemente, com prazo e cancelamento por verificação")
+    parser.add_argument('--max-conexoes', type=int, default=3,
+                        help="verificações simultâneas no modo assíncrono (padrão 3)")
+    parser.add_argument('--limite-segundos', type=float, default=None,
+                        help="prazo único para todas as verificações no modo assíncrono")
+    parser.add_argument('--cache', nargs='?', const='', default=None, metavar='DIR',
+                        help="reaproveita resultados de consultas cujas tabelas não mudaram (padrão: ./.cache_financeiro)")
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help="validade máxima das entradas do cache em segundos")
+    parser.add_argument('--secoes', nargs='+', choices=list(FinanceiroIntegrityChecker.LIMITES_VERIFICACAO),
+                        default=None, metavar='VERIFICACAO', help="verificações a executar (padrão: todas): "
+                        + ", ".join(FinanceiroIntegrityChecker.LIMITES_VERIFICACAO))
+    parser.add_argument('--instantaneo', default=None, metavar='CAMINHO',
+                        help="avalia integridade e alertas em processo, sem banco, a partir de um instantâneo "
+                        "SQLite ou do diretório de um espelho já sincronizado")
+    argumentos_filtro(parser)
+    parser.add_argument('--cprofile', default=None, metavar='ARQUIVO',
+                        help="grava um perfil cProfile da execução (thread principal) em ARQUIVO, formato pstats")
+    args = parser.parse_args()
+    try:
+        filtro = filtro_dos_argumentos(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
     print("🔍 FoncareSystem - Verificação de Integridade do Módulo Financeiro")
     print("=" * 65)
     
     checker = FinanceiroIntegrityChecker()
+    if args.cache is not None:
+        checker.usar_cache(args.cache or None, args.cache_ttl)
+    checker.usar_filtros(filtro)
+    if args.instantaneo:
+        checker.usar_instantaneo(args.instantaneo)
     
-    # Executar verificações
-    print("\n1️⃣ Verificando estrutura das tabelas...")
-    checker.verificar_estrutura_tabelas()
-    
-    print("2️⃣ Verificando integridade dos dados...")
-    checker.verificar_integridade_dados()
-    
-    print("3️⃣ Verificando performance das queries...")
-    checker.verificar_performance_queries()
-    
-    print("4️⃣ Verificando alertas financeiros...")
-    checker.verificar_alertas_financeiros()
-    
-    # Gerar relatório
-    print("\n📊 Gerando relatório de integridade...")
-    relatorio_file = checker.gerar_relatorio_integridade()
+    with perfil_cprofile(args.cprofile):
+        # Executar verificações
+        checker.executar_verificacoes(perfil=args.perfil, repeticoes=args.repeticoes,
+                                      aquecimento=args.aquecimento, aplicar_indices=args.aplicar_indices,
+                                      assincrono=args.assincrono, max_conexoes=args.max_conexoes,
+                                      limite_segundos=args.limite_segundos, secoes=args.secoes)
+        
+        # Gerar relatório
+        print("\n📊 Gerando relatório de integridade...")
+        relatorio_file = checker.gerar_relatorio_integridade()
+    fechar_pools()
     
     # Resumo
     print(f"\n📋 RESUMO DA VERIFICAÇÃO")